@@ -0,0 +1,230 @@
+"""Бенчмарки бота. Запуск: python bench.py <раздел> [...]
+
+Разделы:
+    rng     - скорость перемешивания колоды разными генераторами
+    memory  - память на одну игру (tracemalloc) и создание игр заново против пула GamePool
+    budget  - проверка памяти на игру против GAME_MEMORY_BUDGET (код выхода 1 при превышении)
+    idle    - RSS процесса со 100 000 ожидающих игроков столов (число задается --games)
+    startup - холодный старт: время импорта и время до первого ответа 200 на health check
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+
+from config import GAME_MEMORY_BUDGET
+from dealer import Dealer, DealerRules
+from events import Join, Start, Hit, Stand
+from game import Deck, Game, GamePool, MAX_PLAYERS, register_game
+from match import Match, MAX_MATCH_ROUNDS
+from memstats import game_size, get_rss
+from rng import BufferedSecureRandom, make_rng
+
+def timeit(func, repeat: int) -> float:
+    """Возвращает количество вызовов func в секунду."""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return repeat / (time.perf_counter() - started)
+
+def bench_rng(args) -> None:
+    """Перемешивание колоды: seeded ГПСЧ, SystemRandom (вызов ОС на каждое число) и буферизованный CSPRNG."""
+    shared_seeded = make_rng(42)
+    system = random.SystemRandom()
+    secure = BufferedSecureRandom()
+    cases = [
+        ("seeded, новый ГПСЧ на игру", lambda: Deck(seed=random.getrandbits(64))),
+        ("seeded, общий ГПСЧ", lambda: Deck(rng=shared_seeded)),
+        ("random.SystemRandom", lambda: Deck(rng=system)),
+        ("BufferedSecureRandom", lambda: Deck(rng=secure)),
+    ]
+    print(f"Перемешивание колоды, {args.repeat} раз:")
+    for name, func in cases:
+        print(f"  {name:<30} {timeit(func, args.repeat):>12,.0f} колод/с")
+
+# Игроков за столом в разделе memory
+MEMORY_PLAYERS = 3
+
+def _start(game: Game) -> Game:
+    """Игроки садятся за стол, игра начинается."""
+    for user_id in range(1, MEMORY_PLAYERS + 1):
+        game.apply(Join(user_id, f"user{user_id}"))
+    game.apply(Start())
+    return game
+
+def _play(game: Game) -> None:
+    """Полная партия: все игроки сразу останавливаются."""
+    _start(game)
+    while not game.finished:
+        game.apply(Stand(game.current_player_id))
+
+def bench_memory(args) -> None:
+    """Память на одну игру и цена создания игры: новые объекты против пула GamePool."""
+    count = max(1, args.repeat // 2)
+    tracemalloc.start()
+    try:
+        print(f"Память на игру (tracemalloc, {count} игр):")
+        for name, build in (("стол ждет игроков", lambda: Game(0, seed=1)),
+                            (f"идет игра, {MEMORY_PLAYERS} игрока", lambda: _start(Game(0, seed=1)))):
+            before = tracemalloc.get_traced_memory()[0]
+            games = [build() for _ in range(count)]
+            size = (tracemalloc.get_traced_memory()[0] - before) / count
+            print(f"  {name:<30} {size:>10,.0f} байт")
+            del games
+    finally:
+        tracemalloc.stop()
+
+    # Без задержки повторного использования: в бенчмарке нет отрисовки событий
+    pool = GamePool(reuse_delay=0)
+
+    def fresh():
+        _play(Game(0, seed=1))
+
+    def pooled():
+        game = pool.acquire(0, seed=1)
+        _play(game)
+        pool.release(game)
+
+    print(f"Партия от создания до конца, {args.repeat} раз:")
+    for name, func in (("новая игра", fresh), ("игра из пула", pooled)):
+        tracemalloc.start()
+        try:
+            rate = timeit(func, args.repeat)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        print(f"  {name:<30} {rate:>10,.0f} игр/с  пик памяти: {peak / 1024:,.0f} КБ")
+
+def _full_table(dealer: bool = False, match: bool = False, finish: bool = False) -> Game:
+    """Полный стол с длинными именами игроков; с finish игроки добирают до 17 и партия завершается."""
+    game = Game(0, dealer=Dealer(DealerRules(17, True)) if dealer else None, seed=1,
+                match=Match(MAX_MATCH_ROUNDS) if match else None)
+    for user_id in range(1, MAX_PLAYERS + 1):
+        # Имя пользователя в Telegram - до 64 символов
+        game.apply(Join(user_id, "Я" * 64))
+    game.apply(Start())
+    while finish and not game.finished:
+        user_id = game.current_player_id
+        game.apply(Hit(user_id) if game.players[user_id].get_score() < 17 else Stand(user_id))
+    game.get_status_report()
+    return game
+
+def bench_budget(args) -> None:
+    """Память на игру (обход объектов, см. memstats.py) против предела GAME_MEMORY_BUDGET."""
+    cases = [
+        ("стол ждет игроков", Game(0, seed=1)),
+        (f"{MAX_PLAYERS} игроков, ход идет", _full_table()),
+        (f"{MAX_PLAYERS} игроков, партия сыграна", _full_table(finish=True)),
+        (f"{MAX_PLAYERS} игроков, дилер и матч", _full_table(dealer=True, match=True, finish=True)),
+    ]
+    print(f"Память на игру, предел {GAME_MEMORY_BUDGET:,} байт:")
+    exceeded = []
+    for name, game in cases:
+        size = game_size(game)
+        mark = "ok" if size <= GAME_MEMORY_BUDGET else "ПРЕВЫШЕН"
+        print(f"  {name:<36} {size:>8,} байт  {mark}")
+        if size > GAME_MEMORY_BUDGET:
+            exceeded.append(name)
+    if exceeded:
+        print(f"Предел памяти на игру превышен: {', '.join(exceeded)}")
+        sys.exit(1)
+
+def _idle_games_rss(count: int, secure: bool) -> tuple:
+    """Создает count зарегистрированных столов в чистом процессе; возвращает (прирост RSS, время)."""
+    shared = BufferedSecureRandom() if secure else None
+    before = get_rss()
+    started = time.perf_counter()
+    games = []
+    for chat_id in range(count):
+        game = Game(-chat_id, rng=shared)
+        register_game(game)
+        games.append(game)
+    return get_rss() - before, time.perf_counter() - started
+
+def bench_idle(args) -> None:
+    """RSS процесса с args.games столами, ожидающими игроков (каждый замер в отдельном процессе)."""
+    print(f"Столы, ожидающие игроков, {args.games:,} штук:")
+    context = multiprocessing.get_context("spawn")
+    for name, secure in (("DECK_RNG=secure", True), ("DECK_RNG=seeded", False)):
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            rss, elapsed = executor.submit(_idle_games_rss, args.games, secure).result()
+        print(f"  {name:<20} RSS +{rss / 2 ** 20:>8,.1f} МБ  ({rss / args.games:>6,.0f} байт на стол, {elapsed:.2f} с)")
+
+# Каталог бота: сервисы запускаются из него
+BOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _measure_server(command, env, timeout: float = 60.0):
+    """Запускает сервис и возвращает (время до первого 200, время до загрузки бота)."""
+    port = _free_port()
+    env = dict(env, PORT=str(port), WEB_SERVER_HOST="127.0.0.1")
+    started = time.perf_counter()
+    process = subprocess.Popen(command, env=env, cwd=BOT_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    first_ok = ready = None
+    try:
+        while time.perf_counter() - started < timeout and ready is None:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1) as response:
+                    body = response.read().decode("utf-8")
+                    if response.status == 200:
+                        first_ok = first_ok or time.perf_counter() - started
+                        if "загружается" not in body:
+                            ready = time.perf_counter() - started
+            except OSError:
+                pass
+            time.sleep(0.005)
+    finally:
+        process.terminate()
+        process.wait()
+    return first_ok, ready
+
+def bench_startup(args) -> None:
+    """Холодный старт: импорт модулей и время до первого ответа health check."""
+    with tempfile.TemporaryDirectory() as tmp:
+        # Фиктивный токен: бот не должен трогать настоящий вебхук
+        env = dict(os.environ, BOT_TOKEN="123456:bench", DB_PATH=os.path.join(tmp, "bench.sqlite3"),
+                   GAME_LOG_DIR=os.path.join(tmp, "game_logs"), IS_RENDER="true")
+        print("Импорт модулей (отдельный процесс):")
+        for module in ("server", "main"):
+            started = time.perf_counter()
+            subprocess.run([sys.executable, "-c", f"import {module}"], env=env, cwd=BOT_DIR, check=True,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            print(f"  import {module:<24} {time.perf_counter() - started:>8.2f} с")
+        print("Время до первого ответа 200 на / и до загрузки бота:")
+        for name, command in (("python server.py", [sys.executable, "server.py"]),
+                              ("python main.py --webhook", [sys.executable, "main.py", "--webhook"])):
+            first_ok, ready = _measure_server(command, env)
+            fmt = lambda value: f"{value:>6.2f} с" if value is not None else "     - "
+            print(f"  {name:<31} 200: {fmt(first_ok)}   бот загружен: {fmt(ready)}")
+
+SECTIONS = {
+    "budget": bench_budget,
+    "idle": bench_idle,
+    "memory": bench_memory,
+    "rng": bench_rng,
+    "startup": bench_startup,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки бота")
+    parser.add_argument("sections", nargs="*", choices=sorted(SECTIONS), help="разделы (по умолчанию все)")
+    parser.add_argument("--repeat", type=int, default=20000, help="число повторов в микробенчмарках")
+    parser.add_argument("--games", type=int, default=100000, help="число столов в разделе idle")
+    args = parser.parse_args()
+    for section in args.sections or sorted(SECTIONS):
+        SECTIONS[section](args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import asyncio
+import logging
+from typing import Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import InlineKeyboardMarkup
+
+from supervisor import TaskSupervisor
+
+logger = logging.getLogger(__name__)
+
+# Окно (в секундах), в течение которого правки табло объединяются в одну
+BOARD_EDIT_DEBOUNCE = 1.0
+
+class GameBoard:
+    """Живое табло игры - одно сообщение в групповом чате, которое редактируется на месте.
+
+    Правки откладываются на BOARD_EDIT_DEBOUNCE секунд: все изменения, пришедшие за это
+    время, сливаются в одно редактирование. Если текст и клавиатура не изменились,
+    запрос к Telegram не отправляется.
+    """
+
+    def __init__(self, bot: Bot, chat_id: int, message_id: int, text: str = "",
+                 reply_markup: Optional[InlineKeyboardMarkup] = None,
+                 supervisor: Optional[TaskSupervisor] = None, game_id: Optional[int] = None):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.message_id = message_id
+        # Последнее отправленное в Telegram состояние табло
+        self.last_text = text
+        self.last_markup = reply_markup
+        # Состояние, ожидающее отправки
+        self.pending_text = text
+        self.pending_markup = reply_markup
+        self._task: Optional[asyncio.Task] = None
+        # Отложенная правка запускается как задача игры game_id (см. supervisor.py)
+        self.supervisor = supervisor
+        self.game_id = game_id
+
+    def update(self, text: str, reply_markup: Optional[InlineKeyboardMarkup] = None) -> None:
+        """Запрашивает обновление табло. Правки в пределах окна объединяются."""
+        self.pending_text = text
+        self.pending_markup = reply_markup
+        if not self._is_changed():
+            return
+        if self._task is None or self._task.done():
+            if self.supervisor:
+                # Если лимит задач исчерпан, правка уйдет со следующим flush()
+                self._task = self.supervisor.spawn(self._delayed_flush(), self.game_id, "board_flush")
+            else:
+                self._task = asyncio.create_task(self._delayed_flush())
+
+    async def flush(self) -> None:
+        """Немедленно отправляет отложенную правку (например, при завершении игры)."""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        self._task = None
+        await self._edit()
+
+    def _is_changed(self) -> bool:
+        return self.pending_text != self.last_text or self.pending_markup != self.last_markup
+
+    async def _delayed_flush(self) -> None:
+        await asyncio.sleep(BOARD_EDIT_DEBOUNCE)
+        self._task = None
+        await self._edit()
+
+    async def _edit(self) -> None:
+        if not self._is_changed():
+            return
+        text, markup = self.pending_text, self.pending_markup
+        try:
+            try:
+                await self.bot.edit_message_text(
+                    text,
+                    chat_id=self.chat_id,
+                    message_id=self.message_id,
+                    parse_mode="Markdown",
+                    reply_markup=markup
+                )
+            except TelegramBadRequest as e:
+                if "message is not modified" in str(e):
+                    pass
+                else:
+                    logger.error(f"Ошибка при обновлении табло с Markdown: {e}")
+                    clean_text = text.replace("*", "").replace("`", "").replace("\\_", "_")
+                    await self.bot.edit_message_text(
+                        clean_text,
+                        chat_id=self.chat_id,
+                        message_id=self.message_id,
+                        reply_markup=markup
+                    )
+            self.last_text, self.last_markup = text, markup
+        except Exception as e:
+            logger.error(f"Не удалось обновить табло в чате {self.chat_id}: {e}")
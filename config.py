@@ -14,4 +14,51 @@ WEBHOOK_URL = f"{WEBHOOK_HOST}{WEBHOOK_PATH}"
 
 # Параметры веб-сервера
 WEB_SERVER_HOST = os.getenv("WEB_SERVER_HOST", "0.0.0.0")
-WEB_SERVER_PORT = int(os.getenv("PORT", 10000))  # Render использует переменную PORT 
\ No newline at end of file
+WEB_SERVER_PORT = int(os.getenv("PORT", 10000))  # Render использует переменную PORT 
+
+# Сколько секунд при остановке ждать завершения обработчиков и отправки сообщений
+# (Render дает 30 секунд между SIGTERM и принудительной остановкой)
+SHUTDOWN_TIMEOUT = float(os.getenv("SHUTDOWN_TIMEOUT", 20))
+
+# Адрес Bot API (пустое значение - api.telegram.org). Нужен для собственного
+# сервера Bot API или тестового сервера в loadtest.py
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "")
+
+# Сколько обновлений одновременно обрабатывается в режиме long polling
+POLLING_CONCURRENCY = int(os.getenv("POLLING_CONCURRENCY", 64))
+
+# Пул HTTP-соединений к Bot API: размер, сколько секунд держать простаивающее
+# соединение открытым и сколько кэшировать адрес хоста
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 128))
+HTTP_KEEPALIVE = float(os.getenv("HTTP_KEEPALIVE", 60))
+HTTP_DNS_TTL = int(os.getenv("HTTP_DNS_TTL", 300))
+
+# Ограничение частоты нажатий кнопок (см. throttling.py): нажатий в секунду и сколько
+# можно подряд - для игрока и для чата. THROTTLE_ENABLED=false отключает ограничение
+# (например, для loadtest.py, где бот-игроки нажимают кнопки без пауз)
+THROTTLE_ENABLED = os.getenv("THROTTLE_ENABLED", "true").lower() in ("1", "true", "yes")
+THROTTLE_USER_RATE = float(os.getenv("THROTTLE_USER_RATE", 2))
+THROTTLE_USER_BURST = int(os.getenv("THROTTLE_USER_BURST", 10))
+THROTTLE_CHAT_RATE = float(os.getenv("THROTTLE_CHAT_RATE", 10))
+THROTTLE_CHAT_BURST = int(os.getenv("THROTTLE_CHAT_BURST", 20))
+
+# Кнопка "Подсказка" в личных сообщениях (совет по таблице стратегии, см. solver.py)
+HINTS_ENABLED = os.getenv("HINTS_ENABLED", "false").lower() in ("1", "true", "yes")
+
+# Правила дилера для режима игры против бота
+DEALER_STAND_ON = int(os.getenv("DEALER_STAND_ON", 17))
+DEALER_HIT_SOFT_17 = os.getenv("DEALER_HIT_SOFT_17", "false").lower() in ("1", "true", "yes")
+
+# Каталог журнала игр (пустое значение отключает журнал)
+GAME_LOG_DIR = os.getenv("GAME_LOG_DIR", "game_logs")
+
+# Генератор для перемешивания колоды: "secure" (криптостойкий, для продакшена)
+# или "seeded" (детерминированный по seed игры, удобно для отладки и воспроизведения)
+DECK_RNG = os.getenv("DECK_RNG", "secure")
+
+# Файл базы SQLite для статистики и других данных бота (пустое значение отключает хранилище)
+DB_PATH = os.getenv("DB_PATH", "bot.sqlite3")
+
+# Предел памяти на одну игру в байтах: python bench.py budget завершается с ошибкой,
+# если самая большая игра (полный стол, дилер, матч) занимает больше
+GAME_MEMORY_BUDGET = int(os.getenv("GAME_MEMORY_BUDGET", 16384))
@@ -0,0 +1,57 @@
+from typing import List
+
+# Итоги руки игрока против дилера
+RESULT_WIN = "win"
+RESULT_PUSH = "push"
+RESULT_LOSE = "lose"
+
+class DealerRules:
+    """Правила, по которым дилер добирает карты."""
+
+    def __init__(self, stand_on: int = 17, hit_soft_17: bool = False):
+        # Дилер останавливается, набрав stand_on очков
+        self.stand_on = stand_on
+        # Добирать ли на "мягких" 17 (туз считается за 11)
+        self.hit_soft_17 = hit_soft_17
+
+class Dealer:
+    """Автоматический дилер (казино).
+
+    Не зависит от Telegram: работает с любыми объектами руки (cards, add_card,
+    get_score, is_soft) и колоды (deal_card), поэтому его можно вызывать
+    в плотном цикле симулятора.
+    """
+
+    def __init__(self, rules: DealerRules = None):
+        self.rules = rules or DealerRules()
+
+    def should_hit(self, hand) -> bool:
+        """Решает, должен ли дилер взять еще карту."""
+        score = hand.get_score()
+        if score < self.rules.stand_on:
+            return True
+        if score == self.rules.stand_on and self.rules.hit_soft_17 and hand.is_soft():
+            return True
+        return False
+
+    def play(self, hand, deck) -> List:
+        """Доигрывает руку дилера до конца. Возвращает список взятых карт."""
+        drawn = []
+        while self.should_hit(hand):
+            card = deck.deal_card()
+            if card is None:
+                break
+            hand.add_card(card)
+            drawn.append(card)
+        return drawn
+
+    @staticmethod
+    def settle(player_score: int, player_busted: bool, dealer_score: int, dealer_busted: bool) -> str:
+        """Определяет итог руки игрока против дилера."""
+        if player_busted:
+            return RESULT_LOSE
+        if dealer_busted or player_score > dealer_score:
+            return RESULT_WIN
+        if player_score == dealer_score:
+            return RESULT_PUSH
+        return RESULT_LOSE
@@ -0,0 +1,117 @@
+"""Действия игроков и события игры для конечного автомата Game.apply().
+
+Действия описывают, что хочет сделать игрок, а события - что в итоге произошло.
+Ни то, ни другое не зависит от Telegram: обработчики бота только отображают события.
+"""
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, List, Optional
+
+if TYPE_CHECKING:
+    from game import Card
+
+# Действия
+
+@dataclass(frozen=True)
+class Join:
+    """Игрок садится за стол."""
+    user_id: int
+    username: str
+
+@dataclass(frozen=True)
+class Start:
+    """Досрочное начало игры."""
+    user_id: Optional[int] = None
+
+@dataclass(frozen=True)
+class Hit:
+    """Игрок берет карту."""
+    user_id: int
+
+@dataclass(frozen=True)
+class Stand:
+    """Игрок останавливается."""
+    user_id: int
+
+@dataclass(frozen=True)
+class Timeout:
+    """Истекло время ожидания игроков."""
+
+@dataclass(frozen=True)
+class NextRound:
+    """Следующий раунд матча за тем же столом.
+
+    deck_order - порядок колоды после перемешивания (заполняется при записи в журнал,
+    чтобы раунд воспроизводился точно); None - колода перемешивается генератором игры.
+    """
+    deck_order: Optional[bytes] = None
+
+# События
+
+@dataclass(frozen=True)
+class ActionRejected:
+    """Действие отклонено; reason - код причины (REJECT_*)."""
+    reason: str
+
+@dataclass(frozen=True)
+class PlayerJoined:
+    user_id: int
+    username: str
+
+@dataclass(frozen=True)
+class GameStarted:
+    player_ids: List[int] = field(default_factory=list)
+
+@dataclass(frozen=True)
+class CardDealt:
+    user_id: int
+    card: "Card"
+    score: int
+
+@dataclass(frozen=True)
+class Busted:
+    user_id: int
+    score: int
+
+@dataclass(frozen=True)
+class Stood:
+    user_id: int
+    score: int
+
+@dataclass(frozen=True)
+class TurnPassed:
+    user_id: int
+
+@dataclass(frozen=True)
+class DealerPlayed:
+    cards: List["Card"]
+    score: int
+    busted: bool
+
+@dataclass(frozen=True)
+class GameFinished:
+    winner_ids: List[int]
+    is_draw: bool
+
+@dataclass(frozen=True)
+class RoundStarted:
+    """Начался новый раунд матча. deck_order - новый порядок колоды, если ее перемешали."""
+    round_number: int
+    deck_order: Optional[bytes] = None
+
+@dataclass(frozen=True)
+class MatchFinished:
+    """Матч окончен: winner_ids - игроки с наибольшим числом выигранных раундов."""
+    winner_ids: List[int]
+    is_draw: bool
+
+@dataclass(frozen=True)
+class GameCancelled:
+    """Игра отменена: к концу ожидания не набралось игроков."""
+
+# Причины отклонения действий
+REJECT_NOT_ALLOWED = "not_allowed"
+REJECT_ALREADY_STARTED = "already_started"
+REJECT_ALREADY_JOINED = "already_joined"
+REJECT_TABLE_FULL = "table_full"
+REJECT_NOT_ENOUGH_PLAYERS = "not_enough_players"
+REJECT_NOT_A_PLAYER = "not_a_player"
@@ -1,5 +1,21 @@
+import itertools
 import random
-from typing import List, Dict, Tuple, Optional, Union
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Deque, Iterator, List, Dict, Tuple, Optional
+
+from rng import make_rng
+from dealer import Dealer, RESULT_WIN, RESULT_PUSH, RESULT_LOSE
+from events import (
+    Join, Start, Hit, Stand, Timeout, NextRound,
+    ActionRejected, PlayerJoined, GameStarted, CardDealt, Busted, Stood, TurnPassed,
+    DealerPlayed, GameFinished, GameCancelled, RoundStarted, MatchFinished,
+    REJECT_NOT_ALLOWED, REJECT_ALREADY_STARTED, REJECT_ALREADY_JOINED, REJECT_TABLE_FULL,
+    REJECT_NOT_ENOUGH_PLAYERS, REJECT_NOT_A_PLAYER
+)
+
+if TYPE_CHECKING:
+    from match import Match
 
 # Константы для карт
 SUITS = ['♠', '♥', '♦', '♣']
@@ -9,6 +25,24 @@ RANK_VALUES = {
     'J': 10, 'Q': 10, 'K': 10, 'A': 11
 }
 
+# Количество игроков за столом
+MIN_PLAYERS = 2
+MAX_PLAYERS = 7
+
+# Подписи итогов игры против дилера
+RESULT_LABELS = {
+    RESULT_WIN: "🏆 победа",
+    RESULT_PUSH: "🤝 ничья",
+    RESULT_LOSE: "❌ проигрыш"
+}
+
+# Колода матча перемешивается заново перед раундом, если в ней осталось меньше
+# этого числа карт на каждую руку за столом
+SHOE_CARDS_PER_HAND = 6
+
+# Условный ID дилера (не совпадает ни с одним пользователем Telegram)
+DEALER_ID = 0
+
 # Красивые эмодзи для мастей
 SUIT_EMOJI = {
     '♠': '♠️', # Пики (черные)
@@ -26,6 +60,8 @@ FACE_CARDS = {
 }
 
 class Card:
+    __slots__ = ("rank", "suit", "value")
+
     def __init__(self, rank: str, suit: str):
         self.rank = rank
         self.suit = suit
@@ -42,10 +78,38 @@ class Card:
             
         return f"{rank_display}{emoji_suit}"
 
+# Карты неизменяемы, поэтому все колоды используют один и тот же набор объектов
+FULL_DECK: Tuple[Card, ...] = tuple(Card(rank, suit) for suit in SUITS for rank in RANKS)
+# Индекс карты в FULL_DECK (для компактной записи порядка колоды)
+CARD_INDEX: Dict[Card, int] = {card: index for index, card in enumerate(FULL_DECK)}
+
 class Deck:
-    def __init__(self):
-        self.cards = [Card(rank, suit) for suit in SUITS for rank in RANKS]
-        random.shuffle(self.cards)
+    __slots__ = ("cards",)
+
+    def __init__(self, seed: Optional[int] = None, rng: Optional[random.Random] = None):
+        """Создает перемешанную колоду.
+        
+        Если генератор rng не передан, колода перемешивается детерминированно по seed:
+        с одинаковым seed порядок карт всегда одинаков.
+        """
+        self.cards = list(FULL_DECK)
+        (rng or make_rng(seed)).shuffle(self.cards)
+
+    @classmethod
+    def from_order(cls, order: bytes) -> "Deck":
+        """Восстанавливает колоду по индексам карт в FULL_DECK (см. get_order)."""
+        deck = cls.__new__(cls)
+        deck.cards = [FULL_DECK[index] for index in order]
+        return deck
+
+    def reset(self, rng: random.Random) -> None:
+        """Возвращает в колоду все карты и перемешивает ее на месте (список карт не пересоздается)."""
+        self.cards[:] = FULL_DECK
+        rng.shuffle(self.cards)
+
+    def get_order(self) -> bytes:
+        """Возвращает текущий порядок оставшихся карт как индексы в FULL_DECK."""
+        return bytes(CARD_INDEX[card] for card in self.cards)
 
     def deal_card(self) -> Optional[Card]:
         if not self.cards:
@@ -53,25 +117,57 @@ class Deck:
         return self.cards.pop()
 
 class Player:
+    __slots__ = ("user_id", "username", "cards", "stopped", "busted", "keyboard_message_id", "_total", "_aces")
+
     def __init__(self, user_id: int, username: str):
         self.user_id = user_id
         self.username = username
-        self.cards = []
+        self.cards: List[Card] = []
         self.stopped = False
         self.busted = False
+        # ID личного сообщения с кнопками действий (чтобы убрать их, когда появится новое)
+        self.keyboard_message_id: Optional[int] = None
+        # Сумма карт (тузы по 11) и число тузов - обновляются при каждой новой карте
+        self._total = 0
+        self._aces = 0
+
+    def reset(self, user_id: int, username: str) -> None:
+        """Превращает объект в нового игрока за другим столом (см. Game.reset)."""
+        self.user_id = user_id
+        self.username = username
+        self.keyboard_message_id = None
+        self.reset_hand()
 
     def add_card(self, card: Card) -> None:
         self.cards.append(card)
+        self._total += card.value
+        if card.rank == 'A':
+            self._aces += 1
         self.busted = self.get_score() > 21
 
+    def reset_hand(self) -> None:
+        """Сбрасывает руку на месте перед новым раундом."""
+        self.cards.clear()
+        self.stopped = False
+        self.busted = False
+        self._total = 0
+        self._aces = 0
+
     def get_score(self) -> int:
-        score = sum(card.value for card in self.cards)
+        return self._get_score_and_soft()[0]
+
+    def is_soft(self) -> bool:
+        """Проверяет, считается ли в руке туз за 11 очков ("мягкая" сумма)."""
+        return self._get_score_and_soft()[1]
+
+    def _get_score_and_soft(self) -> Tuple[int, bool]:
+        score = self._total
         # Обработка тузов для предотвращения перебора
-        aces = sum(1 for card in self.cards if card.rank == 'A')
+        aces = self._aces
         while score > 21 and aces > 0:
             score -= 10  # Уменьшаем ценность туза с 11 до 1
             aces -= 1
-        return score
+        return score, aces > 0
 
     def get_cards_str(self) -> str:
         """Возвращает строковое представление карт игрока"""
@@ -79,30 +175,252 @@ class Player:
             return "нет карт"
         return " ".join(f"[{str(card)}]" for card in self.cards)
 
+# Генератор ID игр: начинается с текущего времени в мс, поэтому ID не повторяются между перезапусками
+_game_ids = itertools.count(int(time.time() * 1000))
+
+def new_game_id() -> int:
+    """Возвращает новый уникальный ID игры."""
+    return next(_game_ids)
+
 class Game:
-    def __init__(self, chat_id: int):
-        self.chat_id = chat_id
-        self.deck = Deck()
+    __slots__ = (
+        "chat_id", "game_id", "seed", "rng", "match", "dealer", "dealer_hand", "results", "min_players",
+        "deck", "players", "current_player_id", "started", "finished", "winner_id", "winner_ids", "is_draw",
+        "turn_order", "active_count", "turn_seq", "version", "_status_cache", "_spare_players",
+    )
+
+    def __init__(self, chat_id: int, dealer: Optional[Dealer] = None,
+                 game_id: Optional[int] = None, seed: Optional[int] = None,
+                 rng: Optional[random.Random] = None, match: Optional["Match"] = None):
+        # Контейнеры создаются один раз и при reset() только очищаются
+        self.deck: Optional[Deck] = None
+        self.dealer_hand: Optional[Player] = None
+        # Итоги игроков против дилера (user_id -> RESULT_*)
+        self.results: Dict[int, str] = {}
         self.players: Dict[int, Player] = {}
+        self.winner_ids: List[int] = []
+        # Очередь хода: в начале всегда текущий игрок, выбывшие игроки из нее удаляются
+        self.turn_order: Deque[int] = deque()
+        # Объекты игроков прошлой игры за этим столом - переиспользуются в add_player
+        self._spare_players: List[Player] = []
+        self.seed: Optional[int] = None
+        self.rng: Optional[random.Random] = None
+        self.reset(chat_id, dealer, game_id, seed, rng, match)
+
+    def reset(self, chat_id: int, dealer: Optional[Dealer] = None,
+              game_id: Optional[int] = None, seed: Optional[int] = None,
+              rng: Optional[random.Random] = None, match: Optional["Match"] = None) -> None:
+        """Готовит объект к новой игре с теми же параметрами, что у конструктора.
+        
+        Колода, словари и очередь хода очищаются на месте, объекты игроков уходят
+        в запас и достаются следующим игрокам за этим столом (см. GamePool).
+        """
+        self.chat_id = chat_id
+        self.game_id = game_id if game_id is not None else new_game_id()
+        if rng is None:
+            # Seed колоды: по нему и журналу действий игру можно воспроизвести
+            own_rng = self.rng if self.seed is not None else None
+            self.seed = seed if seed is not None else random.getrandbits(64)
+            if own_rng is not None:
+                # Собственный генератор прошлой игры: заново задать seed дешевле, чем создать новый
+                own_rng.seed(self.seed)
+                rng = own_rng
+            else:
+                rng = make_rng(self.seed)
+        else:
+            # Колода перемешана внешним генератором (например, криптостойким) - seed нет
+            self.seed = None
+        # Генератор колоды (для перемешивания между раундами матча)
+        self.rng = rng
+        # Матч из нескольких раундов (см. match.py) или None для одной партии
+        self.match = match
+        # Дилер (режим игры против бота) или None для игры игроков между собой
+        self.dealer = dealer
+        if not dealer:
+            self.dealer_hand = None
+        elif self.dealer_hand is None:
+            self.dealer_hand = Player(DEALER_ID, "Дилер")
+        else:
+            self.dealer_hand.reset_hand()
+        self.results.clear()
+        self.min_players = 1 if dealer else MIN_PLAYERS
+        if self.deck is None:
+            self.deck = Deck(rng=rng)
+        else:
+            self.deck.reset(rng)
+        self._spare_players.extend(self.players.values())
+        self.players.clear()
         self.current_player_id: Optional[int] = None
         self.started = False
         self.finished = False
         self.winner_id: Optional[int] = None
+        self.winner_ids.clear()
         self.is_draw = False
+        self.turn_order.clear()
+        # Количество игроков, которые еще не остановились и не перебрали
+        self.active_count = 0
+        # Номер хода: растет с каждым принятым действием. Записывается в кнопки,
+        # поэтому нажатие на кнопку из устаревшего сообщения легко распознать
+        self.turn_seq = 0
+        # Версия состояния: растет при каждом изменении игры (игроки, карты, ход, итоги)
+        self.version = 0
+        # Текст для /game_status и версия, для которой он построен
+        self._status_cache: Optional[Tuple[int, Tuple[str, str]]] = None
+
+    def apply(self, action) -> List:
+        """Применяет действие (Join, Start, Hit, Stand, Timeout) и возвращает список событий.
+        
+        Это единственная точка изменения состояния для обработчиков бота: вся логика
+        (перебор, переход хода, завершение игры, ход дилера) решается здесь, без ввода-вывода.
+        """
+        events = self._apply(action)
+        if events and not isinstance(events[0], ActionRejected):
+            self.turn_seq += 1
+        return events
+
+    def _apply(self, action) -> List:
+        if isinstance(action, Hit):
+            return self._apply_hit(action.user_id)
+        if isinstance(action, Stand):
+            return self._apply_stand(action.user_id)
+        if isinstance(action, Join):
+            return self._apply_join(action.user_id, action.username)
+        if isinstance(action, Start):
+            if action.user_id is not None and action.user_id not in self.players:
+                return [ActionRejected(REJECT_NOT_A_PLAYER)]
+            return self._apply_start()
+        if isinstance(action, NextRound):
+            return self._apply_next_round(action.deck_order)
+        if isinstance(action, Timeout):
+            if self.started:
+                return []
+            if self.can_start():
+                return self._apply_start()
+            self.finished = True
+            self.version += 1
+            return [GameCancelled()]
+        raise ValueError(f"Неизвестное действие: {action!r}")
+
+    def _apply_join(self, user_id: int, username: str) -> List:
+        if self.started or self.finished:
+            return [ActionRejected(REJECT_ALREADY_STARTED)]
+        if user_id in self.players:
+            return [ActionRejected(REJECT_ALREADY_JOINED)]
+        if len(self.players) >= MAX_PLAYERS:
+            return [ActionRejected(REJECT_TABLE_FULL)]
+        
+        events = [PlayerJoined(user_id, username)]
+        if self.add_player(user_id, username):
+            # Стол заполнен - начинаем игру сразу
+            events += self._apply_start()
+        return events
+
+    def _apply_start(self) -> List:
+        if self.started:
+            return [ActionRejected(REJECT_ALREADY_STARTED)]
+        if not self.can_start():
+            return [ActionRejected(REJECT_NOT_ENOUGH_PLAYERS)]
+        self.start_game()
+        return [GameStarted(list(self.players.keys())), TurnPassed(self.current_player_id)]
+
+    def _apply_hit(self, user_id: int) -> List:
+        success, card = self.hit(user_id)
+        if not success:
+            return [ActionRejected(REJECT_NOT_ALLOWED)]
+        
+        player = self.players[user_id]
+        score = player.get_score()
+        events = [CardDealt(user_id, card, score)]
+        if player.busted:
+            events.append(Busted(user_id, score))
+            events += self._after_turn()
+        return events
+
+    def _apply_stand(self, user_id: int) -> List:
+        if not self.stand(user_id):
+            return [ActionRejected(REJECT_NOT_ALLOWED)]
+        return [Stood(user_id, self.players[user_id].get_score())] + self._after_turn()
+
+    def _after_turn(self) -> List:
+        """События после того, как игрок выбыл: завершение игры или переход хода."""
+        if not self.finished:
+            self.next_turn()
+        if not self.finished:
+            return [TurnPassed(self.current_player_id)]
+        
+        events = []
+        if self.dealer_hand:
+            dealer = self.dealer_hand
+            events.append(DealerPlayed(list(dealer.cards), dealer.get_score(), dealer.busted))
+        events.append(GameFinished(list(self.winner_ids), self.is_draw))
+        if self.match:
+            self.match.record_round(self)
+            if self.match.finished:
+                leaders = self.match.leader_ids
+                events.append(MatchFinished(leaders, len(leaders) != 1))
+        return events
+
+    def _apply_next_round(self, deck_order: Optional[bytes]) -> List:
+        if not self.match or self.match.finished or not self.finished:
+            return [ActionRejected(REJECT_NOT_ALLOWED)]
+        shuffled = self.reset_round(deck_order)
+        self.match.round_number += 1
+        return [RoundStarted(self.match.round_number, shuffled)] + self._apply_start()
+
+    def reset_round(self, deck_order: Optional[bytes] = None) -> Optional[bytes]:
+        """Готовит стол к следующему раунду матча, ничего не создавая заново.
+        
+        Руки игроков сбрасываются на месте, колода остается той же и перемешивается,
+        только если карт в ней мало (или задан deck_order из журнала).
+        Возвращает новый порядок колоды, если ее перемешали.
+        """
+        for player in self.players.values():
+            player.reset_hand()
+        if self.dealer_hand:
+            self.dealer_hand.reset_hand()
+        self.results.clear()
+        self.winner_ids.clear()
+        self.winner_id = None
+        self.is_draw = False
+        self.started = False
+        self.finished = False
+        self.current_player_id = None
+        self.turn_order.clear()
+        self.active_count = 0
+        self.version += 1
+        
+        if deck_order is not None:
+            self.deck.cards[:] = [FULL_DECK[index] for index in deck_order]
+            return deck_order
+        hands = len(self.players) + (1 if self.dealer_hand else 0)
+        if len(self.deck.cards) < SHOE_CARDS_PER_HAND * hands:
+            self.deck.reset(self.rng)
+            return self.deck.get_order()
+        return None
 
     def add_player(self, user_id: int, username: str) -> bool:
-        """Добавляет игрока в игру. Возвращает True если игра может начаться."""
-        if len(self.players) >= 2 or self.started:
+        """Добавляет игрока в игру. Возвращает True, если стол заполнен и игру пора начинать."""
+        if len(self.players) >= MAX_PLAYERS or self.started:
             return False
 
-        self.players[user_id] = Player(user_id, username)
+        if self._spare_players:
+            player = self._spare_players.pop()
+            player.reset(user_id, username)
+        else:
+            player = Player(user_id, username)
+        self.players[user_id] = player
+        self.version += 1
         
-        # Если это второй игрок, игра может начаться
-        return len(self.players) == 2
+        # Если стол заполнен, игра может начаться
+        return len(self.players) == MAX_PLAYERS
+
+    def can_start(self) -> bool:
+        """Проверяет, достаточно ли игроков для начала игры."""
+        return not self.started and self.min_players <= len(self.players) <= MAX_PLAYERS
 
     def start_game(self) -> None:
         """Начинает игру, раздает начальные карты."""
-        if len(self.players) != 2:
+        if not self.can_start():
             return
             
         self.started = True
@@ -111,37 +429,37 @@ class Game:
         for player in self.players.values():
             player.add_card(self.deck.deal_card())
             player.add_card(self.deck.deal_card())
+        if self.dealer_hand:
+            self.dealer_hand.add_card(self.deck.deal_card())
+            self.dealer_hand.add_card(self.deck.deal_card())
         
-        # Устанавливаем первого игрока
-        self.current_player_id = next(iter(self.players.keys()))
+        # Очередь хода - в порядке присоединения
+        self.turn_order.clear()
+        self.turn_order.extend(self.players)
+        self.active_count = len(self.turn_order)
+        self.current_player_id = self.turn_order[0]
+        self.version += 1
 
     def next_turn(self) -> None:
-        """Переход хода к следующему игроку."""
+        """Переход хода к следующему активному игроку за O(1)."""
         if not self.started or self.finished:
             return
             
-        # Находим всех игроков, которые еще не остановились и не перебрали
-        active_players = [pid for pid, player in self.players.items() 
-                          if not player.stopped and not player.busted]
+        if self.turn_order:
+            player = self.players[self.turn_order[0]]
+            if player.stopped or player.busted:
+                # Текущий игрок выбыл - убираем его из очереди
+                self.turn_order.popleft()
+            else:
+                self.turn_order.rotate(-1)
         
-        if not active_players:
+        if not self.turn_order:
             # Нет активных игроков, завершаем игру
             self.finish_game()
             return
         
-        if len(active_players) == 1:
-            # Один активный игрок
-            self.current_player_id = active_players[0]
-        else:
-            # Переключаем между двумя игроками
-            player_ids = list(self.players.keys())
-            current_index = player_ids.index(self.current_player_id)
-            next_index = (current_index + 1) % 2
-            self.current_player_id = player_ids[next_index]
-            
-            # Если следующий игрок уже остановился или перебрал, вернемся к первому
-            if self.players[self.current_player_id].stopped or self.players[self.current_player_id].busted:
-                self.current_player_id = player_ids[current_index]
+        self.current_player_id = self.turn_order[0]
+        self.version += 1
 
     def hit(self, user_id: int) -> Tuple[bool, Optional[Card]]:
         """Игрок берет карту. Возвращает (успех, карта)."""
@@ -157,9 +475,11 @@ class Game:
             return False, None
             
         player.add_card(card)
+        self.version += 1
         
         # Если игрок перебрал, проверяем завершение игры
         if player.busted:
+            self.active_count -= 1
             self.check_game_end()
         
         return True, card
@@ -174,6 +494,8 @@ class Game:
             return False
             
         player.stopped = True
+        self.active_count -= 1
+        self.version += 1
         
         # Проверяем, завершилась ли игра
         self.check_game_end()
@@ -185,53 +507,59 @@ class Game:
         if self.finished:
             return True
             
-        active_players = [pid for pid, player in self.players.items() 
-                        if not player.stopped and not player.busted]
-                        
-        if not active_players:
+        if self.active_count == 0:
             self.finish_game()
             return True
             
-        # Если один игрок перебрал, а второй еще может ходить, игра продолжается
+        # Пока есть игроки, которые могут ходить, игра продолжается
         return False
 
     def finish_game(self) -> None:
-        """Завершает игру и определяет победителя."""
+        """Завершает игру и определяет победителей."""
         if self.finished:
             return
             
         self.finished = True
+        self.current_player_id = None
+        self.version += 1
         
-        player_ids = list(self.players.keys())
-        if len(player_ids) != 2:
+        if len(self.players) < self.min_players:
             return
-            
-        player1, player2 = self.players[player_ids[0]], self.players[player_ids[1]]
         
-        # Проверяем на перебор
-        if player1.busted and player2.busted:
-            # Оба перебрали - оба проиграли
-            self.is_draw = True
+        if self.dealer:
+            self._settle_with_dealer()
             return
-            
-        if player1.busted:
-            self.winner_id = player2.user_id
-            return
-            
-        if player2.busted:
-            self.winner_id = player1.user_id
-            return
-            
-        # Сравниваем очки
-        score1, score2 = player1.get_score(), player2.get_score()
         
-        if score1 > score2:
-            self.winner_id = player1.user_id
-        elif score2 > score1:
-            self.winner_id = player2.user_id
+        # Побеждают не перебравшие игроки с наибольшей суммой очков
+        best_score = -1
+        for player in self.players.values():
+            if player.busted:
+                continue
+            score = player.get_score()
+            if score > best_score:
+                best_score = score
+                self.winner_ids = [player.user_id]
+            elif score == best_score:
+                self.winner_ids.append(player.user_id)
+        
+        if len(self.winner_ids) == 1:
+            self.winner_id = self.winner_ids[0]
         else:
+            # Все перебрали или несколько игроков набрали одинаково - ничья
             self.is_draw = True
 
+    def _settle_with_dealer(self) -> None:
+        """Дилер доигрывает свою руку, затем каждый игрок сравнивается с ним."""
+        if any(not player.busted for player in self.players.values()):
+            self.dealer.play(self.dealer_hand, self.deck)
+        
+        dealer_score, dealer_busted = self.dealer_hand.get_score(), self.dealer_hand.busted
+        for player in self.players.values():
+            result = Dealer.settle(player.get_score(), player.busted, dealer_score, dealer_busted)
+            self.results[player.user_id] = result
+            if result == RESULT_WIN:
+                self.winner_ids.append(player.user_id)
+
     def get_status_message(self) -> str:
         """Возвращает текстовое сообщение с текущим статусом игры."""
         if not self.started:
@@ -246,20 +574,219 @@ class Game:
         # Игра завершена
         result = "🏁 *Игра завершена!*\n\n"
         
+        if self.dealer_hand:
+            dealer = self.dealer_hand
+            result += f"🤵 *{dealer.username}*: {dealer.get_cards_str()} = *{dealer.get_score()}* очков"
+            if dealer.busted:
+                result += " (💥 Перебор!)"
+            result += "\n\n"
+        
         for player in self.players.values():
             result += f"👤 *{player.username}*: {player.get_cards_str()} = *{player.get_score()}* очков"
             if player.busted:
                 result += " (💥 Перебор!)"
+            if player.user_id in self.results:
+                result += f" - {RESULT_LABELS[self.results[player.user_id]]}"
             result += "\n"
+        
+        if self.dealer:
+            return result
             
         if self.is_draw:
-            result += "\n🤝 *Ничья!*"
+            if len(self.winner_ids) > 1:
+                names = ", ".join(self.players[pid].username for pid in self.winner_ids)
+                result += f"\n🤝 *Ничья между: {names}!*"
+            else:
+                result += "\n🤝 *Ничья!*"
         elif self.winner_id:
             winner = self.players.get(self.winner_id)
             if winner:
                 result += f"\n🏆 *Победитель: {winner.username}!*"
-                
+
+        return result
+
+    def get_status_report(self) -> Tuple[str, str]:
+        """Возвращает текст ответа на /game_status.
+        
+        Текст строится один раз на версию игры и берется из кэша, пока игра не изменится.
+        Для игры, ожидающей игроков, это две части: между ними вставляется оставшееся
+        время ожидания (оно меняется без изменения игры). Для идущей игры вторая часть пустая.
+        """
+        if self._status_cache is None or self._status_cache[0] != self.version:
+            self._status_cache = (self.version, self._render_status_report())
+        return self._status_cache[1]
+
+    def _render_status_report(self) -> Tuple[str, str]:
+        if not self.started:
+            players_info = ""
+            if self.players:
+                players_list = "\n".join(f"👤 `{player.username}`" for player in self.players.values())
+                players_info = f"👥 *Присоединившиеся игроки ({len(self.players)}/{MAX_PLAYERS}):*\n{players_list}\n"
+            return (
+                f"📊 *Статус игры:* Ожидание игроков\n{players_info}",
+                f"\n⚠️ Для начала игры необходимо минимум {self.min_players} игрока.\n"
+                f"🎮 Нажмите кнопку ниже, чтобы присоединиться:"
+            )
+        
+        # Список игроков с их статусами
+        players_info = []
+        for player in self.players.values():
+            status = "🎮"
+            if player.user_id == self.current_player_id:
+                status = "🎯"  # текущий ход
+            elif player.busted:
+                status = "💥"  # перебор
+            elif player.stopped:
+                status = "✋"  # остановился
+            players_info.append(f"{status} `{player.username}`: {player.get_score()} очков")
+        players_list = "\n".join(players_info)
+        
+        current_player = self.players.get(self.current_player_id)
+        player_name = current_player.username if current_player else "Неизвестный"
+        return (
+            f"📊 *Статус игры:* Активна\n"
+            f"👥 *Игроки:*\n{players_list}\n\n"
+            f"🎯 *Текущий ход:* `{player_name}`",
+            ""
+        )
+
+    def get_board_text(self) -> str:
+        """Возвращает текст живого табло игры для группового чата."""
+        if self.finished:
+            if self.match:
+                return self.get_status_message() + "\n\n" + self.match.get_totals_text(self.players)
+            return self.get_status_message()
+
+        if not self.started:
+            title = "🎮 *Игра в 21 против дилера*" if self.dealer else "🎮 *Игра в 21*"
+            if self.match:
+                title = f"🏟 *Матч в 21* (до {self.match.wins_needed} побед, раундов: {self.match.rounds})"
+            result = f"{title}\n👥 *Игроки ({len(self.players)}/{MAX_PLAYERS}):*\n"
+            for player in self.players.values():
+                result += f"👤 `{player.username}`\n"
+            if len(self.players) < self.min_players:
+                result += f"⏳ *Ожидаем еще {self.min_players - len(self.players)} игрока...*\n"
+            else:
+                result += "✅ *Можно начинать* или дождаться других игроков.\n"
+            return result
+
+        result = "🎲 *Игра в 21 идет*\n"
+        if self.match:
+            result = f"🎲 *Матч в 21: раунд {self.match.round_number} из {self.match.rounds}*\n"
+        if self.dealer_hand:
+            # Открыта только первая карта дилера
+            result += f"🤵 *Дилер:* [{self.dealer_hand.cards[0]}] [??]\n"
+        result += "👥 *Игроки:*\n"
+        for player in self.players.values():
+            status = "🎮"
+            if player.user_id == self.current_player_id:
+                status = "🎯"  # текущий ход
+            elif player.busted:
+                status = "💥"  # перебор
+            elif player.stopped:
+                status = "✋"  # остановился
+            result += f"{status} `{player.username}`: 🃏 {len(player.cards)} карт, *{player.get_score()}* очков\n"
+
+        current_player = self.players.get(self.current_player_id)
+        if current_player:
+            result += f"\n🎯 *Ход:* `{current_player.username}`"
         return result
 
-# Словарь для хранения активных игр (chat_id -> Game)
-active_games = {} 
\ No newline at end of file
+# Сколько завершенных игр держать в пуле для повторного использования
+GAME_POOL_SIZE = 256
+# Через сколько секунд после возврата в пул игру можно отдать новому столу: запас
+# для обработчиков, которые нашли игру до ее завершения и еще отвечают на нажатие
+GAME_POOL_REUSE_DELAY = 60.0
+
+class GamePool:
+    """Ограниченный список свободных объектов Game.
+    
+    Новая игра берется из пула и сбрасывается через Game.reset() вместо создания
+    новых Game, Deck, Player и их контейнеров. Игру возвращает в пул тот, кто удалил ее
+    из реестра (unregister_game), - после отмены ее фоновых задач и последней правки
+    табло. Выдается она снова не раньше чем через reuse_delay секунд.
+    """
+
+    def __init__(self, max_size: int = GAME_POOL_SIZE, reuse_delay: float = GAME_POOL_REUSE_DELAY):
+        self.max_size = max_size
+        self.reuse_delay = reuse_delay
+        # Свободные игры в порядке освобождения: (time.monotonic(), игра)
+        self._free: Deque[Tuple[float, Game]] = deque()
+        self.created = 0
+        self.reused = 0
+
+    def acquire(self, chat_id: int, dealer: Optional[Dealer] = None,
+                game_id: Optional[int] = None, seed: Optional[int] = None,
+                rng: Optional[random.Random] = None, match: Optional["Match"] = None) -> Game:
+        """Возвращает новую игру (аргументы как у конструктора Game)."""
+        if self._free and time.monotonic() - self._free[0][0] >= self.reuse_delay:
+            _, game = self._free.popleft()
+            game.reset(chat_id, dealer, game_id, seed, rng, match)
+            self.reused += 1
+            return game
+        self.created += 1
+        return Game(chat_id, dealer, game_id, seed, rng, match)
+
+    def release(self, game: Game) -> None:
+        """Возвращает игру в пул; если пул заполнен, игра остается сборщику мусора."""
+        if active_games.get(game.game_id) is game:
+            # Игра еще в реестре: ее нельзя отдать другому столу
+            return
+        if len(self._free) < self.max_size:
+            self._free.append((time.monotonic(), game))
+
+    def __len__(self) -> int:
+        return len(self._free)
+
+    def __iter__(self) -> Iterator[Game]:
+        """Свободные игры (для отчета о памяти)."""
+        return (game for _, game in self._free)
+
+game_pool = GamePool()
+
+# Активные игры (game_id -> Game). В одном чате может идти несколько игр одновременно
+active_games: Dict[int, Game] = {}
+
+# Игры каждого чата (chat_id -> {game_id: Game})
+chat_games: Dict[int, Dict[int, Game]] = {}
+
+# Игры, за столы которых сел пользователь (user_id -> {game_id: Game}), в порядке присоединения.
+# Пользователь может играть в нескольких чатах (или за несколькими столами одного чата)
+player_games: Dict[int, Dict[int, Game]] = {}
+
+def register_game(game: Game) -> None:
+    """Добавляет игру в реестр активных игр."""
+    active_games[game.game_id] = game
+    chat_games.setdefault(game.chat_id, {})[game.game_id] = game
+
+def register_player(game: Game, user_id: int) -> None:
+    """Запоминает, что пользователь сел за стол этой игры."""
+    player_games.setdefault(user_id, {})[game.game_id] = game
+
+def unregister_game(game: Game) -> bool:
+    """Удаляет игру и связанные с ней записи из реестра.
+
+    Возвращает True, если игра была в реестре: тогда вызвавший должен вернуть ее
+    в пул (game_pool.release), когда закончит с ней работать.
+    """
+    registered = active_games.pop(game.game_id, None) is game
+    games = chat_games.get(game.chat_id)
+    if games is not None:
+        games.pop(game.game_id, None)
+        if not games:
+            del chat_games[game.chat_id]
+    for user_id in game.players:
+        user_games = player_games.get(user_id)
+        if user_games is not None and user_games.get(game.game_id) is game:
+            del user_games[game.game_id]
+            if not user_games:
+                del player_games[user_id]
+    return registered
+
+def get_chat_games(chat_id: int) -> List[Game]:
+    """Возвращает активные игры чата в порядке создания."""
+    return list(chat_games.get(chat_id, {}).values())
+
+def get_player_games(user_id: int) -> List[Game]:
+    """Возвращает активные игры пользователя в порядке присоединения."""
+    return list(player_games.get(user_id, {}).values())
@@ -0,0 +1,523 @@
+"""Журнал игр: компактный бинарный лог действий для точного воспроизведения партий.
+
+Для каждой игры записываются ее seed и параметры, а затем все принятые действия
+(join, start, hit, stand, timeout). Порядок карт однозначно восстанавливается из seed,
+поэтому по журналу можно пересобрать точное состояние любой игры. Если колода перемешана
+криптостойким генератором (seed нет), вместо seed записывается сам порядок карт.
+
+Формат записи (little-endian):
+    REC_GAME:   тип (B), game_id (Q), chat_id (q), seed (Q), дилер stand_on (B, 0 - без дилера), флаги (B)
+                [+ 52 байта порядка колоды, если стоит FLAG_DECK_ORDER].
+                Старшие 4 бита флагов - число раундов матча (0 - одна партия)
+    действия:   тип (B), game_id (Q), user_id (q)
+    REC_JOIN:   как действие + длина имени (B) + имя в UTF-8
+    REC_NEXT_ROUND: как действие, вместо user_id - 1, если дальше идут 52 байта нового
+                порядка колоды (ее перемешали перед раундом), иначе 0
+
+Запись идет в буфер в памяти; на диск он сбрасывается пачками с fsync в отдельном
+потоке, чтобы не задерживать обработчики. Файлы ротируются по размеру.
+"""
+import asyncio
+import logging
+import os
+import struct
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from dealer import Dealer, DealerRules
+from events import Join, Start, Hit, Stand, Timeout, NextRound
+from game import Deck, Game, FULL_DECK, MAX_PLAYERS
+from match import Match
+from rng import make_rng
+from supervisor import TaskSupervisor
+
+logger = logging.getLogger(__name__)
+
+REC_GAME = 1
+REC_JOIN = 2
+REC_START = 3
+REC_HIT = 4
+REC_STAND = 5
+REC_TIMEOUT = 6
+REC_NEXT_ROUND = 7
+
+FLAG_HIT_SOFT_17 = 1
+FLAG_DECK_ORDER = 2
+MATCH_ROUNDS_SHIFT = 4
+
+DECK_ORDER_SIZE = len(FULL_DECK)
+
+GAME_STRUCT = struct.Struct("<BQqQBB")
+ACTION_STRUCT = struct.Struct("<BQq")
+NAME_LEN_STRUCT = struct.Struct("<B")
+
+LOG_FILE_PREFIX = "games-"
+LOG_FILE_SUFFIX = ".log"
+
+# Параметры по умолчанию
+DEFAULT_MAX_FILE_SIZE = 64 * 1024 * 1024
+DEFAULT_FLUSH_INTERVAL = 1.0
+DEFAULT_FLUSH_BYTES = 64 * 1024
+
+def encode_game(game: Game) -> bytes:
+    """Кодирует заголовок игры."""
+    stand_on, flags = 0, 0
+    if game.dealer:
+        stand_on = game.dealer.rules.stand_on
+        if game.dealer.rules.hit_soft_17:
+            flags |= FLAG_HIT_SOFT_17
+    if game.match:
+        flags |= game.match.rounds << MATCH_ROUNDS_SHIFT
+    if game.seed is None:
+        # Колоду нельзя восстановить по seed - записываем ее порядок (до раздачи)
+        flags |= FLAG_DECK_ORDER
+        return GAME_STRUCT.pack(REC_GAME, game.game_id, game.chat_id, 0, stand_on, flags) + game.deck.get_order()
+    return GAME_STRUCT.pack(REC_GAME, game.game_id, game.chat_id, game.seed, stand_on, flags)
+
+def encode_action(game_id: int, action) -> bytes:
+    """Кодирует действие игрока."""
+    if isinstance(action, Hit):
+        return ACTION_STRUCT.pack(REC_HIT, game_id, action.user_id)
+    if isinstance(action, Stand):
+        return ACTION_STRUCT.pack(REC_STAND, game_id, action.user_id)
+    if isinstance(action, Join):
+        name = action.username.encode("utf-8")[:255].decode("utf-8", "ignore").encode("utf-8")
+        return ACTION_STRUCT.pack(REC_JOIN, game_id, action.user_id) + NAME_LEN_STRUCT.pack(len(name)) + name
+    if isinstance(action, Start):
+        return ACTION_STRUCT.pack(REC_START, game_id, action.user_id or 0)
+    if isinstance(action, Timeout):
+        return ACTION_STRUCT.pack(REC_TIMEOUT, game_id, 0)
+    if isinstance(action, NextRound):
+        if action.deck_order is None:
+            return ACTION_STRUCT.pack(REC_NEXT_ROUND, game_id, 0)
+        return ACTION_STRUCT.pack(REC_NEXT_ROUND, game_id, 1) + action.deck_order
+    raise ValueError(f"Неизвестное действие: {action!r}")
+
+def iter_records(data: bytes) -> Iterator[Tuple]:
+    """Разбирает байты журнала на записи.
+
+    Возвращает кортежи (REC_GAME, game_id, chat_id, seed, stand_on, flags, порядок колоды или None)
+    или (тип, game_id, действие). Оборванная последняя запись пропускается.
+    """
+    view = memoryview(data)
+    size = len(view)
+    offset = 0
+    game_size, action_size = GAME_STRUCT.size, ACTION_STRUCT.size
+    while offset < size:
+        rec_type = view[offset]
+        if rec_type == REC_GAME:
+            if offset + game_size > size:
+                return
+            record = GAME_STRUCT.unpack_from(view, offset)
+            offset += game_size
+            order = None
+            if record[5] & FLAG_DECK_ORDER:
+                if offset + DECK_ORDER_SIZE > size:
+                    return
+                order = bytes(view[offset:offset + DECK_ORDER_SIZE])
+                offset += DECK_ORDER_SIZE
+            yield record + (order,)
+            continue
+
+        if offset + action_size > size:
+            return
+        rec_type, game_id, user_id = ACTION_STRUCT.unpack_from(view, offset)
+        offset += action_size
+        if rec_type == REC_HIT:
+            yield rec_type, game_id, Hit(user_id)
+        elif rec_type == REC_STAND:
+            yield rec_type, game_id, Stand(user_id)
+        elif rec_type == REC_JOIN:
+            if offset >= size:
+                return
+            name_len = view[offset]
+            if offset + 1 + name_len > size:
+                return
+            name = bytes(view[offset + 1:offset + 1 + name_len]).decode("utf-8", "replace")
+            offset += 1 + name_len
+            yield rec_type, game_id, Join(user_id, name)
+        elif rec_type == REC_START:
+            yield rec_type, game_id, Start(user_id or None)
+        elif rec_type == REC_TIMEOUT:
+            yield rec_type, game_id, Timeout()
+        elif rec_type == REC_NEXT_ROUND:
+            order = None
+            if user_id:
+                if offset + DECK_ORDER_SIZE > size:
+                    return
+                order = bytes(view[offset:offset + DECK_ORDER_SIZE])
+                offset += DECK_ORDER_SIZE
+            yield rec_type, game_id, NextRound(order)
+        else:
+            raise ValueError(f"Поврежденный журнал: неизвестный тип записи {rec_type} на позиции {offset - action_size}")
+
+def list_log_files(directory: str) -> List[str]:
+    """Возвращает файлы журнала в порядке записи."""
+    if not os.path.isdir(directory):
+        return []
+    names = [name for name in os.listdir(directory)
+             if name.startswith(LOG_FILE_PREFIX) and name.endswith(LOG_FILE_SUFFIX)]
+    names.sort(key=lambda name: int(name[len(LOG_FILE_PREFIX):-len(LOG_FILE_SUFFIX)]))
+    return [os.path.join(directory, name) for name in names]
+
+def replay(paths: List[str], game_ids: Optional[set] = None) -> Dict[int, Game]:
+    """Воспроизводит игры из файлов журнала. Возвращает game_id -> Game.
+
+    Если задан game_ids, восстанавливаются только эти игры.
+    """
+    games: Dict[int, Game] = {}
+    for path in paths:
+        with open(path, "rb") as f:
+            data = f.read()
+        for record in iter_records(data):
+            game_id = record[1]
+            if game_ids is not None and game_id not in game_ids:
+                continue
+            if record[0] == REC_GAME:
+                _, game_id, chat_id, seed, stand_on, flags, order = record
+                dealer = None
+                if stand_on:
+                    dealer = Dealer(DealerRules(stand_on, bool(flags & FLAG_HIT_SOFT_17)))
+                rounds = flags >> MATCH_ROUNDS_SHIFT
+                game = Game(chat_id, dealer=dealer, game_id=game_id, seed=seed,
+                            match=Match(rounds) if rounds else None)
+                if order is not None:
+                    game.seed = None
+                    game.deck = Deck.from_order(order)
+                games[game_id] = game
+            else:
+                game = games.get(game_id)
+                if game is not None:
+                    game.apply(record[2])
+    return games
+
+# Итог игры в быстром воспроизведении: (завершена, победители, суммы игроков в порядке входа).
+# Для матча - итог последнего сыгранного раунда, как game.winner_ids у восстановленной Game
+ReplayOutcome = Tuple[bool, Tuple[int, ...], Tuple[int, ...]]
+
+# Таблица для bytes.translate: индекс карты в FULL_DECK -> ее очки, туз - 1. Итог партии
+# зависит только от очков карт, поэтому колода хранится как их последовательность
+ACE_VALUE = 1
+CARD_VALUE_TABLE = bytes(ACE_VALUE if card.rank == "A" else card.value for card in FULL_DECK).ljust(256, b"\0")
+
+def _deal_values(order: bytes) -> bytes:
+    """Очки карт в порядке раздачи (Deck.deal_card берет карты с конца списка)."""
+    return order.translate(CARD_VALUE_TABLE)[::-1]
+
+def _hand_score(hand: bytes) -> int:
+    """Сумма руки (как Player.get_score): один туз считается за 11, если это не дает перебора."""
+    total = sum(hand)
+    if total <= 11 and ACE_VALUE in hand:
+        return total + 10
+    return total
+
+class _FastGame:
+    """Игра в быстром воспроизведении: очки карт вместо Game, Player и Deck.
+
+    В журнале только принятые действия, а игроки ходят строго по очереди входа: каждый
+    берет карты, пока не остановится или не переберет. Поэтому раунд не разыгрывается
+    по одной карте: при разборе действия только копятся (hits, stands), а руки считаются
+    один раз в settle() - карты каждого игрока идут в колоде подряд.
+    """
+    __slots__ = ("deck", "dealt", "users", "hits", "stands", "started", "finished", "settled",
+                 "stand_on", "hit_soft_17", "rounds", "round_number", "wins", "match_finished",
+                 "winners", "scores")
+
+    def __init__(self, deck: bytes, stand_on: int, flags: int):
+        # Очки карт в порядке раздачи и сколько карт уже роздано
+        self.deck = deck
+        self.dealt = 0
+        self.users: List[int] = []
+        # ID игроков из принятых "взять" и "остановиться" текущего раунда
+        self.hits: List[int] = []
+        self.stands: List[int] = []
+        self.started = False
+        self.finished = False
+        self.settled = False
+        self.stand_on = stand_on
+        self.hit_soft_17 = flags & FLAG_HIT_SOFT_17
+        self.rounds = flags >> MATCH_ROUNDS_SHIFT
+        self.round_number = 1
+        self.wins: Optional[Dict[int, int]] = None
+        self.match_finished = False
+        self.winners: Tuple[int, ...] = ()
+        self.scores: Tuple[int, ...] = ()
+
+    def can_start(self) -> bool:
+        return not self.started and (1 if self.stand_on else 2) <= len(self.users) <= MAX_PLAYERS
+
+    def settle(self) -> None:
+        """Считает руки раунда, а если все игроки доиграли - итоги (как Game.finish_game)."""
+        if self.settled:
+            return
+        self.settled = True
+        users = self.users
+        if not self.started:
+            self.scores = (0,) * len(users)
+            return
+        deck, start = self.deck, self.dealt
+        # Раздача: по две карты игрокам, затем дилеру; добор идет после нее подряд по игрокам
+        end = start + 2 * len(users) + (2 if self.stand_on else 0)
+        hits = self.hits
+        scores = []
+        for user_id in users:
+            taken = hits.count(user_id)
+            scores.append(_hand_score(deck[start:start + 2] + deck[end:end + taken]))
+            start += 2
+            end += taken
+        self.scores = tuple(scores)
+        self.dealt = end
+        # Игроки ходят по очереди: раунд окончен, когда доиграл последний
+        if scores[-1] <= 21 and users[-1] not in self.stands:
+            return
+        self.finished = True
+        if self.stand_on:
+            dealer_score = 0
+            if min(scores) <= 21:
+                dealer_score = self._play_dealer(deck[start:start + 2])
+                if dealer_score > 21:
+                    dealer_score = 0
+            self.winners = credited = tuple(
+                user_id for user_id, score in zip(users, scores) if dealer_score < score <= 21)
+        else:
+            best = -1
+            for score in scores:
+                if best < score <= 21:
+                    best = score
+            self.winners = tuple(user_id for user_id, score in zip(users, scores) if score == best)
+            # Ничья (несколько лучших или все перебрали) в матче не засчитывается никому
+            credited = self.winners if len(self.winners) == 1 else ()
+        if self.rounds:
+            if self.wins is None:
+                self.wins = dict.fromkeys(users, 0)
+            for user_id in credited:
+                self.wins[user_id] += 1
+            self.match_finished = (self.round_number >= self.rounds
+                                   or max(self.wins.values()) >= self.rounds // 2 + 1)
+
+    def _play_dealer(self, hand: bytes) -> int:
+        """Дилер добирает по правилам Dealer.should_hit. Возвращает его сумму."""
+        stand_on, dealt = self.stand_on, self.dealt
+        while True:
+            total = sum(hand)
+            soft = total <= 11 and ACE_VALUE in hand
+            score = total + 10 if soft else total
+            if dealt >= DECK_ORDER_SIZE or not (
+                    score < stand_on or (score == stand_on and self.hit_soft_17 and soft)):
+                break
+            hand += self.deck[dealt:dealt + 1]
+            dealt += 1
+        self.dealt = dealt
+        return score
+
+    def next_round(self, order: Optional[bytes]) -> None:
+        """Следующий раунд матча (как Game.reset_round и Game._apply_next_round)."""
+        self.settle()
+        if not self.rounds or self.match_finished or not self.finished:
+            return
+        self.hits, self.stands = [], []
+        self.winners = ()
+        self.started = self.finished = self.settled = False
+        # Если колоду перемешали, ее новый порядок записан в REC_NEXT_ROUND (см. main.apply_action)
+        if order is not None:
+            self.deck, self.dealt = _deal_values(order), 0
+        self.round_number += 1
+        self.started = self.can_start()
+
+    def outcome(self) -> ReplayOutcome:
+        self.settle()
+        return self.finished, self.winners, self.scores
+
+def _seeded_order(seed: int) -> bytes:
+    """Порядок колоды, перемешанной по seed (shuffle зависит только от длины списка)."""
+    indices = list(range(DECK_ORDER_SIZE))
+    make_rng(seed).shuffle(indices)
+    return bytes(indices)
+
+def replay_outcomes(paths: List[str]) -> Dict[int, ReplayOutcome]:
+    """Быстрое воспроизведение всех игр журнала: game_id -> (завершена, победители, суммы).
+
+    Записи разбираются прямо из байтов, а руки считаются по очкам карт из записанного
+    порядка колоды (или порядка, выведенного из seed) без объектов Game, Player и Deck.
+    Итоги совпадают с replay() для журнала, записанного ботом; полное восстановление
+    нужно только для вывода конкретных партий.
+    """
+    states: Dict[int, _FastGame] = {}
+    game_size, action_size = GAME_STRUCT.size, ACTION_STRUCT.size
+    unpack_game, unpack_action = GAME_STRUCT.unpack_from, ACTION_STRUCT.unpack_from
+    for path in paths:
+        with open(path, "rb") as f:
+            data = f.read()
+        size = len(data)
+        offset = 0
+        # Действия одной игры обычно идут подряд - последнюю найденную игру не ищем заново
+        last_id, game = None, None
+        while offset < size:
+            if data[offset] == REC_GAME:
+                if offset + game_size > size:
+                    break
+                _, game_id, _, seed, stand_on, flags = unpack_game(data, offset)
+                offset += game_size
+                if flags & FLAG_DECK_ORDER:
+                    if offset + DECK_ORDER_SIZE > size:
+                        break
+                    order = data[offset:offset + DECK_ORDER_SIZE]
+                    offset += DECK_ORDER_SIZE
+                else:
+                    order = _seeded_order(seed)
+                states[game_id] = game = _FastGame(_deal_values(order), stand_on, flags)
+                last_id = game_id
+                continue
+
+            if offset + action_size > size:
+                break
+            rec_type, game_id, user_id = unpack_action(data, offset)
+            offset += action_size
+            if game_id != last_id:
+                last_id, game = game_id, states.get(game_id)
+            if rec_type == REC_HIT:
+                if game is not None:
+                    game.hits.append(user_id)
+            elif rec_type == REC_STAND:
+                if game is not None:
+                    game.stands.append(user_id)
+            elif rec_type == REC_JOIN:
+                if offset >= size or offset + 1 + data[offset] > size:
+                    break
+                offset += 1 + data[offset]
+                if game is not None:
+                    users = game.users
+                    users.append(user_id)
+                    # Стол заполнен - игра начинается сразу
+                    if len(users) == MAX_PLAYERS:
+                        game.started = True
+            elif rec_type == REC_START:
+                if game is not None:
+                    game.started = True
+            elif rec_type == REC_TIMEOUT:
+                # Записан, только если игра еще не началась
+                if game is not None:
+                    if game.can_start():
+                        game.started = True
+                    else:
+                        game.finished = True
+            elif rec_type == REC_NEXT_ROUND:
+                order = None
+                if user_id:
+                    if offset + DECK_ORDER_SIZE > size:
+                        break
+                    order = data[offset:offset + DECK_ORDER_SIZE]
+                    offset += DECK_ORDER_SIZE
+                if game is not None:
+                    game.next_round(order)
+            else:
+                raise ValueError(f"Поврежденный журнал: неизвестный тип записи {rec_type} на позиции {offset - action_size}")
+    return {game_id: game.outcome() for game_id, game in states.items()}
+
+
+class GameLog:
+    """Append-only журнал игр с буферизацией и пакетным fsync.
+
+    record_game()/record_action() только дописывают байты в буфер в памяти.
+    Сброс на диск (write + fsync) выполняется в пуле потоков раз в flush_interval
+    секунд или раньше, если в буфере накопилось flush_bytes байт.
+    """
+
+    def __init__(self, directory: str, max_file_size: int = DEFAULT_MAX_FILE_SIZE,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL, flush_bytes: int = DEFAULT_FLUSH_BYTES,
+                 supervisor: Optional[TaskSupervisor] = None):
+        self.directory = directory
+        self.max_file_size = max_file_size
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+        self._buffer = bytearray()
+        self._file = None
+        self._file_index = 0
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._loop_task: Optional[asyncio.Task] = None
+        # Задачи сброса запускаются через supervisor (служебные, вне лимита задач игр)
+        self.supervisor = supervisor
+
+    def record_game(self, game: Game) -> None:
+        """Записывает заголовок новой игры."""
+        self._append(encode_game(game))
+
+    def record_action(self, game_id: int, action) -> None:
+        """Записывает принятое действие игрока."""
+        self._append(encode_action(game_id, action))
+
+    def _append(self, data: bytes) -> None:
+        self._buffer += data
+        if len(self._buffer) >= self.flush_bytes and (self._flush_task is None or self._flush_task.done()):
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                # Нет запущенного цикла событий (например, в скриптах) - пишем синхронно
+                self._write(self._take_buffer())
+                return
+            self._flush_task = self._spawn(self.flush(), "gamelog_flush")
+
+    def start(self) -> None:
+        """Запускает периодический сброс буфера на диск."""
+        if self._loop_task is None:
+            self._loop_task = self._spawn(self._flush_loop(), "gamelog_flush_loop")
+
+    def _spawn(self, coro, name: str) -> asyncio.Task:
+        if self.supervisor:
+            return self.supervisor.spawn(coro, name=name)
+        return asyncio.get_running_loop().create_task(coro)
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Ошибка при записи журнала игр: {e}")
+
+    async def flush(self) -> None:
+        """Сбрасывает буфер на диск в пуле потоков."""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            data = self._take_buffer()
+            if data:
+                await asyncio.get_running_loop().run_in_executor(None, self._write, data)
+
+    async def close(self) -> None:
+        """Останавливает периодический сброс, дописывает буфер и закрывает файл."""
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            self._loop_task = None
+        await self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _take_buffer(self) -> bytes:
+        data, self._buffer = bytes(self._buffer), bytearray()
+        return data
+
+    def _write(self, data: bytes) -> None:
+        """Пишет данные в текущий файл и делает fsync. Выполняется вне цикла событий."""
+        if self._file is None or self._file.tell() >= self.max_file_size:
+            self._rotate()
+        self._file.write(data)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _rotate(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        os.makedirs(self.directory, exist_ok=True)
+        existing = list_log_files(self.directory)
+        if existing and self._file is None:
+            # После перезапуска продолжаем последний файл, если в нем есть место
+            last = existing[-1]
+            self._file_index = int(os.path.basename(last)[len(LOG_FILE_PREFIX):-len(LOG_FILE_SUFFIX)])
+            if os.path.getsize(last) < self.max_file_size:
+                self._file = open(last, "ab")
+                return
+        self._file_index += 1
+        path = os.path.join(self.directory, f"{LOG_FILE_PREFIX}{self._file_index}{LOG_FILE_SUFFIX}")
+        self._file = open(path, "ab")
@@ -0,0 +1,156 @@
+"""HTTP-сессия для запросов к Bot API с настроенным пулом соединений.
+
+Все запросы бота идут на один хост, поэтому пул keep-alive соединений держится
+открытым и переиспользуется: установка TCP/TLS соединения не попадает в каждый
+send_message. Адрес хоста кэшируется (DNS), у быстрых методов свои, короткие
+тайм-ауты. Статистика запросов и соединений собирается через trace-хуки aiohttp
+и отдается в /metrics (см. server.py).
+"""
+import time
+from typing import Any, Dict, Optional
+
+from aiohttp import ClientSession, TraceConfig
+from aiohttp.hdrs import USER_AGENT
+from aiohttp.http import SERVER_SOFTWARE
+from aiogram import Bot, __version__
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+
+# Тайм-ауты (в секундах) для отдельных методов; остальные - общий тайм-аут сессии.
+# На нажатие кнопки Telegram ждет ответа около 15 секунд, дольше ждать нет смысла
+METHOD_TIMEOUTS = {
+    "answerCallbackQuery": 10,
+    "sendChatAction": 5,
+    "sendMessage": 15,
+    "editMessageText": 15,
+    "editMessageReplyMarkup": 15,
+    "deleteMessage": 10,
+    "getMe": 10,
+}
+
+class MethodStats:
+    """Счетчики запросов одного метода Bot API."""
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def record(self, elapsed: float, error: bool) -> None:
+        self.count += 1
+        self.errors += int(error)
+        self.total_time += elapsed
+        self.max_time = max(self.max_time, elapsed)
+
+class SessionStats:
+    """Статистика запросов и соединений сессии."""
+
+    def __init__(self):
+        self.methods: Dict[str, MethodStats] = {}
+        # Новые соединения и запросы, отправленные по уже открытому соединению
+        self.connections_created = 0
+        self.connections_reused = 0
+        # Запросы, ждавшие свободного соединения в пуле, и суммарное время ожидания
+        self.pool_waits = 0
+        self.pool_wait_time = 0.0
+        self.dns_cache_hits = 0
+        self.dns_cache_misses = 0
+
+    def record(self, method: str, elapsed: float, error: bool) -> None:
+        stats = self.methods.get(method)
+        if stats is None:
+            stats = self.methods[method] = MethodStats()
+        stats.record(elapsed, error)
+
+    def as_metrics(self) -> Dict[str, float]:
+        """Плоский словарь метрик (имя -> значение) для /metrics."""
+        metrics = {
+            "http_connections_created": self.connections_created,
+            "http_connections_reused": self.connections_reused,
+            "http_pool_waits": self.pool_waits,
+            "http_pool_wait_seconds": round(self.pool_wait_time, 6),
+            "http_dns_cache_hits": self.dns_cache_hits,
+            "http_dns_cache_misses": self.dns_cache_misses,
+        }
+        for method, stats in sorted(self.methods.items()):
+            metrics[f'api_requests{{method="{method}"}}'] = stats.count
+            metrics[f'api_errors{{method="{method}"}}'] = stats.errors
+            metrics[f'api_latency_avg_seconds{{method="{method}"}}'] = round(stats.total_time / stats.count, 6)
+            metrics[f'api_latency_max_seconds{{method="{method}"}}'] = round(stats.max_time, 6)
+        return metrics
+
+class TunedAiohttpSession(AiohttpSession):
+    """AiohttpSession с настроенным пулом соединений, тайм-аутами по методам и статистикой."""
+
+    def __init__(self, pool_size: int = 100, keepalive_timeout: float = 60.0, dns_ttl: int = 300,
+                 method_timeouts: Optional[Dict[str, float]] = None, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._connector_init.update(
+            # Все запросы идут на один хост: лимит на хост равен размеру пула
+            limit=pool_size,
+            limit_per_host=pool_size,
+            keepalive_timeout=keepalive_timeout,
+            ttl_dns_cache=dns_ttl,
+        )
+        self.method_timeouts = METHOD_TIMEOUTS if method_timeouts is None else method_timeouts
+        self.stats = SessionStats()
+
+    def _trace_config(self) -> TraceConfig:
+        stats = self.stats
+        trace = TraceConfig()
+
+        async def on_connection_create_end(session, context, params):
+            stats.connections_created += 1
+
+        async def on_connection_reuseconn(session, context, params):
+            stats.connections_reused += 1
+
+        async def on_connection_queued_start(session, context, params):
+            context.queued_at = time.perf_counter()
+
+        async def on_connection_queued_end(session, context, params):
+            stats.pool_waits += 1
+            stats.pool_wait_time += time.perf_counter() - context.queued_at
+
+        async def on_dns_cache_hit(session, context, params):
+            stats.dns_cache_hits += 1
+
+        async def on_dns_cache_miss(session, context, params):
+            stats.dns_cache_misses += 1
+
+        trace.on_connection_create_end.append(on_connection_create_end)
+        trace.on_connection_reuseconn.append(on_connection_reuseconn)
+        trace.on_connection_queued_start.append(on_connection_queued_start)
+        trace.on_connection_queued_end.append(on_connection_queued_end)
+        trace.on_dns_cache_hit.append(on_dns_cache_hit)
+        trace.on_dns_cache_miss.append(on_dns_cache_miss)
+        return trace
+
+    async def create_session(self) -> ClientSession:
+        if self._should_reset_connector:
+            await self.close()
+        if self._session is None or self._session.closed:
+            # Как в AiohttpSession.create_session, но с trace-хуками
+            self._session = ClientSession(
+                connector=self._connector_type(**self._connector_init),
+                headers={USER_AGENT: f"{SERVER_SOFTWARE} aiogram/{__version__}"},
+                trace_configs=[self._trace_config()],
+            )
+            self._should_reset_connector = False
+        return self._session
+
+    async def make_request(self, bot: Bot, method: TelegramMethod[TelegramType],
+                           timeout: Optional[int] = None) -> TelegramType:
+        name = method.__api_method__
+        if timeout is None:
+            timeout = self.method_timeouts.get(name)
+        started = time.perf_counter()
+        error = True
+        try:
+            result = await super().make_request(bot, method, timeout)
+            error = False
+            return result
+        finally:
+            self.stats.record(name, time.perf_counter() - started, error)
@@ -1,16 +1,58 @@
+import base64
+import binascii
+import struct
+from typing import Optional, Tuple
+
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
-def get_join_keyboard() -> InlineKeyboardMarkup:
-    """Создаёт инлайн-клавиатуру с кнопкой присоединения к игре."""
+# Действия кнопок (первый символ callback_data)
+ACTION_JOIN = "j"
+ACTION_START = "g"
+ACTION_HIT = "h"
+ACTION_STAND = "s"
+ACTION_HINT = "a"
+
+# callback_data: символ действия + base64url от упакованных game_id (Q) и номера хода (I).
+# Всего 17 символов - с запасом укладывается в лимит Telegram в 64 байта
+CALLBACK_STRUCT = struct.Struct("<QI")
+CALLBACK_DATA_SIZE = 1 + len(base64.urlsafe_b64encode(bytes(CALLBACK_STRUCT.size)))
+
+def pack_callback_data(action: str, game_id: int, turn_seq: int = 0) -> str:
+    """Упаковывает действие, game_id и номер хода игры в callback_data кнопки."""
+    return action + base64.urlsafe_b64encode(CALLBACK_STRUCT.pack(game_id, turn_seq)).decode("ascii")
+
+def unpack_callback_data(data: Optional[str]) -> Optional[Tuple[str, int, int]]:
+    """Разбирает callback_data на (действие, game_id, номер хода). Для чужих данных возвращает None."""
+    if not data or len(data) != CALLBACK_DATA_SIZE:
+        return None
+    try:
+        game_id, turn_seq = CALLBACK_STRUCT.unpack(base64.urlsafe_b64decode(data[1:]))
+    except (binascii.Error, struct.error, ValueError):
+        return None
+    return data[0], game_id, turn_seq
+
+def get_join_keyboard(game_id: int, can_start: bool = False) -> InlineKeyboardMarkup:
+    """Создаёт инлайн-клавиатуру с кнопкой присоединения к игре.
+
+    Если игроков уже достаточно, добавляется кнопка досрочного начала игры.
+    """
     builder = InlineKeyboardBuilder()
-    builder.button(text="🎮 Присоединиться к игре", callback_data="join_game")
+    builder.button(text="🎮 Присоединиться к игре", callback_data=pack_callback_data(ACTION_JOIN, game_id))
+    if can_start:
+        builder.button(text="🚀 Начать игру", callback_data=pack_callback_data(ACTION_START, game_id))
+    builder.adjust(1)
     return builder.as_markup()
 
-def get_game_actions_keyboard() -> InlineKeyboardMarkup:
-    """Создаёт инлайн-клавиатуру с кнопками игровых действий."""
+def get_game_actions_keyboard(game_id: int, turn_seq: int, hint: bool = False) -> InlineKeyboardMarkup:
+    """Создаёт инлайн-клавиатуру с кнопками игровых действий для текущего хода игры.
+
+    С hint под ними добавляется кнопка подсказки по таблице стратегии.
+    """
     builder = InlineKeyboardBuilder()
-    builder.button(text="🃏 Взять карту", callback_data="hit")
-    builder.button(text="🛑 Остановиться", callback_data="stand")
+    builder.button(text="🃏 Взять карту", callback_data=pack_callback_data(ACTION_HIT, game_id, turn_seq))
+    builder.button(text="🛑 Остановиться", callback_data=pack_callback_data(ACTION_STAND, game_id, turn_seq))
+    if hint:
+        builder.button(text="💡 Подсказка", callback_data=pack_callback_data(ACTION_HINT, game_id, turn_seq))
     builder.adjust(2)  # Располагаем кнопки в один ряд
-    return builder.as_markup() 
\ No newline at end of file
+    return builder.as_markup()
@@ -0,0 +1,348 @@
+"""Нагрузочный тест бота: webhook против long polling. Запуск: python loadtest.py [опции]
+
+Бот запускается отдельным процессом и работает с тестовым сервером Bot API
+(TELEGRAM_API_URL), который поднимает этот скрипт. Сервер отвечает на вызовы бота
+с задержкой --api-latency и играет за пользователей: в каждом групповом чате
+открывается стол, игроки присоединяются, жмут кнопки из личных сообщений бота
+(берут карту, пока сумма меньше 17) и после окончания партии начинают новую.
+
+В режиме polling обновления отдаются через getUpdates, в режиме webhook сервер
+отправляет их POST-запросами на вебхук бота (python server.py), как Telegram -
+не больше WEBHOOK_CONNECTIONS одновременно.
+
+Результат: обновлений в секунду, задержка ответа на нажатие кнопки
+(от отправки обновления до answerCallbackQuery), число вызовов Bot API и
+TCP-соединений, по которым они пришли.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import re
+import signal
+import socket
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+from aiohttp import ClientSession, web
+
+from config import POLLING_CONCURRENCY
+from keyboards import pack_callback_data, unpack_callback_data, ACTION_JOIN, ACTION_START, ACTION_HIT, ACTION_STAND
+
+# Каталог бота: процессы бота запускаются из него
+BOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Одновременных запросов к вебхуку (значение max_connections по умолчанию в Telegram)
+WEBHOOK_CONNECTIONS = 40
+
+# Игрок берет карту, пока сумма очков меньше этого значения
+PLAYER_STAND_ON = 17
+
+# Сколько секунд ждать готовности бота
+BOT_START_TIMEOUT = 60.0
+
+SCORE_RE = re.compile(r"Сумма очков:\*?\s*(\d+)")
+FINISHED_TEXT = "Игра завершена"
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _buttons(markup: Optional[str]) -> Dict[str, str]:
+    """Кнопки клавиатуры из reply_markup запроса бота: действие -> callback_data."""
+    if not markup:
+        return {}
+    buttons = {}
+    for row in json.loads(markup).get("inline_keyboard", []):
+        for button in row:
+            payload = unpack_callback_data(button.get("callback_data"))
+            if payload:
+                buttons[payload[0]] = button["callback_data"]
+    return buttons
+
+class BotMessage:
+    """Сообщение, отправленное или отредактированное ботом."""
+
+    def __init__(self, chat_id: int, message_id: int, text: str, buttons: Dict[str, str],
+                 reply_to: Optional[int] = None):
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.text = text
+        self.buttons = buttons
+        self.reply_to = reply_to
+
+class FakeTelegram:
+    """Тестовый сервер Bot API и генератор обновлений."""
+
+    def __init__(self, api_latency: float):
+        self.api_latency = api_latency
+        self.update_ids = itertools.count(1)
+        self.message_ids = itertools.count(1)
+        self.callback_ids = itertools.count(1)
+        self.webhook_url = ""
+        self.commands: Dict[Any, str] = {}
+        # Обновления для getUpdates
+        self.pending: List[Dict[str, Any]] = []
+        self.pending_event = asyncio.Event()
+        # Очереди сообщений бота по чатам (чат -> очередь стола, который в нем играет)
+        self.chat_queues: Dict[int, asyncio.Queue] = {}
+        # Нажатые кнопки, ждущие answerCallbackQuery: id -> время отправки
+        self.callbacks_sent: Dict[str, float] = {}
+        self.callback_waiters: Dict[str, asyncio.Future] = {}
+        self.latencies: List[float] = []
+        self.api_calls: Dict[str, int] = {}
+        # TCP-соединения, открытые ботом к Bot API (переиспользование пула)
+        self.connections = set()
+        self.updates_sent = 0
+        self.get_updates_batches: List[int] = []
+        self.ready = asyncio.Event()
+        self.webhook_session: Optional[ClientSession] = None
+        self.webhook_semaphore = asyncio.Semaphore(WEBHOOK_CONNECTIONS)
+        self.webhook_tasks = set()
+
+    # --- Bot API ---
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"].lower()
+        data = dict(await request.post())
+        self.connections.add(request.transport)
+        self.api_calls[method] = self.api_calls.get(method, 0) + 1
+        if method == "getupdates":
+            return self._ok(await self._get_updates(data))
+        if self.api_latency:
+            await asyncio.sleep(self.api_latency)
+        if method == "getme":
+            return self._ok({"id": 1, "is_bot": True, "first_name": "Бот", "username": "loadtest_bot"})
+        if method in ("sendmessage", "editmessagetext", "editmessagereplymarkup"):
+            return self._ok(self._bot_message(method, data))
+        if method == "answercallbackquery":
+            self._callback_answered(data["callback_query_id"])
+        elif method == "setwebhook":
+            self.webhook_url = data["url"]
+            self.ready.set()
+        elif method == "deletewebhook":
+            self.webhook_url = ""
+        elif method == "getwebhookinfo":
+            return self._ok({"url": self.webhook_url, "has_custom_certificate": False, "pending_update_count": 0})
+        elif method == "setmycommands":
+            self.commands[data.get("scope")] = data["commands"]
+        elif method == "getmycommands":
+            return self._ok(json.loads(self.commands.get(data.get("scope"), "[]")))
+        return self._ok(True)
+
+    @staticmethod
+    def _ok(result: Any) -> web.Response:
+        return web.json_response({"ok": True, "result": result})
+
+    async def _get_updates(self, data: Dict[str, str]) -> List[Dict[str, Any]]:
+        self.ready.set()
+        offset = int(data.get("offset") or 0)
+        self.pending = [update for update in self.pending if update["update_id"] >= offset]
+        if not self.pending:
+            self.pending_event.clear()
+            try:
+                await asyncio.wait_for(self.pending_event.wait(), float(data.get("timeout") or 0))
+            except asyncio.TimeoutError:
+                pass
+        batch = self.pending[:int(data.get("limit") or 100)]
+        if batch:
+            self.get_updates_batches.append(len(batch))
+        return batch
+
+    def _bot_message(self, method: str, data: Dict[str, str]) -> Dict[str, Any]:
+        chat_id = int(data["chat_id"])
+        message_id = int(data["message_id"]) if "message_id" in data else next(self.message_ids)
+        text = data.get("text", "")
+        reply_to = int(data["reply_to_message_id"]) if "reply_to_message_id" in data else None
+        queue = self.chat_queues.get(chat_id)
+        if queue is not None:
+            queue.put_nowait(BotMessage(chat_id, message_id, text, _buttons(data.get("reply_markup")), reply_to))
+        message = {"message_id": message_id, "date": int(time.time()), "text": text,
+                   "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "group"}}
+        if data.get("reply_markup"):
+            message["reply_markup"] = json.loads(data["reply_markup"])
+        return message
+
+    def _callback_answered(self, callback_id: str) -> None:
+        sent = self.callbacks_sent.pop(callback_id, None)
+        if sent is not None:
+            self.latencies.append(time.perf_counter() - sent)
+        waiter = self.callback_waiters.pop(callback_id, None)
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    # --- Обновления ---
+
+    def send_update(self, update: Dict[str, Any]) -> None:
+        update["update_id"] = next(self.update_ids)
+        self.updates_sent += 1
+        if self.webhook_session is not None:
+            task = asyncio.create_task(self._post_webhook(update))
+            self.webhook_tasks.add(task)
+            task.add_done_callback(self.webhook_tasks.discard)
+        else:
+            self.pending.append(update)
+            self.pending_event.set()
+
+    async def _post_webhook(self, update: Dict[str, Any]) -> None:
+        async with self.webhook_semaphore:
+            # Telegram повторяет доставку, пока вебхук не ответит 200
+            while True:
+                try:
+                    async with self.webhook_session.post(self.webhook_url, json=update) as response:
+                        if response.status == 200:
+                            # Бот может ответить методом Bot API прямо в ответе на вебхук
+                            reply = await response.json(content_type=None) if response.content_length else None
+                            if reply and reply.get("method", "").lower() == "answercallbackquery":
+                                self.api_calls["answercallbackquery"] = self.api_calls.get("answercallbackquery", 0) + 1
+                                self._callback_answered(str(reply["callback_query_id"]))
+                            return
+                except OSError:
+                    pass
+                await asyncio.sleep(0.1)
+
+    def send_command(self, chat_id: int, user_id: int, command: str) -> None:
+        self.send_update({"message": {
+            "message_id": next(self.message_ids), "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "group"},
+            "from": _user(user_id), "text": command,
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(command)}],
+        }})
+
+    def press(self, chat_id: int, message_id: int, user_id: int, data: str) -> asyncio.Future:
+        """Нажимает кнопку; результат - future, который завершается ответом бота на нажатие."""
+        callback_id = str(next(self.callback_ids))
+        waiter = asyncio.get_running_loop().create_future()
+        self.callback_waiters[callback_id] = waiter
+        self.callbacks_sent[callback_id] = time.perf_counter()
+        self.send_update({"callback_query": {
+            "id": callback_id, "from": _user(user_id), "chat_instance": str(chat_id), "data": data,
+            "message": {"message_id": message_id, "date": int(time.time()), "text": "",
+                        "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "group"}},
+        }})
+        return waiter
+
+def _user(user_id: int) -> Dict[str, Any]:
+    return {"id": user_id, "is_bot": False, "first_name": f"Игрок{user_id}", "username": f"player{user_id}"}
+
+async def play_table(api: FakeTelegram, chat_id: int, user_ids: List[int], games: int) -> None:
+    """Играет games партий за одним столом."""
+    queue: asyncio.Queue = asyncio.Queue()
+    for key in [chat_id, *user_ids]:
+        api.chat_queues[key] = queue
+    for _ in range(games):
+        api.send_command(chat_id, user_ids[0], "/start_21")
+        board = await queue.get()
+        while ACTION_JOIN not in board.buttons:
+            board = await queue.get()
+        _, game_id, _ = unpack_callback_data(board.buttons[ACTION_JOIN])
+        # Стартуем, только когда бот ответил на все нажатия "Присоединиться"
+        await asyncio.gather(*(api.press(chat_id, board.message_id, user_id, board.buttons[ACTION_JOIN])
+                               for user_id in user_ids))
+        api.press(chat_id, board.message_id, user_ids[0], pack_callback_data(ACTION_START, game_id))
+        while True:
+            message = await queue.get()
+            if message.chat_id == chat_id:
+                # Итоги: правка табло или объявление ответом на него
+                if board.message_id in (message.message_id, message.reply_to) and FINISHED_TEXT in message.text:
+                    break
+                continue
+            if ACTION_HIT not in message.buttons:
+                continue
+            payload = unpack_callback_data(message.buttons[ACTION_HIT])
+            if payload[1] != game_id:
+                continue
+            score = SCORE_RE.search(message.text)
+            action = ACTION_HIT if score and int(score.group(1)) < PLAYER_STAND_ON else ACTION_STAND
+            api.press(message.chat_id, message.message_id, message.chat_id, message.buttons[action])
+
+def _bot_command(mode: str, args, api_url: str, tmp: str, webhook_port: int):
+    # Игроки нажимают кнопки без пауз, как не нажмет человек: ограничение частоты
+    # нажатий отключено, иначе отброшенное нажатие оставило бы партию без хода
+    env = dict(os.environ, BOT_TOKEN="123456:loadtest", TELEGRAM_API_URL=api_url,
+               DB_PATH=os.path.join(tmp, f"{mode}.sqlite3"), GAME_LOG_DIR=os.path.join(tmp, f"{mode}_logs"),
+               PYTHONUNBUFFERED="1", THROTTLE_ENABLED="false")
+    env.pop("IS_RENDER", None)
+    if mode == "polling":
+        return [sys.executable, "main.py", "--polling", "--concurrency", str(args.concurrency)], env
+    env.update(PORT=str(webhook_port), WEB_SERVER_HOST="127.0.0.1",
+               WEBHOOK_HOST=f"http://127.0.0.1:{webhook_port}", WEBHOOK_PATH="/webhook")
+    return [sys.executable, "server.py"], env
+
+async def run_mode(mode: str, args) -> Dict[str, Any]:
+    """Запускает бота в режиме mode и прогоняет нагрузку."""
+    api = FakeTelegram(args.api_latency)
+    app = web.Application()
+    app.router.add_post("/bot{token}/{method}", api.handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    api_port = _free_port()
+    await web.TCPSite(runner, "127.0.0.1", api_port).start()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        command, env = _bot_command(mode, args, f"http://127.0.0.1:{api_port}", tmp, _free_port())
+        log = open(os.path.join(tmp, "bot.log"), "w")
+        process = await asyncio.create_subprocess_exec(*command, env=env, cwd=BOT_DIR, stdout=log, stderr=log)
+        try:
+            await asyncio.wait_for(api.ready.wait(), BOT_START_TIMEOUT)
+            if mode == "webhook":
+                api.webhook_session = ClientSession()
+            started = time.perf_counter()
+            await asyncio.gather(*(
+                play_table(api, -1000 - table,
+                           [100000 + table * args.players + i for i in range(args.players)], args.games)
+                for table in range(args.tables)
+            ))
+            elapsed = time.perf_counter() - started
+        finally:
+            process.send_signal(signal.SIGTERM)
+            await process.wait()
+            log.close()
+            if api.webhook_session is not None:
+                await api.webhook_session.close()
+            await runner.cleanup()
+
+    latencies = sorted(api.latencies)
+    return {
+        "mode": mode,
+        "elapsed": elapsed,
+        "updates": api.updates_sent,
+        "rate": api.updates_sent / elapsed,
+        "p50": statistics.median(latencies),
+        "p95": latencies[int(len(latencies) * 0.95) - 1],
+        "api_calls": sum(count for method, count in api.api_calls.items() if method != "getupdates"),
+        "get_updates": api.api_calls.get("getupdates", 0),
+        "batch": statistics.mean(api.get_updates_batches) if api.get_updates_batches else 0.0,
+        "connections": len(api.connections),
+    }
+
+def print_result(result: Dict[str, Any]) -> None:
+    print(f"  {result['mode']:<8} {result['updates']:>7} обновлений за {result['elapsed']:6.2f} с"
+          f" = {result['rate']:8,.0f} обн/с | ответ на кнопку p50 {result['p50'] * 1000:6.1f} мс,"
+          f" p95 {result['p95'] * 1000:6.1f} мс | вызовов Bot API: {result['api_calls']}"
+          f" по {result['connections']} соединениям", end="")
+    if result["get_updates"]:
+        print(f", getUpdates: {result['get_updates']} (в среднем {result['batch']:.1f} обн.)", end="")
+    print()
+
+async def main(args) -> None:
+    modes = ["webhook", "polling"] if args.mode == "both" else [args.mode]
+    print(f"Столов: {args.tables}, игроков за столом: {args.players}, партий: {args.games}, "
+          f"задержка Bot API: {args.api_latency * 1000:.0f} мс")
+    for mode in modes:
+        print_result(await run_mode(mode, args))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=["webhook", "polling", "both"], default="both")
+    parser.add_argument("--tables", type=int, default=50, help="групповых чатов с одновременными играми")
+    parser.add_argument("--players", type=int, default=3, help="игроков за каждым столом")
+    parser.add_argument("--games", type=int, default=3, help="партий за каждым столом")
+    parser.add_argument("--api-latency", type=float, default=0.02, help="задержка ответа Bot API, с")
+    parser.add_argument("--concurrency", type=int, default=POLLING_CONCURRENCY, help="параллельность обработки в режиме polling")
+    asyncio.run(main(parser.parse_args()))
@@ -1,19 +1,54 @@
+import argparse
 import asyncio
 import logging
 import os
+import signal
 import sys
-from typing import Dict, Optional
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 import time
+from collections import OrderedDict
 
 from aiogram import Bot, Dispatcher, types, F
-from aiogram.filters import Command
+from aiogram.client.telegram import PRODUCTION, TelegramAPIServer
+from aiogram.filters import Command, CommandObject
 from aiogram.exceptions import TelegramBadRequest
 from aiogram.webhook.aiohttp_server import SimpleRequestHandler
-from aiohttp import web
 
-from config import BOT_TOKEN, WEBHOOK_PATH, WEBHOOK_URL, WEB_SERVER_HOST, WEB_SERVER_PORT
-from game import Game, active_games
-from keyboards import get_join_keyboard, get_game_actions_keyboard
+from config import (
+    BOT_TOKEN, WEBHOOK_URL, SHUTDOWN_TIMEOUT, TELEGRAM_API_URL, POLLING_CONCURRENCY,
+    HTTP_POOL_SIZE, HTTP_KEEPALIVE, HTTP_DNS_TTL,
+    DEALER_STAND_ON, DEALER_HIT_SOFT_17, GAME_LOG_DIR, DECK_RNG, DB_PATH, HINTS_ENABLED,
+    THROTTLE_ENABLED, THROTTLE_USER_RATE, THROTTLE_USER_BURST, THROTTLE_CHAT_RATE, THROTTLE_CHAT_BURST
+)
+from dealer import Dealer, DealerRules
+from board import GameBoard
+from events import (
+    Join, Start, Hit, Stand, Timeout, NextRound,
+    ActionRejected, GameStarted, CardDealt, Busted, Stood, TurnPassed, GameFinished, GameCancelled,
+    RoundStarted, MatchFinished,
+    REJECT_ALREADY_STARTED, REJECT_ALREADY_JOINED, REJECT_TABLE_FULL, REJECT_NOT_ENOUGH_PLAYERS,
+    REJECT_NOT_A_PLAYER, REJECT_NOT_ALLOWED
+)
+from gamelog import GameLog
+from stats import StatsStore, PlayerStats, GLOBAL_CHAT_ID
+from storage import Storage
+from snapshot import SnapshotStore, GameSnapshot, join_time_left
+from match import Match, DEFAULT_MATCH_ROUNDS, MAX_MATCH_ROUNDS
+from polling import poll_updates
+from http_session import TunedAiohttpSession
+from throttling import RateLimiter, ThrottlingMiddleware
+from supervisor import TaskSupervisor
+from memstats import memory_report
+from strategy import should_hit
+from rng import BufferedSecureRandom, RNG_SECURE
+from game import (
+    Game, Player, active_games, player_games, register_game, register_player, unregister_game, get_chat_games,
+    get_player_games, game_pool, MIN_PLAYERS, MAX_PLAYERS
+)
+from keyboards import (
+    get_join_keyboard, get_game_actions_keyboard, unpack_callback_data,
+    ACTION_JOIN, ACTION_START, ACTION_HIT, ACTION_STAND, ACTION_HINT
+)
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
@@ -21,19 +56,100 @@ logging.basicConfig(level=logging.INFO)
 logging.getLogger('aiohttp.access').setLevel(logging.DEBUG)
 logger = logging.getLogger(__name__) # Используем именованный логгер для нашего кода
 
-# Словарь для хранения таймеров ожидания второго игрока
+# Словарь для хранения таймеров ожидания игроков (game_id -> время открытия стола)
 join_timers: Dict[int, float] = {}
 
-# Время ожидания второго игрока в секундах
+# Время ожидания игроков в секундах
 JOIN_TIMEOUT = 60.0
 
-# Словарь для хранения ID последнего сообщения с клавиатурой для каждого игрока
-last_keyboard_messages: Dict[int, int] = {}
+# Время хода в личной игре против дилера: не походивший игрок останавливается автоматически
+TURN_TIMEOUT = 120.0
+
+# Пауза между раундами матча в секундах (чтобы игроки успели увидеть итоги)
+ROUND_PAUSE = 5.0
+
+# Снимок начатой игры старше этого не восстанавливается: игроки уже разошлись.
+# Ждущая игроков игра устаревает через JOIN_TIMEOUT. Так старый экземпляр бота,
+# записавший снимок уже после запуска нового (перекрывающийся деплой), не вернет
+# брошенные игры при следующем перезапуске
+SNAPSHOT_MAX_AGE = 10 * 60.0
+
+# Максимальное число одновременных игр в одном чате
+MAX_GAMES_PER_CHAT = 3
+
+# Одинаковые /game_status в чате за это время (в секундах) получают один ответ
+STATUS_COLLAPSE_WINDOW = 3.0
+
+# Последние /game_status по чатам (chat_id -> (время, версии игр)), в порядке времени запроса
+recent_status_requests: "OrderedDict[int, Tuple[float, Tuple[Tuple[int, int], ...]]]" = OrderedDict()
+
+# Максимальное число одновременных отправок личных сообщений при раздаче
+DM_FANOUT_CONCURRENCY = 10
+
+# Живые табло игр (game_id -> GameBoard)
+game_boards: Dict[int, GameBoard] = {}
+
+# Объявления об играх, остановленных из-за лимита фоновых задач (MAX_GAME_TASKS)
+MATCH_STOPPED_TEXT = "⚠️ *Матч остановлен:* бот перегружен, следующий раунд не начнется. Начните новый матч командой /match\\_21"
+RESTORE_CANCELLED_TEXT = "⚠️ *Игра отменена:* бот перегружен после перезапуска. Начните новую игру командой /start\\_21"
+
+# Ответы на отклоненные действия (причина из Game.apply -> текст для пользователя)
+REJECT_MESSAGES = {
+    REJECT_ALREADY_STARTED: "⚠️ Игра уже началась!",
+    REJECT_ALREADY_JOINED: "ℹ️ Вы уже присоединились к игре!",
+    REJECT_TABLE_FULL: "⚠️ За столом уже нет свободных мест!",
+    REJECT_NOT_ENOUGH_PLAYERS: "⚠️ Для начала игры недостаточно игроков.",
+    REJECT_NOT_A_PLAYER: "⚠️ Начать игру может только ее участник.",
+    REJECT_NOT_ALLOWED: "⚠️ Сейчас это действие недоступно."
+}
+
+# Фоновые задачи бота (таймеры игр, правки табло, журнал) - см. supervisor.py
+supervisor = TaskSupervisor()
+
+# Журнал игр для воспроизведения (отключен, если GAME_LOG_DIR пустой)
+game_log: Optional[GameLog] = GameLog(GAME_LOG_DIR, supervisor=supervisor) if GAME_LOG_DIR else None
+
+# Хранилище SQLite и статистика игроков (отключены, если DB_PATH пустой)
+storage: Optional[Storage] = Storage(DB_PATH) if DB_PATH else None
+stats_store: Optional[StatsStore] = StatsStore(storage) if storage else None
+snapshot_store: Optional[SnapshotStore] = SnapshotStore(storage) if storage else None
+
+# Обработчики обновлений, которые выполняются прямо сейчас (ждем их при остановке)
+inflight_updates: Set[asyncio.Task] = set()
+
+# Общий криптостойкий генератор для перемешивания колод (DECK_RNG=secure)
+secure_rng = BufferedSecureRandom()
 
 # Инициализация бота и диспетчера
-bot = Bot(token=BOT_TOKEN)
+# Общая сессия с пулом keep-alive соединений к Bot API (см. http_session.py)
+session = TunedAiohttpSession(
+    pool_size=HTTP_POOL_SIZE, keepalive_timeout=HTTP_KEEPALIVE, dns_ttl=HTTP_DNS_TTL,
+    api=TelegramAPIServer.from_base(TELEGRAM_API_URL) if TELEGRAM_API_URL else PRODUCTION
+)
+bot = Bot(token=BOT_TOKEN, session=session)
 dp = Dispatcher()
 
+# Обработчик вебхука aiogram (маршрут регистрирует server.py)
+webhook_handler = SimpleRequestHandler(dispatcher=dp, bot=bot)
+
+@dp.update.outer_middleware()
+async def track_inflight_updates(handler, event, data):
+    """Запоминает задачи, обрабатывающие обновления, чтобы при остановке дождаться их"""
+    task = asyncio.current_task()
+    inflight_updates.add(task)
+    try:
+        return await handler(event, data)
+    finally:
+        inflight_updates.discard(task)
+
+# Ограничение частоты нажатий кнопок: лишние нажатия не доходят до обработчиков
+throttling = ThrottlingMiddleware(
+    user_limiter=RateLimiter(THROTTLE_USER_RATE, THROTTLE_USER_BURST),
+    chat_limiter=RateLimiter(THROTTLE_CHAT_RATE, THROTTLE_CHAT_BURST),
+)
+if THROTTLE_ENABLED:
+    dp.callback_query.outer_middleware(throttling)
+
 @dp.errors()
 async def errors_handler(event):
     """Обработчик ошибок для необработанных обновлений."""
@@ -51,6 +167,7 @@ async def cmd_start(message: types.Message):
     await message.answer(
         "🎴 *Добро пожаловать в игру \"21\"!*\n\n"
         "Чтобы начать игру в групповом чате, используйте команду /start_21.\n"
+        "Чтобы сыграть против дилера, используйте команду /dealer_21.\n"
         "Чтобы проверить статус текущей игры, используйте /game_status.\n"
         "Для получения правил игры, используйте /help.\n\n"
         "✅ Теперь вы можете получать личные сообщения от бота во время игры.",
@@ -67,39 +184,91 @@ async def cmd_start_game(message: types.Message):
         await message.answer("⚠️ Эта команда работает только в групповых чатах!")
         return
 
-    chat_id = message.chat.id
+    await open_table(message)
+
+@dp.message(Command("match_21", ignore_mention=True))
+async def cmd_start_match(message: types.Message, command: CommandObject):
+    """Обработчик команды /match_21 [N] - матч до победы в большинстве из N раундов"""
+    logger.info(f"Команда /match_21 от пользователя {message.from_user.id} в чате {message.chat.id}")
+    if message.chat.type not in ["group", "supergroup"]:
+        await message.answer("⚠️ Эта команда работает только в групповых чатах!")
+        return
     
-    # Проверка на существующую игру в чате
-    if chat_id in active_games:
-        game = active_games[chat_id]
-        if not game.finished:
-            await message.answer("⚠️ В этом чате уже идет игра!")
+    rounds = DEFAULT_MATCH_ROUNDS
+    if command.args:
+        try:
+            rounds = int(command.args.split()[0])
+        except ValueError:
+            rounds = 0
+        if not 1 <= rounds <= MAX_MATCH_ROUNDS:
+            await message.answer(f"⚠️ Укажите число раундов от 1 до {MAX_MATCH_ROUNDS}, например: /match_21 5")
             return
-        else:
-            # Удаляем завершенную игру
-            del active_games[chat_id]
     
-    # Создаем новую игру
-    active_games[chat_id] = Game(chat_id)
+    await open_table(message, match=Match(rounds))
+
+@dp.message(Command("dealer_21", ignore_mention=True))
+async def cmd_start_dealer_game(message: types.Message):
+    """Обработчик команды /dealer_21 - игра против дилера (в группе или в личном чате)"""
+    logger.info(f"Команда /dealer_21 от пользователя {message.from_user.id} в чате {message.chat.id}")
+    dealer = Dealer(DealerRules(DEALER_STAND_ON, DEALER_HIT_SOFT_17))
     
-    # Запускаем таймер ожидания второго игрока
-    join_timers[chat_id] = time.time()
+    if message.chat.type in ["group", "supergroup"]:
+        await open_table(message, dealer=dealer)
+        return
     
-    bot_username = (await bot.get_me()).username
+    # В личном чате игра одиночная и начинается сразу
+    user_id = message.from_user.id
+    if find_game_by_user_id(user_id):
+        await message.answer("⚠️ Вы уже участвуете в игре!")
+        return
     
-    await message.answer(
-        f"🎮 *Начата новая игра в 21!*\n"
-        f"👥 *Игроки:* 0/2\n"
-        f"⏳ *Ожидаем игроков...*\n\n"
-        f"Нажмите кнопку, чтобы присоединиться.\n\n"
-        f"❗️ *Важно:* Перед началом игры каждый участник должен начать личный диалог с ботом: "
-        f"https://t.me/{bot_username}",
-        parse_mode="Markdown",
-        reply_markup=get_join_keyboard()
-    )
+    # Таймер хода - задача игры; при перегрузке игру не начинаем
+    if not supervisor.has_capacity():
+        await message.answer("⚠️ Сейчас идет слишком много игр. Попробуйте начать игру чуть позже.")
+        return
+    
+    game = new_game(message.chat.id, dealer=dealer)
+    register_game(game)
+    record_new_game(game)
+    events = apply_action(game, Join(user_id, message.from_user.first_name))
+    events += apply_action(game, Start())
+    supervisor.spawn(wait_for_turn(game.game_id), game.game_id, "wait_for_turn")
+    await render_events(game, events)
+
+async def open_table(message: types.Message, dealer: Optional[Dealer] = None, match: Optional[Match] = None):
+    """Открывает в групповом чате стол для новой игры и ждет игроков.
+
+    Игра берется из пула только после всех проверок: отказ не занимает игру и ее номер.
+    """
+    chat_id = message.chat.id
+    
+    # В одном чате может идти несколько игр, но не больше MAX_GAMES_PER_CHAT
+    if len(get_chat_games(chat_id)) >= MAX_GAMES_PER_CHAT:
+        await message.answer(f"⚠️ В этом чате уже идет {MAX_GAMES_PER_CHAT} игры! Дождитесь окончания одной из них.")
+        return
+    
+    # Таймер ожидания и отложенная правка табло - задачи игры; при перегрузке стол не открываем
+    if not supervisor.has_capacity(2):
+        await message.answer("⚠️ Сейчас идет слишком много игр. Попробуйте начать игру чуть позже.")
+        return
+    
+    # Создаем новую игру
+    game = new_game(chat_id, dealer=dealer, match=match)
+    register_game(game)
+    record_new_game(game)
+    
+    # Запускаем таймер ожидания игроков
+    join_timers[game.game_id] = time.time()
+    
+    # Создаем табло игры - дальше это сообщение только редактируется
+    board_text = await render_board_text(game)
+    keyboard = get_join_keyboard(game.game_id)
+    board_message = await send_markdown(chat_id, board_text, reply_markup=keyboard)
+    game_boards[game.game_id] = GameBoard(bot, chat_id, board_message.message_id, board_text, keyboard,
+                                          supervisor=supervisor, game_id=game.game_id)
     
-    # Запускаем таймер ожидания второго игрока
-    asyncio.create_task(wait_for_second_player(chat_id, message.message_id))
+    # Запускаем таймер ожидания игроков
+    supervisor.spawn(wait_for_players(game.game_id), game.game_id, "wait_for_players")
 
 @dp.message(Command("game_status", ignore_mention=True))
 async def cmd_game_status(message: types.Message):
@@ -113,8 +282,9 @@ async def cmd_game_status(message: types.Message):
         await message.answer("⚠️ Эта команда работает только в групповых чатах!")
         return
     
-    # Проверяем наличие активной игры
-    if chat_id not in active_games:
+    # Проверяем наличие активных игр
+    games = get_chat_games(chat_id)
+    if not games:
         try:
             await message.answer(
                 "ℹ️ В этом чате нет активной игры. Начните новую игру командой /start\_21",
@@ -125,84 +295,105 @@ async def cmd_game_status(message: types.Message):
             await message.answer("ℹ️ В этом чате нет активной игры. Начните новую игру командой /start_21")
         return
     
-    game = active_games[chat_id]
+    # Повторный запрос, пока игры чата не изменились, - ответ на предыдущий еще перед глазами
+    if is_duplicate_status_request(chat_id, games):
+        logger.info(f"/game_status в чате {chat_id}: повтор в пределах {STATUS_COLLAPSE_WINDOW} с, пропущен")
+        return
+    
+    # Статус каждой игры отправляется отдельным сообщением (у ожидающих игр - со своей кнопкой)
+    for game in games:
+        await send_game_status(message, game)
+
+def is_duplicate_status_request(chat_id: int, games: List[Game]) -> bool:
+    """Проверяет, был ли такой же /game_status в чате за последние STATUS_COLLAPSE_WINDOW секунд.
     
-    # Если игра еще не началась (ожидание игроков)
+    Одинаковым считается запрос при тех же играх в тех же версиях. Иначе запрос запоминается.
+    """
+    now = time.monotonic()
+    # Записи упорядочены по времени - устаревшие удаляются с начала
+    while recent_status_requests:
+        oldest_chat_id, (requested_at, _) = next(iter(recent_status_requests.items()))
+        if now - requested_at < STATUS_COLLAPSE_WINDOW:
+            break
+        del recent_status_requests[oldest_chat_id]
+    versions = tuple((game.game_id, game.version) for game in games)
+    previous = recent_status_requests.get(chat_id)
+    if previous is not None and previous[1] == versions:
+        return True
+    recent_status_requests.pop(chat_id, None)
+    recent_status_requests[chat_id] = (now, versions)
+    return False
+
+async def send_game_status(message: types.Message, game: Game):
+    """Отправляет статус одной игры в ответ на /game_status (текст берется из кэша игры)"""
+    head, tail = game.get_status_report()
+    keyboard = None
     if not game.started:
-        players_count = len(game.players)
-        
-        # Формируем список присоединившихся игроков
-        players_info = ""
-        if players_count > 0:
-            players_list = "\n".join([f"👤 `{player.username}`" for player in game.players.values()])
-            players_info = f"👥 *Присоединившиеся игроки ({players_count}/2):*\n{players_list}\n"
-        
-        # Информация о времени ожидания
+        # Оставшееся время ожидания меняется само по себе, поэтому не кэшируется
         time_info = ""
-        if chat_id in join_timers:
-            elapsed = time.time() - join_timers[chat_id]
+        if game.game_id in join_timers:
+            elapsed = time.time() - join_timers[game.game_id]
             remaining = max(0, JOIN_TIMEOUT - elapsed)
             time_info = f"⏱ *Осталось времени:* {int(remaining)} сек.\n"
-        
-        status_message = (
-            f"📊 *Статус игры:* Ожидание игроков\n"
-            f"{players_info}"
-            f"{time_info}\n"
-            f"⚠️ Для начала игры необходимо минимум 2 игрока.\n"
-            f"🎮 Нажмите кнопку ниже, чтобы присоединиться:"
-        )
-        
-        try:
-            await message.answer(status_message, parse_mode="Markdown", reply_markup=get_join_keyboard())
-        except TelegramBadRequest as e:
-            logging.error(f"Ошибка при отправке форматированного сообщения: {e}")
-            clean_message = status_message.replace("*", "").replace("`", "").replace("\\_", "_")
-            await message.answer(clean_message, reply_markup=get_join_keyboard())
-    else:
-        # Если игра уже идет
-        if game.finished:
-            # Если игра завершена
-            try:
-                await message.answer(
-                    f"📊 *Статус игры:* Завершена\n\n{game.get_status_message()}",
-                    parse_mode="Markdown"
-                )
-            except TelegramBadRequest as e:
-                logging.error(f"Ошибка при отправке форматированного сообщения: {e}")
-                status_message = f"📊 Статус игры: Завершена\n\n{game.get_status_message().replace('*', '')}"
-                await message.answer(status_message)
-        else:
-            # Если игра активна
-            current_player = game.players.get(game.current_player_id)
-            player_name = current_player.username if current_player else "Неизвестный"
-            
-            # Формируем список игроков с их статусами
-            players_info = []
-            for player in game.players.values():
-                status = "🎮"
-                if player.user_id == game.current_player_id:
-                    status = "🎯"  # текущий ход
-                elif player.busted:
-                    status = "💥"  # перебор
-                elif player.stopped:
-                    status = "✋"  # остановился
-                
-                players_info.append(f"{status} `{player.username}`: {player.get_score()} очков")
-            
-            players_list = "\n".join(players_info)
-            
-            status_message = (
-                f"📊 *Статус игры:* Активна\n"
-                f"👥 *Игроки:*\n{players_list}\n\n"
-                f"🎯 *Текущий ход:* `{player_name}`"
-            )
-            
-            try:
-                await message.answer(status_message, parse_mode="Markdown")
-            except TelegramBadRequest as e:
-                logging.error(f"Ошибка при отправке форматированного сообщения: {e}")
-                clean_message = status_message.replace("*", "").replace("`", "").replace("\\_", "_")
-                await message.answer(clean_message)
+        head += time_info
+        keyboard = get_join_keyboard(game.game_id, game.can_start())
+    status_message = head + tail
+    
+    try:
+        await message.answer(status_message, parse_mode="Markdown", reply_markup=keyboard)
+    except TelegramBadRequest as e:
+        logging.error(f"Ошибка при отправке форматированного сообщения: {e}")
+        clean_message = status_message.replace("*", "").replace("`", "").replace("\\_", "_")
+        await message.answer(clean_message, reply_markup=keyboard)
+
+@dp.message(Command("stats", ignore_mention=True))
+async def cmd_stats(message: types.Message):
+    """Обработчик команды /stats - статистика игрока в этом чате и по всем чатам"""
+    logger.info(f"Команда /stats от пользователя {message.from_user.id} в чате {message.chat.id}")
+    if not stats_store:
+        await message.answer("ℹ️ Статистика отключена.")
+        return
+    
+    user_id = message.from_user.id
+    lines = [f"📈 *Статистика игрока* `{message.from_user.first_name}`"]
+    if message.chat.type in ["group", "supergroup"]:
+        lines.append(format_player_stats("В этом чате", await stats_store.get_player(message.chat.id, user_id)))
+    lines.append(format_player_stats("Всего", await stats_store.get_player(GLOBAL_CHAT_ID, user_id)))
+    await send_markdown(message.chat.id, "\n\n".join(lines))
+
+@dp.message(Command("top", ignore_mention=True))
+async def cmd_top(message: types.Message):
+    """Обработчик команды /top - лучшие игроки чата (в личном чате - по всем чатам)"""
+    logger.info(f"Команда /top от пользователя {message.from_user.id} в чате {message.chat.id}")
+    if not stats_store:
+        await message.answer("ℹ️ Статистика отключена.")
+        return
+    
+    in_group = message.chat.type in ["group", "supergroup"]
+    top = await stats_store.get_top(message.chat.id if in_group else GLOBAL_CHAT_ID)
+    if not top:
+        await message.answer("ℹ️ Пока нет сыгранных игр.")
+        return
+    
+    title = "🏆 *Лучшие игроки чата:*" if in_group else "🏆 *Лучшие игроки:*"
+    rows = [
+        f"{place}. `{stats.username}` - побед: *{stats.wins}* из {stats.games}"
+        for place, stats in enumerate(top, start=1)
+    ]
+    await send_markdown(message.chat.id, title + "\n" + "\n".join(rows))
+
+def format_player_stats(title: str, stats: Optional[PlayerStats]) -> str:
+    """Форматирует блок статистики игрока для /stats"""
+    if not stats or not stats.games:
+        return f"*{title}:* игр пока нет"
+    return (
+        f"*{title}:*\n"
+        f"🎮 Игр: {stats.games}\n"
+        f"🏆 Побед: {stats.wins}\n"
+        f"🤝 Ничьих: {stats.draws}\n"
+        f"💥 Переборов: {stats.busts}\n"
+        f"🔢 Средний счет без переборов: {stats.average_score:.1f}"
+    )
 
 @dp.message(Command("help", ignore_mention=True))
 async def cmd_help(message: types.Message):
@@ -216,15 +407,19 @@ async def cmd_help(message: types.Message):
         "• Валет (J), Дама (Q), Король (K) - 10 очков\n"
         "• Туз (A) - 11 очков или 1 очко (если 11 приведёт к перебору)\n\n"
         "*Ход игры:*\n"
-        "1. В игре участвуют 2 игрока\n"
+        f"1. В игре участвуют от {MIN_PLAYERS} до {MAX_PLAYERS} игроков\n"
         "2. Каждый игрок получает по 2 карты\n"
         "3. Игроки по очереди могут взять дополнительные карты или остановиться\n"
         "4. Если сумма карт игрока превышает 21, он проигрывает (перебор)\n"
-        "5. Когда оба игрока закончили брать карты, сравнивается сумма очков\n"
+        "5. Когда все игроки закончили брать карты, сравнивается сумма очков\n"
         "6. Побеждает игрок с наибольшим количеством очков (не более 21)\n\n"
         "*Доступные команды:*\n"
-        "• /start\_21 - начать новую игру (только в групповом чате)\n"
+        f"• /start\_21 - начать новую игру (только в групповом чате, до {MAX_GAMES_PER_CHAT} игр одновременно)\n"
+        f"• /match\_21 N - матч из N раундов (по умолчанию {DEFAULT_MATCH_ROUNDS}): побеждает выигравший больше половины\n"
+        "• /dealer\_21 - сыграть против дилера (в группе или в личном чате)\n"
         "• /game\_status - проверить текущий статус игры\n"
+        "• /stats - ваша статистика\n"
+        "• /top - лучшие игроки\n"
         "• /help - показать правила и доступные команды\n\n"
         "❗️ *Важно:* Перед началом игры каждый участник должен начать личный диалог с ботом, чтобы получать информацию о своих картах."
     )
@@ -235,465 +430,532 @@ async def cmd_help(message: types.Message):
         clean_text = help_text.replace("*", "").replace("`", "").replace("\\_", "_")
         await message.answer(clean_text)
 
-async def wait_for_second_player(chat_id: int, message_id: int):
-    """Функция ожидания второго игрока с таймером"""
-    await asyncio.sleep(JOIN_TIMEOUT)
+async def wait_for_players(game_id: int, delay: float = JOIN_TIMEOUT):
+    """Функция ожидания игроков с таймером.
+    
+    По истечении времени игра начинается, если набралось достаточно игроков,
+    иначе отменяется.
+    """
+    await asyncio.sleep(delay)
     
     # Проверяем, что игра все еще существует и не начата
-    if chat_id in active_games and not active_games[chat_id].started:
-        game = active_games[chat_id]
-        
-        # Если присоединился только один игрок, отменяем игру
-        if len(game.players) < 2:
-            # Формируем список присоединившихся игроков
-            players_count = len(game.players)
-            players_info = ""
-            if players_count > 0:
-                # Экранируем специальные символы Markdown в именах пользователей
-                players_list = "\n".join([f"👤 `{player.username}`" for player in game.players.values()])
-                players_info = f"\n\n👥 *Присоединившиеся игроки ({players_count}/2):*\n{players_list}"
-            
-            timeout_message = (
-                f"⏱ *Время ожидания истекло!*\n"
-                f"Для начала игры необходимо минимум 2 игрока.{players_info}\n\n"
-                f"Игра отменена. Начните новую игру командой /start\\_21"
-            )
-            
-            try:
-                await bot.send_message(chat_id, timeout_message, parse_mode="Markdown")
-            except TelegramBadRequest as e:
-                # Если не удалось отправить с Markdown, отправляем без форматирования
-                logging.error(f"Ошибка при отправке форматированного сообщения: {e}")
-                clean_message = timeout_message.replace("*", "").replace("`", "").replace("\\_", "_")
-                await bot.send_message(chat_id, clean_message)
-            
-            del active_games[chat_id]
-            
-            # Удаляем таймер
-            if chat_id in join_timers:
-                del join_timers[chat_id]
+    game = active_games.get(game_id)
+    if game and not game.started and not game.finished:
+        await render_events(game, apply_action(game, Timeout()))
 
-@dp.callback_query(F.data == "join_game")
+def is_private_dealer_game(game: Game) -> bool:
+    """Одиночная игра против дилера в личном чате игрока"""
+    return game.dealer is not None and game.chat_id in game.players
+
+async def wait_for_turn(game_id: int, delay: float = TURN_TIMEOUT):
+    """Таймер хода личной игры против дилера.
+    
+    Если игрок не ходит delay секунд, он останавливается и игру доигрывает дилер:
+    иначе брошенная игра осталась бы в реестре навсегда и не давала начать новую.
+    Каждый ход откладывает срабатывание, поэтому на ход есть не меньше delay секунд.
+    """
+    game = active_games.get(game_id)
+    while game and not game.finished:
+        turn_seq = game.turn_seq
+        await asyncio.sleep(delay)
+        game = active_games.get(game_id)
+        if game and not game.finished and game.turn_seq == turn_seq:
+            announcement = game_announcement(game)
+            announcement.add("⏱ *Время хода истекло* - вы остановились автоматически.")
+            await render_events(game, apply_action(game, Stand(game.current_player_id)), announcement=announcement)
+            await announcement.flush()
+            return
+
+def get_callback_game(callback: types.CallbackQuery) -> Tuple[Optional[Game], int]:
+    """Возвращает игру, game_id которой записан в callback_data кнопки, и номер хода из кнопки"""
+    payload = unpack_callback_data(callback.data)
+    if payload is None:
+        return None, 0
+    _, game_id, turn_seq = payload
+    return active_games.get(game_id), turn_seq
+
+@dp.callback_query(F.data.startswith(ACTION_JOIN))
 async def process_join_callback(callback: types.CallbackQuery):
     """Обработчик нажатия на кнопку присоединения к игре"""
-    logger.info(f"Колбэк 'join_game' от пользователя {callback.from_user.id} в чате {callback.message.chat.id if callback.message else 'N/A'}")
-    chat_id = callback.message.chat.id
+    logger.info(f"Колбэк '{callback.data}' от пользователя {callback.from_user.id} в чате {callback.message.chat.id if callback.message else 'N/A'}")
     user_id = callback.from_user.id
     username = callback.from_user.first_name
     
     # Проверяем существование игры
-    if chat_id not in active_games:
+    game, _ = get_callback_game(callback)
+    if not game:
         await callback.answer("⚠️ Игра не найдена или уже завершена.", show_alert=True)
         return
     
-    game = active_games[chat_id]
-    
-    # Проверяем, не начата ли уже игра
-    if game.started:
-        await callback.answer("⚠️ Игра уже началась!", show_alert=True)
-        return
-    
-    # Проверяем, не присоединился ли пользователь ранее
-    if user_id in game.players:
-        await callback.answer("ℹ️ Вы уже присоединились к игре!", show_alert=True)
-        return
-    
     # Добавляем игрока
-    can_start = game.add_player(user_id, username)
+    events = apply_action(game, Join(user_id, username))
+    if isinstance(events[0], ActionRejected):
+        await callback.answer(REJECT_MESSAGES[events[0].reason], show_alert=True)
+        return
     
     await callback.answer(f"✅ Вы присоединились к игре!", show_alert=False)
     
-    bot_username = (await bot.get_me()).username
-    
-    # Формируем список присоединившихся игроков
-    players_list = "\n".join([f"👤 `{player.username}`" for player in game.players.values()])
-    players_count = len(game.players)
+    announcement = game_announcement(game)
+    try:
+        # Попытаемся проверить, может ли бот отправлять сообщения пользователю
+        if not await can_message_user(user_id):
+            # Пользователь еще не начал диалог с ботом
+            announcement.add(f"❗️ `{username}`, пожалуйста, начните личный диалог с ботом перед началом игры: https://t.me/{await get_bot_username()}")
+        
+        await render_events(game, events, callback, announcement)
+    finally:
+        await announcement.flush()
+
+@dp.callback_query(F.data.startswith(ACTION_START))
+async def process_start_callback(callback: types.CallbackQuery):
+    """Обработчик нажатия на кнопку досрочного начала игры"""
+    logger.info(f"Колбэк '{callback.data}' от пользователя {callback.from_user.id} в чате {callback.message.chat.id if callback.message else 'N/A'}")
+    game, _ = get_callback_game(callback)
+    if not game or game.finished:
+        await callback.answer("⚠️ Игра не найдена или уже завершена.", show_alert=True)
+        return
     
-    join_message = (
-        f"👤 Игрок `{username}` присоединился к игре!\n\n"
-        f"📊 *Статус игры:*\n"
-        f"👥 *Игроки ({players_count}/2):*\n{players_list}\n"
-    )
+    # Начать игру может только один из присоединившихся игроков
+    events = apply_action(game, Start(callback.from_user.id))
+    if isinstance(events[0], ActionRejected):
+        await callback.answer(REJECT_MESSAGES[events[0].reason], show_alert=True)
+        return
     
-    # Добавляем информацию о недостающих игроках и времени ожидания
-    if players_count < 2:
-        join_message += f"⏳ *Ожидаем еще {2 - players_count} игрока...*\n"
-        
-        # Добавляем информацию о времени ожидания
-        if chat_id in join_timers:
-            elapsed = time.time() - join_timers[chat_id]
-            remaining = max(0, JOIN_TIMEOUT - elapsed)
-            join_message += f"⏱ *Осталось времени:* {int(remaining)} сек.\n"
+    await callback.answer("🚀 Игра начинается!", show_alert=False)
+    await render_events(game, events, callback)
+
+async def send_cards_info_to_players(game: Game, announcement: Optional["GroupAnnouncement"] = None):
+    """Отправляет информацию о картах игрокам в личные сообщения.
     
-    # Попытаемся проверить, может ли бот отправлять сообщения пользователю
-    try:
-        await bot.send_chat_action(user_id, "typing")
-        # Если успешно, то пользователь уже взаимодействовал с ботом
-    except Exception:
-        # Пользователь еще не начал диалог с ботом
-        join_message += f"\n❗️ `{username}`, пожалуйста, начните личный диалог с ботом перед началом игры: https://t.me/{bot_username}"
+    Сообщения рассылаются параллельно (не более DM_FANOUT_CONCURRENCY одновременно),
+    а список игроков, которым не удалось написать, объявляется в группе одним сообщением.
+    """
+    semaphore = asyncio.Semaphore(DM_FANOUT_CONCURRENCY)
     
-    # Пытаемся изменить существующее сообщение или отправляем новое
-    try:
-        await callback.message.edit_text(
-            join_message,
-            parse_mode="Markdown",
-            reply_markup=get_join_keyboard() if players_count < 2 else None
+    async def send_to_player(user_id: int, player: Player) -> Optional[str]:
+        message = (
+            f"🎴 *Ваши карты:* {player.get_cards_str()}\n"
+            f"🔢 *Сумма очков:* {player.get_score()}"
         )
-    except Exception as e:
-        logging.error(f"Ошибка при обновлении сообщения: {e}")
-        try:
-            await bot.send_message(chat_id, join_message, parse_mode="Markdown")
-        except TelegramBadRequest as e:
-            # Если не удалось отправить с Markdown, отправляем без форматирования
-            logging.error(f"Ошибка при отправке форматированного сообщения: {e}")
-            clean_message = join_message.replace("*", "").replace("`", "").replace("\\_", "_")
-            await bot.send_message(chat_id, clean_message)
-    
-    # Если набралось 2 игрока, начинаем игру
-    if can_start:
-        game.start_game()
-        
-        # Удаляем таймер ожидания
-        if chat_id in join_timers:
-            del join_timers[chat_id]
         
-        # Объявляем о начале игры
-        players_str = ", ".join([f"`{player.username}`" for player in game.players.values()])
-        start_message = f"🎲 *Игра начинается!*\n👥 Участники: {players_str}"
-        start_message += f"\n\n❗️ Убедитесь, что вы начали личный диалог с ботом: https://t.me/{bot_username}"
+        # Добавляем клавиатуру с действиями, если сейчас ход этого игрока
+        keyboard = None
+        if game.current_player_id == user_id:
+            message += "\n\n🎯 *Сейчас ваш ход*. Выберите действие:"
+            keyboard = actions_keyboard(game)
         
         try:
-            await bot.send_message(chat_id, start_message, parse_mode="Markdown")
-        except TelegramBadRequest as e:
-            # Если не удалось отправить с Markdown, отправляем без форматирования
-            logging.error(f"Ошибка при отправке форматированного сообщения: {e}")
-            clean_message = start_message.replace("*", "").replace("`", "").replace("\\_", "_")
-            await bot.send_message(chat_id, clean_message)
-        
-        # Отправляем информацию о картах каждому игроку в личку
-        await send_cards_info_to_players(game)
-        
-        # Сообщаем о ходе первого игрока
-        current_player = game.players.get(game.current_player_id)
-        if current_player:
-            try:
-                await bot.send_message(
-                    chat_id, 
-                    f"🎯 Ход игрока `{current_player.username}`. Проверьте личные сообщения от бота!",
-                    parse_mode="Markdown"
-                )
-            except TelegramBadRequest as e:
-                logging.error(f"Ошибка при отправке форматированного сообщения: {e}")
-                await bot.send_message(
-                    chat_id, 
-                    f"🎯 Ход игрока {current_player.username}. Проверьте личные сообщения от бота!"
+            async with semaphore:
+                # Отправляем новое сообщение и сохраняем его ID
+                sent_message = await bot.send_message(
+                    user_id, 
+                    message,
+                    parse_mode="Markdown",
+                    reply_markup=keyboard
                 )
-
-async def send_cards_info_to_players(game: Game):
-    """Отправляет информацию о картах игрокам в личные сообщения"""
-    for user_id, player in game.players.items():
-        try:
-            message = (
-                f"🎴 *Ваши карты:* {player.get_cards_str()}\n"
-                f"🔢 *Сумма очков:* {player.get_score()}"
-            )
-            
-            # Добавляем клавиатуру с действиями, если сейчас ход этого игрока
-            keyboard = None
-            if game.current_player_id == user_id:
-                message += "\n\n🎯 *Сейчас ваш ход*. Выберите действие:"
-                keyboard = get_game_actions_keyboard()
-            
-            # Отправляем новое сообщение и сохраняем его ID
-            sent_message = await bot.send_message(
-                user_id, 
-                message,
-                parse_mode="Markdown",
-                reply_markup=keyboard
-            )
             
             # Если есть клавиатура, сохраняем ID сообщения
             if keyboard:
-                last_keyboard_messages[user_id] = sent_message.message_id
-                
+                player.keyboard_message_id = sent_message.message_id
+            return None
         except Exception as e:
             # Обрабатываем все возможные ошибки, включая TelegramForbiddenError
-            error_message = (
-                f"⚠️ Не удалось отправить личное сообщение игроку *{player.username}*. "
-                f"Пожалуйста, начните диалог с ботом перед началом игры: "
-                f"https://t.me/{(await bot.get_me()).username}"
-            )
-            await bot.send_message(game.chat_id, error_message, parse_mode="Markdown")
             logging.error(f"Ошибка при отправке сообщения игроку {user_id}: {e}")
+            return player.username
+    
+    results = await asyncio.gather(*(
+        send_to_player(user_id, player) for user_id, player in game.players.items()
+    ))
+    failed = [username for username in results if username is not None]
+    if not failed:
+        return
+    
+    failed_str = ", ".join(f"*{username}*" for username in failed)
+    error_message = (
+        f"⚠️ Не удалось отправить личное сообщение игрокам: {failed_str}. "
+        f"Пожалуйста, начните диалог с ботом перед началом игры: "
+        f"https://t.me/{await get_bot_username()}"
+    )
+    if announcement is not None:
+        announcement.add(error_message)
+    else:
+        await send_markdown(game.chat_id, error_message)
 
-@dp.callback_query(F.data == "hit")
+@dp.callback_query(F.data.startswith(ACTION_HIT))
 async def process_hit_callback(callback: types.CallbackQuery):
     """Обработчик нажатия на кнопку 'Взять ещё'"""
-    logger.info(f"Колбэк 'hit' от пользователя {callback.from_user.id} в ЛС (сообщение {callback.message.message_id if callback.message else 'N/A'})")
+    logger.info(f"Колбэк '{callback.data}' от пользователя {callback.from_user.id} в ЛС (сообщение {callback.message.message_id if callback.message else 'N/A'})")
     user_id = callback.from_user.id
     
-    # Проверяем, является ли это сообщение последним с клавиатурой
-    if user_id in last_keyboard_messages and callback.message.message_id != last_keyboard_messages[user_id]:
-        await callback.answer("⚠️ Используйте кнопки из последнего сообщения!", show_alert=True)
-        return
-    
-    # Ищем игру, в которой участвует пользователь
-    game = find_game_by_user_id(user_id)
+    # Игра, к которой относится кнопка
+    game, turn_seq = get_callback_game(callback)
     if not game:
         await callback.answer("⚠️ Игра не найдена или уже завершена.", show_alert=True)
         return
     
+    # Кнопка из устаревшего сообщения или повторное нажатие - номер хода уже сменился
+    if turn_seq != game.turn_seq:
+        await callback.answer("⚠️ Используйте кнопки из последнего сообщения!", show_alert=True)
+        return
+    
     # Проверяем, может ли игрок взять карту
-    success, card = game.hit(user_id)
-    if not success:
+    events = apply_action(game, Hit(user_id))
+    if isinstance(events[0], ActionRejected):
         await callback.answer("⚠️ Вы не можете взять карту сейчас.", show_alert=True)
         return
     
-    player = game.players[user_id]
-    
-    await callback.answer(f"🃏 Вы взяли карту {card}!", show_alert=False)
-    
-    # Сообщаем в групповой чат о взятии карты
-    try:
-        await bot.send_message(
-            game.chat_id,
-            f"🃏 Игрок `{player.username}` берет еще карту.",
-            parse_mode="Markdown"
-        )
-    except TelegramBadRequest as e:
-        logging.error(f"Ошибка при отправке форматированного сообщения: {e}")
-        await bot.send_message(
-            game.chat_id,
-            f"🃏 Игрок {player.username} берет еще карту."
-        )
-    
-    # Проверяем, может ли бот отправлять сообщения пользователю
-    if not await can_message_user(user_id):
-        bot_username = (await bot.get_me()).username
-        try:
-            await bot.send_message(
-                game.chat_id,
-                f"❗️ `{player.username}`, бот не может отправить вам личное сообщение. "
-                f"Пожалуйста, начните диалог с ботом: https://t.me/{bot_username}",
-                parse_mode="Markdown"
-            )
-        except TelegramBadRequest as e:
-            logging.error(f"Ошибка при отправке форматированного сообщения: {e}")
-            await bot.send_message(
-                game.chat_id,
-                f"❗️ {player.username}, бот не может отправить вам личное сообщение. "
-                f"Пожалуйста, начните диалог с ботом: https://t.me/{bot_username}"
-            )
-    else:
-        # Обновляем информацию о картах
-        message = (
-            f"🎴 *Ваши карты:* {player.get_cards_str()}\n"
-            f"🔢 *Сумма очков:* {player.get_score()}"
-        )
-        
-        # Проверяем на перебор
-        if player.busted:
-            try:
-                await bot.send_message(
-                    game.chat_id,
-                    f"💥 Игрок `{player.username}` перебрал! Сумма очков: *{player.get_score()}*",
-                    parse_mode="Markdown"
-                )
-            except TelegramBadRequest as e:
-                logging.error(f"Ошибка при отправке форматированного сообщения: {e}")
-                await bot.send_message(
-                    game.chat_id,
-                    f"💥 Игрок {player.username} перебрал! Сумма очков: {player.get_score()}"
-                )
-            
-            # Отправляем игроку в ЛС обновление о переборе и убираем клавиатуру
-            try:
-                # Убираем клавиатуру с предыдущего сообщения
-                if user_id in last_keyboard_messages:
-                    try:
-                        await bot.edit_message_reply_markup(
-                            chat_id=user_id,
-                            message_id=last_keyboard_messages[user_id],
-                            reply_markup=None
-                        )
-                    except Exception:
-                        pass  # Игнорируем ошибки при удалении клавиатуры
-
-                # Отправляем новое сообщение с информацией о переборе
-                bust_message = (
-                    f"💥 *Перебор!*\n"
-                    f"🎴 *Ваши карты:* {player.get_cards_str()}\n"
-                    f"🔢 *Сумма очков:* {player.get_score()}\n\n"
-                    f"Вы взяли слишком много карт и проиграли."
-                )
-                try:
-                    await bot.send_message(user_id, bust_message, parse_mode="Markdown")
-                except TelegramBadRequest as e:
-                    logging.error(f"Ошибка при отправке форматированного сообщения: {e}")
-                    clean_message = bust_message.replace("*", "").replace("`", "").replace("\\_", "_")
-                    await bot.send_message(user_id, clean_message)
-            except Exception as e:
-                logging.error(f"Ошибка при отправке сообщения о переборе игроку {user_id}: {e}")
-            
-            # Проверяем, завершилась ли игра
-            if game.finished:
-                try:
-                    await bot.send_message(
-                        game.chat_id,
-                        game.get_status_message(),
-                        parse_mode="Markdown"
-                    )
-                except TelegramBadRequest as e:
-                    logging.error(f"Ошибка при отправке форматированного сообщения: {e}")
-                    clean_message = game.get_status_message().replace("*", "").replace("`", "").replace("\\_", "_")
-                    await bot.send_message(game.chat_id, clean_message)
-                return
-            
-            # Переход хода
-            game.next_turn()
-            current_player = game.players.get(game.current_player_id)
-            if current_player:
-                try:
-                    await bot.send_message(
-                        game.chat_id,
-                        f"🎯 Ход переходит к игроку `{current_player.username}`.",
-                        parse_mode="Markdown"
-                    )
-                except TelegramBadRequest as e:
-                    logging.error(f"Ошибка при отправке форматированного сообщения: {e}")
-                    await bot.send_message(
-                        game.chat_id,
-                        f"🎯 Ход переходит к игроку {current_player.username}."
-                    )
-                await update_player_message(game, current_player.user_id)
-            return
-        
-        # Если игрок не перебрал, предлагаем действия
-        keyboard = get_game_actions_keyboard()
-        message += "\n\n🎯 *Выберите действие:*"
-        
-        try:
-            # Пытаемся обновить текущее сообщение
-            await callback.message.edit_text(message, reply_markup=keyboard, parse_mode="Markdown")
-        except Exception:
-            # Если не удалось отредактировать сообщение, отправляем новое
-            try:
-                # Удаляем старую клавиатуру, если она есть
-                if user_id in last_keyboard_messages:
-                    try:
-                        await bot.edit_message_reply_markup(
-                            chat_id=user_id,
-                            message_id=last_keyboard_messages[user_id],
-                            reply_markup=None
-                        )
-                    except Exception:
-                        pass  # Игнорируем ошибки при удалении клавиатуры
-                
-                # Отправляем новое сообщение и сохраняем его ID
-                sent_message = await bot.send_message(
-                    user_id, 
-                    message, 
-                    reply_markup=keyboard, 
-                    parse_mode="Markdown"
-                )
-                last_keyboard_messages[user_id] = sent_message.message_id
-            except Exception as e:
-                logging.error(f"Ошибка при отправке сообщения игроку {user_id}: {e}")
-                bot_username = (await bot.get_me()).username
-                try:
-                    await bot.send_message(
-                        game.chat_id,
-                        f"❗️ `{player.username}`, бот не может отправить вам личное сообщение. "
-                        f"Пожалуйста, начните диалог с ботом: https://t.me/{bot_username}",
-                        parse_mode="Markdown"
-                    )
-                except TelegramBadRequest as e:
-                    logging.error(f"Ошибка при отправке форматированного сообщения: {e}")
-                    await bot.send_message(
-                        game.chat_id,
-                        f"❗️ {player.username}, бот не может отправить вам личное сообщение. "
-                        f"Пожалуйста, начните диалог с ботом: https://t.me/{bot_username}"
-                    )
-
-@dp.callback_query(F.data == "stand")
+    await callback.answer(f"🃏 Вы взяли карту {events[0].card}!", show_alert=False)
+    await render_events(game, events, callback)
+
+@dp.callback_query(F.data.startswith(ACTION_STAND))
 async def process_stand_callback(callback: types.CallbackQuery):
     """Обработчик нажатия на кнопку 'Остановиться'"""
-    logger.info(f"Колбэк 'stand' от пользователя {callback.from_user.id} в ЛС (сообщение {callback.message.message_id if callback.message else 'N/A'})")
+    logger.info(f"Колбэк '{callback.data}' от пользователя {callback.from_user.id} в ЛС (сообщение {callback.message.message_id if callback.message else 'N/A'})")
     user_id = callback.from_user.id
     
-    # Проверяем, является ли это сообщение последним с клавиатурой
-    if user_id in last_keyboard_messages and callback.message.message_id != last_keyboard_messages[user_id]:
-        await callback.answer("⚠️ Используйте кнопки из последнего сообщения!", show_alert=True)
-        return
-    
-    # Ищем игру, в которой участвует пользователь
-    game = find_game_by_user_id(user_id)
+    # Игра, к которой относится кнопка
+    game, turn_seq = get_callback_game(callback)
     if not game:
         await callback.answer("⚠️ Игра не найдена или уже завершена.", show_alert=True)
         return
     
+    # Кнопка из устаревшего сообщения или повторное нажатие - номер хода уже сменился
+    if turn_seq != game.turn_seq:
+        await callback.answer("⚠️ Используйте кнопки из последнего сообщения!", show_alert=True)
+        return
+    
     # Проверяем, может ли игрок остановиться
-    success = game.stand(user_id)
-    if not success:
+    events = apply_action(game, Stand(user_id))
+    if isinstance(events[0], ActionRejected):
         await callback.answer("⚠️ Вы не можете остановиться сейчас.", show_alert=True)
         return
     
-    player = game.players[user_id]
-    
     await callback.answer("✋ Вы остановились!", show_alert=False)
+    await render_events(game, events, callback)
+
+@dp.callback_query(F.data.startswith(ACTION_HINT))
+async def process_hint_callback(callback: types.CallbackQuery):
+    """Обработчик нажатия на кнопку 'Подсказка'"""
+    logger.info(f"Колбэк '{callback.data}' от пользователя {callback.from_user.id} в ЛС (сообщение {callback.message.message_id if callback.message else 'N/A'})")
+    game, turn_seq = get_callback_game(callback)
+    player = game.players.get(callback.from_user.id) if game else None
+    if not player or turn_seq != game.turn_seq:
+        await callback.answer("⚠️ Используйте кнопки из последнего сообщения!", show_alert=True)
+        return
     
-    # Сообщаем в групповой чат об остановке
+    hit = should_hit(game, player)
+    if hit is None:
+        await callback.answer("ℹ️ Подсказка доступна только во время вашего хода.")
+    else:
+        await callback.answer("💡 Совет: взять карту" if hit else "💡 Совет: остановиться")
+
+def actions_keyboard(game: Game):
+    """Кнопки действий игрока; подсказка - если она включена и это игра без дилера"""
+    return get_game_actions_keyboard(game.game_id, game.turn_seq, hint=HINTS_ENABLED and not game.dealer)
+
+def new_game(chat_id: int, dealer: Optional[Dealer] = None, match: Optional[Match] = None) -> Game:
+    """Берет игру из пула (см. GamePool) с генератором колоды, выбранным в DECK_RNG"""
+    if DECK_RNG == RNG_SECURE:
+        return game_pool.acquire(chat_id, dealer=dealer, rng=secure_rng, match=match)
+    return game_pool.acquire(chat_id, dealer=dealer, match=match)
+
+def record_new_game(game: Game) -> None:
+    """Записывает новую игру (seed и параметры) в журнал игр"""
+    if game_log:
+        game_log.record_game(game)
+
+def apply_action(game: Game, action) -> List:
+    """Применяет действие к игре и записывает принятое действие в журнал игр"""
+    events = game.apply(action)
+    if events and not isinstance(events[0], ActionRejected):
+        if isinstance(action, Join):
+            register_player(game, action.user_id)
+        if isinstance(action, NextRound) and events[0].deck_order is not None:
+            # Колоду перемешали перед раундом - записываем новый порядок для воспроизведения
+            action = NextRound(events[0].deck_order)
+        if game_log:
+            game_log.record_action(game.game_id, action)
+    return events
+
+async def render_events(game: Game, events: List, callback: Optional[types.CallbackQuery] = None,
+                        announcement: Optional["GroupAnnouncement"] = None):
+    """Отображает события игры: объявления в группе, личные сообщения и табло.
+    
+    Состояние игры здесь не меняется - все уже решено в Game.apply().
+    """
+    own_announcement = announcement is None
+    if own_announcement:
+        announcement = game_announcement(game)
+    # Табло обновляется без задержки при начале и завершении игры
+    board_now = False
+    just_started = False
+    # Игра удалена из реестра в этой отрисовке: вернуть ее в пул после правки табло
+    release = False
     try:
-        await bot.send_message(
-            game.chat_id,
-            f"✋ Игрок `{player.username}` останавливается.",
-            parse_mode="Markdown"
-        )
-    except TelegramBadRequest as e:
-        logging.error(f"Ошибка при отправке форматированного сообщения: {e}")
-        await bot.send_message(
-            game.chat_id,
-            f"✋ Игрок {player.username} останавливается."
-        )
+        for event in events:
+            if isinstance(event, GameStarted):
+                just_started = board_now = True
+                # Удаляем таймер ожидания
+                join_timers.pop(game.game_id, None)
+                
+                # Объявляем о начале игры
+                players_str = ", ".join([f"`{game.players[pid].username}`" for pid in event.player_ids])
+                announcement.add(f"🎲 *Игра начинается!*\n👥 Участники: {players_str}")
+                
+                # Отправляем информацию о картах каждому игроку в личку
+                await send_cards_info_to_players(game, announcement)
+            
+            elif isinstance(event, CardDealt):
+                player = game.players[event.user_id]
+                announcement.add(f"🃏 Игрок `{player.username}` берет еще карту.")
+                if not player.busted:
+                    await show_player_actions(game, player, callback, announcement)
+            
+            elif isinstance(event, Busted):
+                player = game.players[event.user_id]
+                announcement.add(f"💥 Игрок `{player.username}` перебрал! Сумма очков: *{event.score}*")
+                await send_bust_message(player)
+            
+            elif isinstance(event, Stood):
+                player = game.players[event.user_id]
+                announcement.add(f"✋ Игрок `{player.username}` останавливается.")
+                # Убираем клавиатуру после остановки
+                if callback:
+                    player.keyboard_message_id = None
+                    try:
+                        await callback.message.edit_reply_markup(reply_markup=None)
+                    except Exception:
+                        pass
+            
+            elif isinstance(event, TurnPassed):
+                player = game.players[event.user_id]
+                if just_started:
+                    # Клавиатура уже отправлена вместе с раздачей карт
+                    announcement.add(f"🎯 Ход игрока `{player.username}`. Проверьте личные сообщения от бота!")
+                else:
+                    announcement.add(f"🎯 Ход переходит к игроку `{player.username}`.")
+                    await update_player_message(game, player.user_id, announcement)
+            
+            elif isinstance(event, RoundStarted):
+                announcement.add(f"🔄 *Раунд {event.round_number} из {game.match.rounds}*")
+            
+            elif isinstance(event, GameFinished):
+                board_now = True
+                announcement.add(game.get_status_message())
+                if stats_store:
+                    stats_store.record_game(game)
+                if game.match and not game.match.finished:
+                    # Матч продолжается: тот же стол, игроки и табло в следующем раунде
+                    announcement.add(game.match.get_totals_text(game.players))
+                    if supervisor.spawn(start_next_round(game.game_id), game.game_id, "start_next_round") is None:
+                        # Лимит фоновых задач исчерпан: без таймера раунд не начнется - матч завершается
+                        announcement.add(MATCH_STOPPED_TEXT)
+                        release = unregister_game(game)
+                        supervisor.cancel_game(game.game_id)
+                else:
+                    release = unregister_game(game)
+                    # Таймер ожидания и отложенная правка табло больше не нужны
+                    supervisor.cancel_game(game.game_id)
+            
+            elif isinstance(event, MatchFinished):
+                announcement.add(game.match.get_totals_text(game.players))
+            
+            elif isinstance(event, GameCancelled):
+                release = await cancel_waiting_game(game, announcement)
+    finally:
+        await refresh_board(game, immediate=board_now)
+        if own_announcement:
+            await announcement.flush()
+    if release:
+        game_pool.release(game)
+
+async def start_next_round(game_id: int, delay: float = ROUND_PAUSE):
+    """Начинает следующий раунд матча после паузы"""
+    await asyncio.sleep(delay)
+    game = active_games.get(game_id)
+    # Игру могли принудительно завершить командой /clear
+    if not game or not game.finished:
+        return
+    events = apply_action(game, NextRound())
+    if isinstance(events[0], ActionRejected):
+        return
+    await render_events(game, events)
+
+async def cancel_waiting_game(game: Game, announcement: "GroupAnnouncement") -> bool:
+    """Отменяет игру, для которой за время ожидания не набралось игроков.
+    
+    Возвращает True, если игра удалена из реестра (ее нужно вернуть в пул).
+    """
+    # Формируем список присоединившихся игроков
+    players_count = len(game.players)
+    players_info = ""
+    if players_count > 0:
+        # Экранируем специальные символы Markdown в именах пользователей
+        players_list = "\n".join([f"👤 `{player.username}`" for player in game.players.values()])
+        players_info = f"\n\n👥 *Присоединившиеся игроки ({players_count}/{MAX_PLAYERS}):*\n{players_list}"
+    
+    announcement.add(
+        f"⏱ *Время ожидания истекло!*\n"
+        f"Для начала игры необходимо минимум {game.min_players} игрока.{players_info}\n\n"
+        f"Игра отменена. Начните новую игру командой /start\\_21"
+    )
+    
+    # Убираем кнопку присоединения с табло
+    board = game_boards.pop(game.game_id, None)
+    if board:
+        board.update("⏱ *Игра отменена: время ожидания истекло.*")
+        await board.flush()
+    
+    registered = unregister_game(game)
+    supervisor.cancel_game(game.game_id)
+    
+    # Удаляем таймер
+    join_timers.pop(game.game_id, None)
+    return registered
+
+async def show_player_actions(game: Game, player: Player, callback: Optional[types.CallbackQuery],
+                              announcement: "GroupAnnouncement"):
+    """Показывает игроку его карты и кнопки действий после взятия карты"""
+    user_id = player.user_id
+    keyboard = actions_keyboard(game)
+    message = (
+        f"🎴 *Ваши карты:* {player.get_cards_str()}\n"
+        f"🔢 *Сумма очков:* {player.get_score()}"
+        f"\n\n🎯 *Выберите действие:*"
+    )
     
-    # Убираем клавиатуру после остановки
     try:
-        await callback.message.edit_reply_markup(reply_markup=None)
+        # Пытаемся обновить текущее сообщение
+        await callback.message.edit_text(message, reply_markup=keyboard, parse_mode="Markdown")
+        player.keyboard_message_id = callback.message.message_id
+        return
     except Exception:
         pass
     
-    # Проверяем, завершена ли игра
-    if game.finished:
+    # Если не удалось отредактировать сообщение, отправляем новое
+    try:
+        # Удаляем старую клавиатуру, если она есть
+        await remove_last_keyboard(player)
+        
+        # Отправляем новое сообщение и сохраняем его ID
+        sent_message = await bot.send_message(
+            user_id, 
+            message, 
+            reply_markup=keyboard, 
+            parse_mode="Markdown"
+        )
+        player.keyboard_message_id = sent_message.message_id
+    except Exception as e:
+        logging.error(f"Ошибка при отправке сообщения игроку {user_id}: {e}")
+        announcement.add(
+            f"❗️ `{player.username}`, бот не может отправить вам личное сообщение. "
+            f"Пожалуйста, начните диалог с ботом: https://t.me/{await get_bot_username()}"
+        )
+
+async def send_bust_message(player: Player):
+    """Сообщает игроку в ЛС о переборе и убирает у него клавиатуру"""
+    user_id = player.user_id
+    try:
+        # Убираем клавиатуру с предыдущего сообщения
+        await remove_last_keyboard(player)
+
+        # Отправляем новое сообщение с информацией о переборе
+        bust_message = (
+            f"💥 *Перебор!*\n"
+            f"🎴 *Ваши карты:* {player.get_cards_str()}\n"
+            f"🔢 *Сумма очков:* {player.get_score()}\n\n"
+            f"Вы взяли слишком много карт и проиграли."
+        )
+        await send_markdown(user_id, bust_message)
+    except Exception as e:
+        logging.error(f"Ошибка при отправке сообщения о переборе игроку {user_id}: {e}")
+
+async def remove_last_keyboard(player: Player):
+    """Убирает клавиатуру с последнего сообщения игрока, если она есть"""
+    if player.keyboard_message_id is not None:
+        message_id, player.keyboard_message_id = player.keyboard_message_id, None
         try:
-            await bot.send_message(
-                game.chat_id,
-                game.get_status_message(),
-                parse_mode="Markdown"
+            await bot.edit_message_reply_markup(
+                chat_id=player.user_id,
+                message_id=message_id,
+                reply_markup=None
             )
-        except TelegramBadRequest as e:
-            logging.error(f"Ошибка при отправке форматированного сообщения: {e}")
-            clean_message = game.get_status_message().replace("*", "").replace("`", "").replace("\\_", "_")
-            await bot.send_message(game.chat_id, clean_message)
+        except Exception:
+            pass  # Игнорируем ошибки при удалении клавиатуры
+
+async def render_board_text(game: Game) -> str:
+    """Формирует текст табло игры вместе с подсказками для ожидающей игры"""
+    text = game.get_board_text()
+    if not game.started:
+        bot_username = await get_bot_username()
+        text += (
+            f"\nНажмите кнопку, чтобы присоединиться.\n\n"
+            f"❗️ *Важно:* Перед началом игры каждый участник должен начать личный диалог с ботом: "
+            f"https://t.me/{bot_username}"
+        )
+    return text
+
+async def refresh_board(game: Game, immediate: bool = False) -> None:
+    """Обновляет табло игры. Правки объединяются, завершенная игра отправляется сразу."""
+    board = game_boards.get(game.game_id)
+    if not board:
         return
+    board.update(await render_board_text(game), get_join_keyboard(game.game_id, game.can_start()) if not game.started else None)
+    if immediate or game.finished:
+        await board.flush()
+    if game.finished and game.game_id not in active_games:
+        # Табло матча остается для следующего раунда, пока игра зарегистрирована
+        game_boards.pop(game.game_id, None)
+
+def game_announcement(game: Game) -> "GroupAnnouncement":
+    """Создает буфер объявлений игры; объявления отправляются ответом на табло этой игры"""
+    board = game_boards.get(game.game_id)
+    return GroupAnnouncement(game.chat_id, board.message_id if board else None)
+
+class GroupAnnouncement:
+    """Буфер объявлений для группового чата в рамках одного игрового действия.
+    
+    Вместо отдельного сообщения на каждое событие (взял карту, перебор, переход хода)
+    строки копятся и отправляются в чат одним сообщением при вызове flush().
+    Если задан reply_to_message_id, сообщение отправляется ответом на табло игры,
+    чтобы при нескольких играх в чате было видно, к какой из них оно относится.
+    """
+    
+    def __init__(self, chat_id: int, reply_to_message_id: Optional[int] = None):
+        self.chat_id = chat_id
+        self.reply_to_message_id = reply_to_message_id
+        self.lines: List[str] = []
+    
+    def add(self, text: str) -> None:
+        """Добавляет строку в буфер объявлений"""
+        self.lines.append(text)
     
-    # Переходим к следующему игроку
-    game.next_turn()
-    current_player = game.players.get(game.current_player_id)
-    if current_player:
+    async def flush(self) -> None:
+        """Отправляет накопленные объявления одним сообщением и очищает буфер"""
+        if not self.lines:
+            return
+        text = "\n\n".join(self.lines)
+        self.lines = []
+        kwargs = {}
+        if self.reply_to_message_id:
+            kwargs = {"reply_to_message_id": self.reply_to_message_id, "allow_sending_without_reply": True}
         try:
-            await bot.send_message(
-                game.chat_id,
-                f"🎯 Ход переходит к игроку `{current_player.username}`.",
-                parse_mode="Markdown"
-            )
-        except TelegramBadRequest as e:
-            logging.error(f"Ошибка при отправке форматированного сообщения: {e}")
-            await bot.send_message(
-                game.chat_id,
-                f"🎯 Ход переходит к игроку {current_player.username}."
-            )
-        await update_player_message(game, current_player.user_id)
+            await send_markdown(self.chat_id, text, **kwargs)
+        except Exception as e:
+            logging.error(f"Ошибка при отправке объявлений в чат {self.chat_id}: {e}")
+
+async def send_markdown(chat_id: int, text: str, **kwargs):
+    """Отправляет сообщение с Markdown, а при ошибке разметки - без форматирования"""
+    try:
+        return await bot.send_message(chat_id, text, parse_mode="Markdown", **kwargs)
+    except TelegramBadRequest as e:
+        logging.error(f"Ошибка при отправке форматированного сообщения: {e}")
+        clean_text = text.replace("*", "").replace("`", "").replace("\\_", "_")
+        return await bot.send_message(chat_id, clean_text, **kwargs)
+
+async def get_bot_username() -> str:
+    """Возвращает username бота (результат getMe кэшируется aiogram)"""
+    return (await bot.me()).username
 
 async def can_message_user(user_id: int) -> bool:
     """Проверяет, может ли бот отправлять сообщения пользователю"""
@@ -703,31 +965,23 @@ async def can_message_user(user_id: int) -> bool:
     except Exception:
         return False
 
-async def update_player_message(game: Game, user_id: int):
-    """Обновляет сообщение с информацией о картах игрока"""
+async def update_player_message(game: Game, user_id: int, announcement: "GroupAnnouncement"):
+    """Обновляет сообщение с информацией о картах игрока.
+    
+    Предупреждения для группового чата добавляются в announcement.
+    """
     player = game.players.get(user_id)
     if not player:
         return
 
     # Проверяем, может ли бот отправлять сообщения пользователю
     if not await can_message_user(user_id):
-        bot_username = (await bot.get_me()).username
-        try:
-            await bot.send_message(
-                game.chat_id,
-                f"❗️ `{player.username}`, бот не может отправить вам личное сообщение. "
-                f"Пожалуйста, начните диалог с ботом: https://t.me/{bot_username} "
-                f"и затем нажмите любую кнопку действия.",
-                parse_mode="Markdown"
-            )
-        except TelegramBadRequest as e:
-            logging.error(f"Ошибка при отправке форматированного сообщения: {e}")
-            await bot.send_message(
-                game.chat_id,
-                f"❗️ {player.username}, бот не может отправить вам личное сообщение. "
-                f"Пожалуйста, начните диалог с ботом: https://t.me/{bot_username} "
-                f"и затем нажмите любую кнопку действия."
-            )
+        bot_username = await get_bot_username()
+        announcement.add(
+            f"❗️ `{player.username}`, бот не может отправить вам личное сообщение. "
+            f"Пожалуйста, начните диалог с ботом: https://t.me/{bot_username} "
+            f"и затем нажмите любую кнопку действия."
+        )
         return
 
     message = (
@@ -738,60 +992,27 @@ async def update_player_message(game: Game, user_id: int):
     # Если сейчас ход этого игрока и он еще не завершил игру
     if game.current_player_id == user_id and not player.stopped and not player.busted:
         message += "\n\n🎯 *Сейчас ваш ход*. Выберите действие:"
-        keyboard = get_game_actions_keyboard()
+        keyboard = actions_keyboard(game)
         
         try:
             # Удаляем старую клавиатуру, если она есть
-            if user_id in last_keyboard_messages:
-                try:
-                    await bot.edit_message_reply_markup(
-                        chat_id=user_id,
-                        message_id=last_keyboard_messages[user_id],
-                        reply_markup=None
-                    )
-                except Exception:
-                    pass  # Игнорируем ошибки при удалении клавиатуры
+            await remove_last_keyboard(player)
             
             # Отправляем новое сообщение и сохраняем его ID
-            try:
-                sent_message = await bot.send_message(
-                    user_id, 
-                    message, 
-                    reply_markup=keyboard, 
-                    parse_mode="Markdown"
-                )
-                last_keyboard_messages[user_id] = sent_message.message_id
-            except TelegramBadRequest as e:
-                logging.error(f"Ошибка при отправке форматированного сообщения: {e}")
-                clean_message = message.replace("*", "").replace("`", "").replace("\\_", "_")
-                sent_message = await bot.send_message(
-                    user_id, 
-                    clean_message, 
-                    reply_markup=keyboard
-                )
-                last_keyboard_messages[user_id] = sent_message.message_id
+            sent_message = await send_markdown(user_id, message, reply_markup=keyboard)
+            player.keyboard_message_id = sent_message.message_id
         except Exception as e:
             logging.error(f"Ошибка при отправке сообщения игроку {user_id}: {e}")
-            bot_username = (await bot.get_me()).username
-            try:
-                await bot.send_message(
-                    game.chat_id,
-                    f"❗️ `{player.username}`, бот не может отправить вам личное сообщение. "
-                    f"Пожалуйста, начните диалог с ботом: https://t.me/{bot_username}",
-                    parse_mode="Markdown"
-                )
-            except TelegramBadRequest as e:
-                logging.error(f"Ошибка при отправке форматированного сообщения: {e}")
-                await bot.send_message(
-                    game.chat_id,
-                    f"❗️ {player.username}, бот не может отправить вам личное сообщение. "
-                    f"Пожалуйста, начните диалог с ботом: https://t.me/{bot_username}"
-                )
+            bot_username = await get_bot_username()
+            announcement.add(
+                f"❗️ `{player.username}`, бот не может отправить вам личное сообщение. "
+                f"Пожалуйста, начните диалог с ботом: https://t.me/{bot_username}"
+            )
 
 def find_game_by_user_id(user_id: int) -> Optional[Game]:
-    """Находит игру, в которой участвует пользователь"""
-    for game in active_games.values():
-        if user_id in game.players and not game.finished:
+    """Находит незавершенную игру, за стол которой последним сел пользователь"""
+    for game in reversed(get_player_games(user_id)):
+        if not game.finished:
             return game
     return None
 
@@ -802,17 +1023,24 @@ async def cmd_clear(message: types.Message):
     if message.from_user.username != "sadea12":
         await message.answer("⚠️ У вас нет прав для использования этой команды.")
         return
-    chat_id = message.chat.id
-    # Проверяем наличие игры
-    if chat_id not in active_games:
+    # Проверяем наличие игр
+    games = get_chat_games(message.chat.id)
+    if not games:
         await message.answer("ℹ️ В этом чате нет активной игры.")
         return
-    # Отменяем таймер ожидания, если он есть
-    if chat_id in join_timers:
-        del join_timers[chat_id]
-    # Удаляем игру
-    del active_games[chat_id]
-    await message.answer("🛑 Игра была принудительно завершена.")
+    for game in games:
+        # Отменяем таймер ожидания, если он есть
+        join_timers.pop(game.game_id, None)
+        # Удаляем игру и ее табло, отменяем таймеры игры (ожидание игроков, пауза между раундами)
+        registered = unregister_game(game)
+        supervisor.cancel_game(game.game_id)
+        board = game_boards.pop(game.game_id, None)
+        if board:
+            board.update("🛑 *Игра была принудительно завершена.*")
+            await board.flush()
+        if registered:
+            game_pool.release(game)
+    await message.answer("🛑 Игры в этом чате были принудительно завершены." if len(games) > 1 else "🛑 Игра была принудительно завершена.")
 
 @dp.message()
 async def unhandled_message_handler(message: types.Message):
@@ -820,97 +1048,252 @@ async def unhandled_message_handler(message: types.Message):
     # Можно добавить ответ пользователю для отладки, но пока ограничимся логом
     # await message.answer("Получил ваше сообщение, но не нашел обработчик команды.")
 
-async def on_startup(bot: Bot) -> None:
-    """Действия при запуске бота"""
+# Команды бота для меню (личные чаты и группы)
+PRIVATE_COMMANDS = [
+    types.BotCommand(command="start", description="Начать диалог с ботом"),
+    types.BotCommand(command="dealer_21", description="Сыграть против дилера"),
+    types.BotCommand(command="stats", description="Ваша статистика"),
+    types.BotCommand(command="top", description="Лучшие игроки"),
+    types.BotCommand(command="help", description="Правила игры и список команд")
+]
+GROUP_COMMANDS = [
+    types.BotCommand(command="start_21", description="Начать новую игру в 21"),
+    types.BotCommand(command="match_21", description="Матч из нескольких раундов"),
+    types.BotCommand(command="dealer_21", description="Сыграть против дилера"),
+    types.BotCommand(command="game_status", description="Проверить статус текущей игры"),
+    types.BotCommand(command="stats", description="Ваша статистика"),
+    types.BotCommand(command="top", description="Лучшие игроки чата"),
+    types.BotCommand(command="help", description="Правила игры и список команд"),
+    types.BotCommand(command="clear", description="Принудительно завершить игру (только @sadea12)"),
+]
+
+async def on_startup(bot: Bot, webhook: bool = True) -> None:
+    """Действия при запуске бота: вебхук и команды устанавливаются параллельно.
+    
+    Если в Telegram уже стоят нужные значения (обычный перезапуск), повторно они не отправляются.
+    В режиме long polling вебхук не ставится.
+    """
     logger.info("Выполняется on_startup...")
+    tasks = [
+        ensure_commands(bot, PRIVATE_COMMANDS, types.BotCommandScopeDefault()),
+        ensure_commands(bot, GROUP_COMMANDS, types.BotCommandScopeAllGroupChats()),
+    ]
+    if webhook:
+        tasks.append(ensure_webhook(bot))
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            logger.error(f"Ошибка при выполнении on_startup: {result}")
+
+async def ensure_webhook(bot: Bot) -> None:
+    """Устанавливает вебхук, если он еще не указывает на WEBHOOK_URL"""
+    info = await bot.get_webhook_info()
+    if info.url == WEBHOOK_URL:
+        logger.info(f"Webhook уже установлен на {WEBHOOK_URL}")
+        return
     await bot.set_webhook(url=WEBHOOK_URL)
     logger.info(f"Webhook установлен на {WEBHOOK_URL}")
-    # Устанавливаем команды бота для отображения в меню
-    private_commands = [
-        types.BotCommand(command="start", description="Начать диалог с ботом"),
-        types.BotCommand(command="help", description="Правила игры и список команд")
-    ]
-    group_commands = [
-        types.BotCommand(command="start_21", description="Начать новую игру в 21"),
-        types.BotCommand(command="game_status", description="Проверить статус текущей игры"),
-        types.BotCommand(command="help", description="Правила игры и список команд"),
-        types.BotCommand(command="clear", description="Принудительно завершить игру (только @sadea12)"),
-    ]
-    await bot.set_my_commands(private_commands, scope=types.BotCommandScopeDefault())
-    await bot.set_my_commands(group_commands, scope=types.BotCommandScopeAllGroupChats())
-    logger.info("Команды бота установлены для разных типов чатов")
 
-def start_webhook():
-    """Запуск бота с использованием webhook (для деплоя на Render)"""
-    # Настраиваем веб-приложение
-    app = web.Application()
-    # Регистрируем on_startup хук aiohttp, чтобы установить webhook и команды в одной event loop
-    async def _on_app_startup(app):
-        logger.info("Запуск on_startup(bot) через app.on_startup")
+async def ensure_commands(bot: Bot, commands: List[types.BotCommand], scope: types.BotCommandScope) -> None:
+    """Устанавливает команды бота для scope, если они отличаются от текущих"""
+    current = await bot.get_my_commands(scope=scope)
+    if [(c.command, c.description) for c in current] == [(c.command, c.description) for c in commands]:
+        logger.info(f"Команды для {type(scope).__name__} уже установлены")
+        return
+    await bot.set_my_commands(commands, scope=scope)
+    logger.info(f"Команды бота установлены для {type(scope).__name__}")
+
+async def restore_games() -> None:
+    """Восстанавливает игры, сохраненные при предыдущей остановке бота"""
+    if not snapshot_store:
+        return
+    snapshots = await snapshot_store.load(secure_rng)
+    restored = 0
+    for snapshot in snapshots:
+        game = snapshot.game
+        max_age = SNAPSHOT_MAX_AGE if game.started else JOIN_TIMEOUT
+        if snapshot.age() > max_age:
+            logger.info(f"Снимок игры {game.game_id} в чате {game.chat_id} устарел "
+                        f"({snapshot.age():.0f} с), игра не восстановлена")
+            continue
+        restored += 1
+        register_game(game)
+        for user_id in game.players:
+            register_player(game, user_id)
+        if snapshot.board_message_id:
+            # Текст табло неизвестен - следующее обновление отредактирует сообщение целиком
+            game_boards[game.game_id] = GameBoard(bot, game.chat_id, snapshot.board_message_id,
+                                                  supervisor=supervisor, game_id=game.game_id)
+        if game.finished:
+            # Остановка пришлась на паузу между раундами матча
+            if supervisor.spawn(start_next_round(game.game_id), game.game_id, "start_next_round") is None:
+                await drop_restored_game(game, MATCH_STOPPED_TEXT)
+        elif not game.started:
+            join_timers[game.game_id] = snapshot.join_started_at or time.time()
+            if supervisor.spawn(wait_for_players(game.game_id, join_time_left(snapshot, JOIN_TIMEOUT)),
+                                game.game_id, "wait_for_players") is None:
+                await drop_restored_game(game, RESTORE_CANCELLED_TEXT)
+        elif is_private_dealer_game(game):
+            if supervisor.spawn(wait_for_turn(game.game_id), game.game_id, "wait_for_turn") is None:
+                await drop_restored_game(game, RESTORE_CANCELLED_TEXT)
+    if restored:
+        logger.info(f"Восстановлено игр после перезапуска: {restored}")
+
+async def drop_restored_game(game: Game, text: str) -> None:
+    """Снимает восстановленную игру, таймер которой не запустился (лимит фоновых задач)"""
+    join_timers.pop(game.game_id, None)
+    board = game_boards.pop(game.game_id, None)
+    if unregister_game(game):
+        game_pool.release(game)
+    try:
+        await send_markdown(game.chat_id, text, reply_to_message_id=board.message_id if board else None)
+    except Exception as e:
+        logger.error(f"Не удалось сообщить об остановке игры {game.game_id} в чат {game.chat_id}: {e}")
+
+async def startup_bot(webhook: bool = True) -> None:
+    """Запускает фоновые службы бота и восстанавливает игры. Вебхук и команды ставятся в фоне"""
+    if game_log:
+        game_log.start()
+    if storage:
+        storage.open()
         try:
-            await on_startup(bot)
+            await restore_games()
         except Exception as e:
-            logger.error(f"Ошибка при выполнении on_startup: {e}", exc_info=True)
-    app.on_startup.append(_on_app_startup)
-    
-    # Настройка вебхука и регистрация обработчика обновлений
-    webhook_requests_handler = SimpleRequestHandler(
-        dispatcher=dp,
-        bot=bot,
-        # Сюда можно передать пользовательские аргументы, если нужно, они будут доступны в хэндлерах
-        # например: handle_unknown_updates=True (хотя по умолчанию True)
-    )
-    webhook_requests_handler.register(app, path=WEBHOOK_PATH)
-    logger.info(f"SimpleRequestHandler зарегистрирован для пути {WEBHOOK_PATH}")
+            logger.error(f"Ошибка при восстановлении игр: {e}", exc_info=True)
+    supervisor.spawn(on_startup(bot, webhook), name="on_startup")
+
+async def shutdown_bot(pending_requests: Iterable[asyncio.Task] = ()) -> None:
+    """Останавливает бота без потери игр и закрывает сессию.
     
-    # Добавляем обработчик корневого маршрута для healthcheck
-    async def health_check(request):
-        # Логируем health check запросы, чтобы видеть, что Render их делает
-        logger.debug(f"Health check запрос от {request.remote} к {request.path}")
-        return web.Response(text=f"Бот работает. Aiogram Webhook (SimpleRequestHandler) активен. Путь: {WEBHOOK_URL}")
+    pending_requests - принятые сервером запросы вебхука, которые еще не дошли до диспетчера.
+    """
+    await graceful_shutdown(pending_requests)
+    # Оставшиеся таймеры игр отменяются: игры уже сохранены в снимок
+    await supervisor.shutdown(timeout=1.0)
+    stats = session.stats
+    logger.info(f"HTTP-соединений к Bot API: открыто {stats.connections_created}, "
+                f"переиспользовано {stats.connections_reused}, ожиданий пула {stats.pool_waits}")
+    await bot.session.close()
+
+def get_metrics() -> Dict[str, float]:
+    """Метрики бота для /metrics: игры, обработчики, хранилище и запросы к Bot API"""
+    metrics = {
+        "active_games": len(active_games),
+        "inflight_updates": len(inflight_updates),
+        "game_boards": len(game_boards),
+        "throttled_callbacks": throttling.throttled,
+        "game_pool_free": len(game_pool),
+        "game_pool_created": game_pool.created,
+        "game_pool_reused": game_pool.reused,
+    }
+    if storage:
+        metrics["storage_writes"] = storage.writes
+        metrics["storage_batches"] = storage.batches
+    metrics.update(supervisor.as_metrics())
+    metrics.update(session.stats.as_metrics())
+    return metrics
+
+def get_memory_report() -> Dict[str, float]:
+    """Память состояния игр для /memory: обходит все игры, поэтому дороже get_metrics()"""
+    containers = {
+        "active_games": active_games,
+        "player_games": player_games,
+        "join_timers": join_timers,
+        "game_boards": game_boards,
+        "recent_status_requests": recent_status_requests,
+        "game_pool": list(game_pool),
+    }
+    # Bot и общий генератор колоды не принадлежат играм
+    return memory_report(list(active_games.values()), containers, exclude=(bot, secure_rng))
+
+async def graceful_shutdown(pending_requests: Iterable[asyncio.Task] = ()) -> None:
+    """Останавливает бота, не теряя игры.
+    
+    Новые обновления к этому моменту уже не принимаются (см. server.py и start_polling).
+    1. В пределах SHUTDOWN_TIMEOUT дожидаемся текущих обработчиков (и принятых запросов
+       вебхука pending_requests) и отложенных правок табло.
+    2. Незавершенные игры, таймеры ожидания и табло сохраняются в базу.
+    3. Журнал игр и хранилище дописываются на диск и закрываются.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + SHUTDOWN_TIMEOUT
+    
+    current = asyncio.current_task()
+    pending = [task for task in inflight_updates.union(pending_requests) if task is not current and not task.done()]
+    if pending:
+        logger.info(f"Ожидание завершения обработчиков: {len(pending)}")
+        _, not_done = await asyncio.wait(pending, timeout=max(0.0, deadline - loop.time()))
+        if not_done:
+            logger.warning(f"Не дождались завершения обработчиков: {len(not_done)}")
     
-    app.router.add_get("/", health_check)
-    logger.info(f"Health check зарегистрирован для пути /")
+    if game_boards:
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(board.flush() for board in list(game_boards.values())), return_exceptions=True),
+                timeout=max(0.0, deadline - loop.time())
+            )
+        except asyncio.TimeoutError:
+            logger.warning("Не успели обновить все табло перед остановкой")
     
-    # Диагностическая информация
+    if snapshot_store:
+        snapshots = [
+            GameSnapshot(game, join_timers.get(game_id),
+                         game_boards[game_id].message_id if game_id in game_boards else None)
+            for game_id, game in active_games.items()
+            if not game.finished or (game.match and not game.match.finished)
+        ]
+        try:
+            await snapshot_store.save(snapshots)
+            logger.info(f"Сохранено незавершенных игр: {len(snapshots)}")
+        except Exception as e:
+            logger.error(f"Не удалось сохранить игры перед остановкой: {e}")
+    
+    if game_log:
+        await game_log.close()
+    if storage:
+        await storage.close()
+
+def start_webhook():
+    """Запуск бота с использованием webhook (для деплоя на Render), см. server.py"""
+    # server.py загружает бота через import main - при запуске python main.py это этот же модуль
+    sys.modules.setdefault("main", sys.modules[__name__])
+    import server
+    server.run()
+
+async def run_polling(concurrency: int = POLLING_CONCURRENCY) -> None:
+    """Работа в режиме long polling до SIGINT/SIGTERM"""
+    await startup_bot(webhook=False)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    try:
+        # Возвращается после остановки, дождавшись обработки полученных обновлений
+        await poll_updates(dp, bot, stop, concurrency=concurrency, drain_timeout=SHUTDOWN_TIMEOUT)
+    finally:
+        await shutdown_bot()
+
+def start_polling(concurrency: int = POLLING_CONCURRENCY):
+    """Запуск бота в режиме long polling (локально, без публичного URL)"""
     logger.info(f"Используется BOT_TOKEN (маскировано): ...{BOT_TOKEN[-5:]}")
-    logger.info(f"Webhook URL (из config): {WEBHOOK_URL}")
-    logger.info(f"Webhook PATH (из config): {WEBHOOK_PATH}")
-    # logger.info(f"Полный путь Webhook: {WEBHOOK_URL}") # Это дублирует предыдущую строку
-    logger.info(f"Веб-сервер запускается на {WEB_SERVER_HOST}:{WEB_SERVER_PORT}")
-    
-    # Настройка веб-сервера aiogram (если используется setup_application)
-    # setup_application(app, dp, bot=bot) # Закомментировано, так как используем SimpleRequestHandler.register выше
-    # logger.info("setup_application(app, dp, bot=bot) выполнен (если раскомментировано)")
-    
-    # Запуск веб-сервера без обработки сигналов, чтобы при SIGTERM не вызывались on_shutdown-хуки
-    # Это специфичная настройка, если вы уверены, что она нужна.
-    # Для более "чистого" завершения aiogram бота, обычно handle_signals=True (по умолчанию).
-    web.run_app(app, host=WEB_SERVER_HOST, port=WEB_SERVER_PORT, handle_signals=False, shutdown_timeout=0, access_log=None) 
-    # access_log=None, чтобы не дублировать логи с logging.getLogger('aiohttp.access').setLevel(logging.DEBUG)
-    # если хотите стандартный формат логов aiohttp, уберите access_log=None и .setLevel(logging.DEBUG) выше
+    asyncio.run(run_polling(concurrency))
 
 if __name__ == "__main__":
-    # Запуск бота только в режиме webhook
-    # Добавим лог перед проверкой условий
+    parser = argparse.ArgumentParser(description="Бот для игры в 21")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--webhook", action="store_true", help="режим webhook (для деплоя)")
+    mode.add_argument("--polling", action="store_true", help="режим long polling (локальный запуск)")
+    parser.add_argument("--concurrency", type=int, default=POLLING_CONCURRENCY,
+                        help="сколько обновлений обрабатывать одновременно в режиме polling")
+    args = parser.parse_args()
     logger.info(f"Запуск __main__. IS_RENDER: {os.environ.get('IS_RENDER')}, sys.argv: {sys.argv}")
-    if os.environ.get('IS_RENDER') or '--webhook' in sys.argv:
+    if args.polling:
+        logger.info("Запуск бота в режиме long polling")
+        start_polling(args.concurrency)
+    elif os.environ.get('IS_RENDER') or args.webhook:
         logger.info("Запуск бота в режиме webhook (для деплоя)")
-        # Вызов on_startup теперь происходит внутри start_webhook, если это необходимо для aiogram 3.x стиля
-        # dp.startup.register(on_startup) # Если on_startup должен вызываться при старте Dispatcher
-        # Однако, set_webhook обычно вызывается один раз при запуске приложения.
-        # В aiogram 3.x on_startup часто используется для регистрации в dp.startup.
-        # Но так как у вас start_webhook() и есть on_startup(bot), который вы могли бы вызвать перед web.run_app,
-        # давайте убедимся, что set_webhook вызывается.
-        # Мы уже вызываем on_startup внутри dp.startup.register(on_startup) или напрямую.
-        # В вашем случае on_startup() устанавливает вебхук и команды.
-        # Это должно быть сделано до того, как веб-сервер начнет принимать запросы.
-        # Самый простой способ - вызвать его перед run_app, но убедившись, что bot и dp инициализированы.
-        
-        # Переносим вызов on_startup внутрь start_webhook перед запуском app
-        # dp.startup.register(on_startup) # Если хотите, чтобы on_startup вызывался при старте диспетчера
-        
-        start_webhook() # Внутри этой функции теперь должен быть вызов on_startup
+        # Для быстрого холодного старта запускайте сразу python server.py
+        start_webhook()
     else:
-        logger.error("Локальный запуск не разрешен текущей конфигурацией. Установите IS_RENDER или используйте --webhook.")
-        sys.exit(1) 
\ No newline at end of file
+        logger.error("Укажите режим запуска: --polling (локально) или --webhook (деплой, также при IS_RENDER).")
+        sys.exit(1)
@@ -0,0 +1,89 @@
+"""Матч: серия раундов "до N побед" между одними и теми же игроками.
+
+Матч живет внутри Game (game.match): раунд - это обычная партия, после которой стол
+сбрасывается на месте (Game.reset_round), а игроки, колода и табло остаются прежними.
+Здесь хранятся только итоги: номер раунда и накопленные победы и очки игроков.
+"""
+from typing import Dict, List
+
+# Раундов в матче по умолчанию и максимум (число раундов записывается в журнал в 4 битах)
+DEFAULT_MATCH_ROUNDS = 3
+MAX_MATCH_ROUNDS = 9
+
+class Match:
+    """Итоги матча best-of-N."""
+
+    def __init__(self, rounds: int = DEFAULT_MATCH_ROUNDS):
+        self.rounds = rounds
+        self.round_number = 1
+        # Выигранные раунды и сумма очков за все раунды (user_id -> значение)
+        self.wins: Dict[int, int] = {}
+        self.score_totals: Dict[int, int] = {}
+        self.draws = 0
+        self.finished = False
+
+    @property
+    def wins_needed(self) -> int:
+        """Сколько раундов нужно выиграть для победы в матче."""
+        return self.rounds // 2 + 1
+
+    def record_round(self, game) -> None:
+        """Добавляет итоги завершенного раунда (game.finish_game уже определил победителей)."""
+        for user_id, player in game.players.items():
+            self.wins.setdefault(user_id, 0)
+            if not player.busted:
+                self.score_totals[user_id] = self.score_totals.get(user_id, 0) + player.get_score()
+        if game.is_draw or not game.winner_ids:
+            self.draws += 1
+        else:
+            for user_id in game.winner_ids:
+                self.wins[user_id] += 1
+        best = max(self.wins.values(), default=0)
+        self.finished = self.round_number >= self.rounds or best >= self.wins_needed
+
+    @property
+    def leader_ids(self) -> List[int]:
+        """Игроки с наибольшим числом выигранных раундов."""
+        best = max(self.wins.values(), default=0)
+        return [user_id for user_id, wins in self.wins.items() if wins == best]
+
+    def get_totals_text(self, players) -> str:
+        """Текущий счет матча для группового чата (players - game.players)."""
+        if self.finished:
+            result = f"🏟 *Матч окончен!* Сыграно раундов: {self.round_number}\n"
+        else:
+            result = f"🏟 *Счет матча* (раунд {self.round_number} из {self.rounds}, до {self.wins_needed} побед):\n"
+        for user_id, player in sorted(players.items(), key=lambda item: -self.wins.get(item[0], 0)):
+            result += (f"👤 `{player.username}`: 🏆 {self.wins.get(user_id, 0)}, "
+                       f"очков за матч: {self.score_totals.get(user_id, 0)}\n")
+        if self.draws:
+            result += f"🤝 Ничьих: {self.draws}\n"
+        if self.finished:
+            leaders = self.leader_ids
+            if len(leaders) == 1:
+                result += f"\n🏆 *Победитель матча: {players[leaders[0]].username}!*"
+            else:
+                names = ", ".join(players[user_id].username for user_id in leaders)
+                result += f"\n🤝 *Матч закончился вничью: {names}!*"
+        return result
+
+    def to_dict(self) -> Dict:
+        """Состояние матча для снимка (см. snapshot.py)."""
+        return {
+            "rounds": self.rounds,
+            "round_number": self.round_number,
+            "wins": list(self.wins.items()),
+            "score_totals": list(self.score_totals.items()),
+            "draws": self.draws,
+            "finished": self.finished,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Match":
+        match = cls(data["rounds"])
+        match.round_number = data["round_number"]
+        match.wins = dict(data["wins"])
+        match.score_totals = dict(data["score_totals"])
+        match.draws = data["draws"]
+        match.finished = data["finished"]
+        return match
@@ -0,0 +1,112 @@
+"""Оценка памяти, занятой состоянием игр (для /memory и бенчмарков).
+
+Размер объекта считается обходом всего, на что он ссылается: атрибутов (__dict__
+и __slots__), элементов списков, словарей и очередей. Общие для всех игр объекты
+в размер игры не входят: карты FULL_DECK (создаются один раз при импорте),
+общий генератор колоды, классы, модули и функции.
+"""
+import gc
+import os
+import sys
+from collections import deque
+from types import FunctionType, MethodType, ModuleType
+from typing import Any, Dict, Iterable, Optional, Set
+
+from game import FULL_DECK, Game
+
+# Объекты, на которые не спускаемся: они не принадлежат конкретной игре
+_SKIP_TYPES = (type, ModuleType, FunctionType, MethodType)
+# Карты FULL_DECK общие для всех колод
+_SHARED_IDS = {id(card) for card in FULL_DECK} | {id(FULL_DECK)}
+
+def _referents(obj: Any) -> Iterable[Any]:
+    """Объекты, которыми владеет obj (для подсчета размера)."""
+    if isinstance(obj, dict):
+        yield from obj.keys()
+        yield from obj.values()
+    elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+        yield from obj
+    else:
+        attrs = getattr(obj, "__dict__", None)
+        if attrs is not None:
+            yield attrs
+        for cls in type(obj).__mro__:
+            for slot in cls.__dict__.get("__slots__", ()):
+                value = getattr(obj, slot, None)
+                if value is not None:
+                    yield value
+
+def deep_sizeof(obj: Any, shared: Optional[Set[int]] = None) -> int:
+    """Размер obj в байтах вместе со всем, на что он ссылается.
+
+    shared - id объектов, которые не считаются (общие); в него же добавляются
+    посчитанные объекты, поэтому общий shared для нескольких вызовов не считает
+    один объект дважды.
+    """
+    seen = shared if shared is not None else set()
+    seen.update(_SHARED_IDS)
+    total = 0
+    stack = [obj]
+    while stack:
+        current = stack.pop()
+        if id(current) in seen or isinstance(current, _SKIP_TYPES):
+            continue
+        seen.add(id(current))
+        total += sys.getsizeof(current)
+        stack.extend(_referents(current))
+    return total
+
+def game_size(game: Game, exclude: Iterable[Any] = ()) -> int:
+    """Память одной игры: Game, колода, игроки, их карты, матч и кэш статуса.
+
+    exclude - общие объекты, на которые ссылается игра (например, общий генератор колоды).
+    """
+    return deep_sizeof(game, {id(obj) for obj in exclude})
+
+def get_rss() -> int:
+    """Текущий RSS процесса в байтах (0, если узнать не удалось)."""
+    try:
+        with open("/proc/self/statm") as statm:
+            pages = int(statm.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return 0
+    # Нет /proc (macOS): пиковый RSS, ru_maxrss там в байтах
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage if sys.platform == "darwin" else usage * 1024
+
+def gc_report() -> Dict[str, int]:
+    """Счетчики сборщика мусора: объекты в поколениях и число сборок каждого поколения."""
+    report = {}
+    for generation, (count, stats) in enumerate(zip(gc.get_count(), gc.get_stats())):
+        report[f'gc_objects{{generation="{generation}"}}'] = count
+        report[f'gc_collections{{generation="{generation}"}}'] = stats["collections"]
+        report[f'gc_collected{{generation="{generation}"}}'] = stats["collected"]
+    return report
+
+def memory_report(games: Iterable[Game], containers: Dict[str, Any],
+                  exclude: Iterable[Any] = ()) -> Dict[str, float]:
+    """Отчет о памяти: размер игр и контейнеров бота, RSS и счетчики GC.
+
+    containers - именованные словари бота (active_games, join_timers, ...). Размер
+    контейнера включает все, на что он ссылается, кроме уже посчитанных игр.
+    exclude - общие объекты бота, которые не считаются (Bot, общий генератор колоды).
+    """
+    shared: Set[int] = {id(obj) for obj in exclude}
+    sizes = [deep_sizeof(game, shared) for game in games]
+    report: Dict[str, float] = {
+        "games": len(sizes),
+        "game_bytes_total": sum(sizes),
+        "game_bytes_avg": round(sum(sizes) / len(sizes)) if sizes else 0,
+        "game_bytes_max": max(sizes, default=0),
+    }
+    for name, container in containers.items():
+        report[f'container_bytes{{name="{name}"}}'] = deep_sizeof(container, shared)
+        report[f'container_items{{name="{name}"}}'] = len(container)
+    report["rss_bytes"] = get_rss()
+    report.update(gc_report())
+    return report
@@ -0,0 +1,163 @@
+"""Режим long polling для запуска бота без публичного URL (локально или на своем сервере).
+
+Обновления запрашиваются пачками (getUpdates до POLLING_LIMIT штук) через общую сессию бота,
+соединение с Bot API переиспользуется между запросами. Каждое обновление обрабатывается
+в отдельной задаче, одновременно - не больше concurrency. Обновления одного чата
+обрабатываются строго по очереди, в порядке поступления. Принятых, но еще не обработанных
+обновлений не больше max_pending: при достижении предела новые не запрашиваются, пока
+обработка не догонит (иначе при всплеске задачи и обновления копятся в памяти без предела).
+"""
+import asyncio
+import logging
+from typing import Dict, Optional, Set
+
+from aiogram import Bot, Dispatcher, types
+from aiogram.methods import TelegramMethod
+from aiogram.exceptions import TelegramNetworkError, TelegramServerError, TelegramRetryAfter
+
+from config import POLLING_CONCURRENCY
+
+logger = logging.getLogger(__name__)
+
+# Максимум обновлений за один запрос getUpdates (ограничение Bot API - 100)
+POLLING_LIMIT = 100
+# Сколько секунд Telegram держит запрос getUpdates, если обновлений нет
+POLLING_TIMEOUT = 25
+# Пауза после ошибки запроса: удваивается до MAX_BACKOFF
+MIN_BACKOFF = 1.0
+MAX_BACKOFF = 30.0
+
+def update_chat_id(update: types.Update) -> Optional[int]:
+    """Чат, к которому относится обновление (для сохранения порядка внутри чата)."""
+    if update.message:
+        return update.message.chat.id
+    if update.callback_query:
+        callback = update.callback_query
+        return callback.message.chat.id if callback.message else callback.from_user.id
+    if update.edited_message:
+        return update.edited_message.chat.id
+    if update.my_chat_member:
+        return update.my_chat_member.chat.id
+    return None
+
+class UpdateScheduler:
+    """Параллельная обработка обновлений с ограничением и порядком внутри чата.
+
+    Задача каждого обновления сначала ждет предыдущую задачу своего чата, затем
+    место в семафоре. Разные чаты обрабатываются параллельно. submit ждет, пока
+    в обработке меньше max_pending обновлений (по умолчанию - concurrency плюс одна
+    пачка getUpdates: обработчики заняты, и следующая пачка уже получена).
+    """
+
+    def __init__(self, dp: Dispatcher, bot: Bot, concurrency: int = POLLING_CONCURRENCY,
+                 max_pending: Optional[int] = None):
+        self.dp = dp
+        self.bot = bot
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.max_pending = max_pending or concurrency + POLLING_LIMIT
+        self._capacity = asyncio.Semaphore(self.max_pending)
+        # Последняя задача каждого чата
+        self._tails: Dict[int, asyncio.Task] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self.processed = 0
+
+    async def submit(self, update: types.Update) -> None:
+        """Ставит обновление в обработку, дождавшись места, если в обработке max_pending обновлений."""
+        await self._capacity.acquire()
+        chat_id = update_chat_id(update)
+        previous = self._tails.get(chat_id) if chat_id is not None else None
+        task = asyncio.create_task(self._process(update, previous))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        task.add_done_callback(lambda _: self._capacity.release())
+        if chat_id is not None:
+            self._tails[chat_id] = task
+            task.add_done_callback(lambda t: self._tails.get(chat_id) is t and self._tails.pop(chat_id))
+
+    async def _process(self, update: types.Update, previous: Optional[asyncio.Task]) -> None:
+        if previous is not None:
+            # Ошибки предыдущего обновления уже залогированы - ждем только его завершения
+            await asyncio.wait([previous])
+        async with self._semaphore:
+            try:
+                result = await self.dp.feed_update(self.bot, update)
+                if isinstance(result, TelegramMethod):
+                    # Обработчик вернул метод вместо вызова (ответ на вебхук) - отправляем его сами
+                    await self.bot(result)
+            except Exception as e:
+                logger.exception(f"Ошибка при обработке обновления {update.update_id}: {e}")
+            finally:
+                self.processed += 1
+
+    @property
+    def pending(self) -> int:
+        return len(self._tasks)
+
+    async def drain(self, timeout: float) -> None:
+        """Ждет обработки всех принятых обновлений, но не дольше timeout секунд."""
+        if not self._tasks:
+            return
+        _, not_done = await asyncio.wait(set(self._tasks), timeout=timeout)
+        if not_done:
+            logger.warning(f"Не дождались обработки обновлений: {len(not_done)}")
+
+async def poll_updates(dp: Dispatcher, bot: Bot, stop: asyncio.Event,
+                       concurrency: int = POLLING_CONCURRENCY, drain_timeout: float = 20.0,
+                       polling_timeout: int = POLLING_TIMEOUT,
+                       max_pending: Optional[int] = None) -> UpdateScheduler:
+    """Получает обновления long polling'ом, пока не установлен stop, затем дожидается их обработки."""
+    scheduler = UpdateScheduler(dp, bot, concurrency, max_pending)
+    allowed_updates = dp.resolve_used_update_types()
+    offset: Optional[int] = None
+    webhook_deleted = False
+    backoff = MIN_BACKOFF
+    stop_waiter = asyncio.create_task(stop.wait())
+    logger.info(f"Long polling запущен (до {concurrency} обновлений одновременно, "
+                f"в обработке до {scheduler.max_pending})")
+    try:
+        while not stop.is_set():
+            if webhook_deleted:
+                request = bot.get_updates(
+                    offset=offset, limit=POLLING_LIMIT, timeout=polling_timeout,
+                    allowed_updates=allowed_updates, request_timeout=polling_timeout + 10
+                )
+            else:
+                # Пока у бота стоит вебхук, Telegram не отдает обновления через getUpdates
+                request = bot.delete_webhook()
+            request = asyncio.create_task(request)
+            # Остановка не ждет окончания текущего long poll запроса
+            await asyncio.wait([request, stop_waiter], return_when=asyncio.FIRST_COMPLETED)
+            if not request.done():
+                request.cancel()
+                break
+            try:
+                result = request.result()
+            except TelegramRetryAfter as e:
+                await asyncio.wait([stop_waiter], timeout=e.retry_after)
+                continue
+            except (TelegramNetworkError, TelegramServerError) as e:
+                logger.error(f"Ошибка запроса к Bot API, повтор через {backoff:.0f} с: {e}")
+                await asyncio.wait([stop_waiter], timeout=backoff)
+                backoff = min(backoff * 2, MAX_BACKOFF)
+                continue
+            backoff = MIN_BACKOFF
+            if not webhook_deleted:
+                webhook_deleted = True
+                continue
+            # Если обработка не успевает, submit ждет, и следующий getUpdates откладывается
+            for update in result:
+                await scheduler.submit(update)
+            if result:
+                # Подтверждаем получение: следующий запрос вернет только новые обновления
+                offset = result[-1].update_id + 1
+    finally:
+        stop_waiter.cancel()
+        await scheduler.drain(drain_timeout)
+        if offset is not None:
+            # Подтверждаем последнюю пачку, чтобы после перезапуска она не пришла снова
+            try:
+                await bot.get_updates(offset=offset, limit=1, timeout=0)
+            except Exception as e:
+                logger.error(f"Не удалось подтвердить последние обновления: {e}")
+    logger.info(f"Long polling остановлен, обработано обновлений: {scheduler.processed}")
+    return scheduler
@@ -0,0 +1,47 @@
+"""Воспроизведение игр из журнала (см. gamelog.py).
+
+Примеры:
+
+    python replay.py game_logs                  # сводка и скорость воспроизведения всех игр
+    python replay.py game_logs --game 1761234567890   # итог конкретной игры
+"""
+import argparse
+import os
+import time
+
+from gamelog import list_log_files, replay, replay_outcomes
+
+def main():
+    parser = argparse.ArgumentParser(description="Воспроизведение игр из журнала")
+    parser.add_argument("path", help="каталог журнала или отдельный файл")
+    parser.add_argument("--game", type=int, action="append", help="ID игры для вывода (можно несколько)")
+    args = parser.parse_args()
+
+    paths = list_log_files(args.path) if os.path.isdir(args.path) else [args.path]
+    game_ids = set(args.game) if args.game else None
+
+    if game_ids:
+        # Конкретные партии восстанавливаются полностью (объекты Game) для вывода итогов
+        games = replay(paths, game_ids)
+        for game_id in args.game:
+            game = games.get(game_id)
+            if game is None:
+                print(f"Игра {game_id} не найдена в журнале")
+                continue
+            print(f"Игра {game_id} (чат {game.chat_id}, seed {game.seed}):")
+            print(game.get_status_message())
+            print()
+        return
+
+    # Сводка по всему журналу - быстрым воспроизведением без объектов Game
+    started = time.perf_counter()
+    outcomes = replay_outcomes(paths)
+    elapsed = time.perf_counter() - started
+
+    finished = sum(1 for outcome in outcomes.values() if outcome[0])
+    rate = len(outcomes) / elapsed if elapsed > 0 else 0
+    print(f"Файлов: {len(paths)}, игр: {len(outcomes)} (завершено: {finished})")
+    print(f"Воспроизведение: {elapsed:.2f} с ({rate:,.0f} игр/с)")
+
+if __name__ == "__main__":
+    main()
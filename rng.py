@@ -0,0 +1,79 @@
+"""Генераторы случайных чисел для перемешивания колоды.
+
+- make_rng(seed) - детерминированный ГПСЧ (Mersenne Twister) для воспроизведения игр и симуляций;
+- BufferedSecureRandom - криптостойкий генератор на os.urandom для честной игры в продакшене.
+  Случайные байты читаются из ОС пачками, поэтому перемешивание колоды не стоит 51 системного вызова.
+"""
+import os
+import random
+from typing import Optional
+
+# Размер пачки случайных байтов, запрашиваемой у ОС за один вызов
+SECURE_BUFFER_SIZE = 4096
+
+# Режимы генератора для колоды
+RNG_SEEDED = "seeded"
+RNG_SECURE = "secure"
+
+BPF = 53  # Количество бит в мантиссе float
+RECIP_BPF = 2 ** -BPF
+
+def make_rng(seed: Optional[int] = None) -> random.Random:
+    """Создает детерминированный генератор: одинаковый seed - одинаковая последовательность."""
+    return random.Random(seed)
+
+class BufferedSecureRandom(random.Random):
+    """Криптостойкий генератор на os.urandom с буферизацией.
+
+    Совместим с random.Random (shuffle, randrange, choice и т.д.). В отличие от
+    random.SystemRandom, который делает системный вызов на каждое число, байты
+    берутся из локального буфера, пополняемого по buffer_size байт за раз.
+    Seed и сохранение состояния не поддерживаются.
+    """
+
+    def __init__(self, buffer_size: int = SECURE_BUFFER_SIZE):
+        self._buffer_size = buffer_size
+        self._buffer = b""
+        self._pos = 0
+        super().__init__()
+
+    def _take(self, n: int) -> bytes:
+        if self._pos + n > len(self._buffer):
+            self._buffer = self._buffer[self._pos:] + os.urandom(max(self._buffer_size, n))
+            self._pos = 0
+        start = self._pos
+        self._pos += n
+        return self._buffer[start:self._pos]
+
+    def getrandbits(self, k: int) -> int:
+        if 0 < k <= 8:
+            # Быстрый путь для shuffle колоды: одно число - один байт буфера
+            pos = self._pos
+            if pos >= len(self._buffer):
+                self._buffer = os.urandom(self._buffer_size)
+                pos = 0
+            self._pos = pos + 1
+            return self._buffer[pos] >> (8 - k)
+        if k < 0:
+            raise ValueError("number of bits must be non-negative")
+        if k == 0:
+            return 0
+        numbytes = (k + 7) // 8
+        x = int.from_bytes(self._take(numbytes), "big")
+        return x >> (numbytes * 8 - k)
+
+    def random(self) -> float:
+        return (int.from_bytes(self._take(7), "big") >> 3) * RECIP_BPF
+
+    def randbytes(self, n: int) -> bytes:
+        return self._take(n)
+
+    def seed(self, *args, **kwds) -> None:
+        """Не используется: криптостойкий генератор не воспроизводим."""
+        return None
+
+    def getstate(self):
+        raise NotImplementedError("BufferedSecureRandom не поддерживает сохранение состояния")
+
+    def setstate(self, state):
+        raise NotImplementedError("BufferedSecureRandom не поддерживает сохранение состояния")
@@ -0,0 +1,128 @@
+"""Веб-сервис бота с быстрым холодным стартом (для деплоя на Render).
+
+Импорт aiogram занимает секунды, поэтому сервер сначала поднимает aiohttp только
+с health check и маршрутом вебхука, а модуль бота (main) импортирует в фоновом потоке.
+Вебхуки, пришедшие до окончания загрузки, ждут ее (или получают 503, и Telegram
+доставит их повторно). Установка вебхука и команд бота тоже идет в фоне.
+
+Запуск: python server.py
+"""
+import asyncio
+import importlib
+import logging
+import time
+from typing import Set
+
+from aiohttp import web
+
+from config import BOT_TOKEN, WEBHOOK_PATH, WEBHOOK_URL, WEB_SERVER_HOST, WEB_SERVER_PORT, SHUTDOWN_TIMEOUT
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Сколько секунд вебхук ждет загрузки бота, прежде чем ответить 503
+BOT_LOAD_TIMEOUT = 30.0
+
+BOT_LOADING_KEY = web.AppKey("bot_loading", asyncio.Task)
+
+# Сервис останавливается: новые обновления не принимаются
+stopping = False
+
+# Принятые запросы вебхука (в том числе ждущие загрузки бота): при остановке
+# их обновления обрабатываются до записи снимка игр
+webhook_requests: Set[asyncio.Task] = set()
+
+async def load_bot():
+    """Импортирует модуль бота в отдельном потоке и запускает его фоновые службы"""
+    started = time.perf_counter()
+    try:
+        bot_main = await asyncio.get_running_loop().run_in_executor(None, importlib.import_module, "main")
+        await bot_main.startup_bot()
+    except Exception:
+        logger.exception("Не удалось загрузить бота")
+        raise
+    logger.info(f"Бот загружен за {time.perf_counter() - started:.2f} с")
+    return bot_main
+
+async def health_check(request: web.Request) -> web.Response:
+    """Health check: отвечает сразу, даже пока бот загружается"""
+    # Логируем health check запросы, чтобы видеть, что Render их делает
+    logger.debug(f"Health check запрос от {request.remote} к {request.path}")
+    loading = request.app[BOT_LOADING_KEY]
+    state = "активен" if loading.done() and not loading.cancelled() and not loading.exception() else "загружается"
+    return web.Response(text=f"Бот работает. Webhook {state}. Путь: {WEBHOOK_URL}")
+
+async def metrics(request: web.Request) -> web.Response:
+    """Метрики в текстовом формате Prometheus: одна строка "имя значение" на метрику"""
+    loading = request.app[BOT_LOADING_KEY]
+    values = {"bot_loaded": int(loading.done() and not loading.cancelled() and not loading.exception())}
+    if values["bot_loaded"]:
+        values.update(loading.result().get_metrics())
+    return web.Response(text="".join(f"{name} {value}\n" for name, value in values.items()))
+
+async def memory(request: web.Request) -> web.Response:
+    """Память состояния игр (см. memstats.py) в том же формате, что и /metrics"""
+    loading = request.app[BOT_LOADING_KEY]
+    values = {"bot_loaded": int(loading.done() and not loading.cancelled() and not loading.exception())}
+    if values["bot_loaded"]:
+        values.update(loading.result().get_memory_report())
+    return web.Response(text="".join(f"{name} {value}\n" for name, value in values.items()))
+
+async def handle_webhook(request: web.Request) -> web.Response:
+    """Передает обновление в aiogram, дождавшись загрузки бота"""
+    if stopping:
+        # Telegram повторит обновление, и его обработает новый экземпляр бота
+        return web.Response(status=503, text="Бот перезапускается")
+    task = asyncio.current_task()
+    webhook_requests.add(task)
+    try:
+        try:
+            bot_main = await asyncio.wait_for(asyncio.shield(request.app[BOT_LOADING_KEY]), BOT_LOAD_TIMEOUT)
+        except Exception as e:
+            logger.error(f"Бот не загружен, обновление отклонено: {e}")
+            return web.Response(status=503, text="Бот загружается")
+        return await bot_main.webhook_handler.handle(request)
+    finally:
+        webhook_requests.discard(task)
+
+async def on_app_startup(app: web.Application):
+    # Не ждем загрузки: сервер должен начать отвечать на health check сразу
+    app[BOT_LOADING_KEY] = asyncio.create_task(load_bot())
+
+async def on_app_shutdown(app: web.Application):
+    """Корректная остановка по SIGTERM: дожидаемся загрузки бота и останавливаем его.
+
+    Запросы вебхука, принятые до остановки, бот дообрабатывает перед записью снимка игр.
+    """
+    global stopping
+    stopping = True
+    try:
+        bot_main = await app[BOT_LOADING_KEY]
+    except Exception as e:
+        logger.error(f"Бот не был загружен: {e}")
+        return
+    await bot_main.shutdown_bot(pending_requests=set(webhook_requests))
+
+def create_app() -> web.Application:
+    app = web.Application()
+    app.on_startup.append(on_app_startup)
+    app.on_shutdown.append(on_app_shutdown)
+    app.router.add_post(WEBHOOK_PATH, handle_webhook)
+    app.router.add_get("/", health_check)
+    app.router.add_get("/metrics", metrics)
+    app.router.add_get("/memory", memory)
+    return app
+
+def run():
+    """Запускает веб-сервис"""
+    # Диагностическая информация
+    logger.info(f"Используется BOT_TOKEN (маскировано): ...{BOT_TOKEN[-5:]}")
+    logger.info(f"Webhook URL (из config): {WEBHOOK_URL}")
+    logger.info(f"Веб-сервер запускается на {WEB_SERVER_HOST}:{WEB_SERVER_PORT}")
+    # SIGINT/SIGTERM обрабатываются aiohttp: сервер перестает принимать соединения
+    # и вызывает on_shutdown-хуки
+    web.run_app(create_app(), host=WEB_SERVER_HOST, port=WEB_SERVER_PORT, handle_signals=True,
+                shutdown_timeout=SHUTDOWN_TIMEOUT, access_log=None)
+
+if __name__ == "__main__":
+    run()
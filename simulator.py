@@ -0,0 +1,100 @@
+"""Безголовый симулятор игры в 21 против дилера.
+
+Запускает партии целиком в памяти, без Telegram, и выводит статистику исходов
+и скорость симуляции. Пример:
+
+    python simulator.py --games 100000 --players 3 --player-stand-on 17 --hit-soft-17
+
+С --duel играются партии вдвоем без дилера: игрок по таблице стратегии (strategy.py)
+против игрока, который останавливается на --player-stand-on; места чередуются.
+"""
+import argparse
+import time
+from typing import Dict, Optional
+
+from dealer import Dealer, DealerRules, RESULT_WIN, RESULT_PUSH, RESULT_LOSE
+from events import Join, Start, Hit, Stand
+from game import Game
+from strategy import should_hit
+
+def simulate(games: int, players: int, player_stand_on: int, dealer: Dealer,
+             seed: Optional[int] = None) -> Dict[str, int]:
+    """Играет games партий; игроки добирают карты, пока не наберут player_stand_on.
+    
+    С заданным seed партия i использует seed + i, и результаты воспроизводимы.
+    """
+    totals = {RESULT_WIN: 0, RESULT_PUSH: 0, RESULT_LOSE: 0}
+    # Один объект на все партии: колода, игроки и контейнеры сбрасываются на месте
+    game = Game(0, dealer=dealer, seed=seed)
+    for index in range(games):
+        if index:
+            game.reset(0, dealer=dealer, seed=None if seed is None else seed + index)
+        for user_id in range(1, players + 1):
+            game.apply(Join(user_id, str(user_id)))
+        game.apply(Start())
+        while not game.finished:
+            user_id = game.current_player_id
+            if game.players[user_id].get_score() < player_stand_on:
+                game.apply(Hit(user_id))
+            else:
+                game.apply(Stand(user_id))
+        for result in game.results.values():
+            totals[result] += 1
+    return totals
+
+def simulate_duel(games: int, player_stand_on: int, seed: Optional[int] = None) -> Dict[str, int]:
+    """Партии вдвоем: итоги игрока по таблице стратегии против игрока с порогом player_stand_on.
+    
+    В четных партиях игрок по таблице ходит первым, в нечетных - вторым.
+    """
+    totals = {RESULT_WIN: 0, RESULT_PUSH: 0, RESULT_LOSE: 0}
+    game = Game(0, seed=seed)
+    for index in range(games):
+        if index:
+            game.reset(0, seed=None if seed is None else seed + index)
+        strategy_id = 1 + index % 2
+        for user_id in (1, 2):
+            game.apply(Join(user_id, str(user_id)))
+        game.apply(Start())
+        while not game.finished:
+            user_id = game.current_player_id
+            player = game.players[user_id]
+            if user_id == strategy_id:
+                hit = should_hit(game, player)
+            else:
+                hit = player.get_score() < player_stand_on
+            game.apply(Hit(user_id) if hit else Stand(user_id))
+        if game.is_draw:
+            totals[RESULT_PUSH] += 1
+        elif game.winner_id == strategy_id:
+            totals[RESULT_WIN] += 1
+        else:
+            totals[RESULT_LOSE] += 1
+    return totals
+
+def main():
+    parser = argparse.ArgumentParser(description="Симулятор игры в 21 против дилера")
+    parser.add_argument("--games", type=int, default=100000, help="количество партий")
+    parser.add_argument("--players", type=int, default=1, help="игроков за столом")
+    parser.add_argument("--player-stand-on", type=int, default=17, help="игрок останавливается с этой суммой")
+    parser.add_argument("--dealer-stand-on", type=int, default=17, help="дилер останавливается с этой суммой")
+    parser.add_argument("--hit-soft-17", action="store_true", help="дилер добирает на мягких 17")
+    parser.add_argument("--seed", type=int, help="seed для воспроизводимой симуляции")
+    parser.add_argument("--duel", action="store_true", help="вдвоем без дилера: таблица стратегии против порога")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    if args.duel:
+        totals = simulate_duel(args.games, args.player_stand_on, args.seed)
+    else:
+        dealer = Dealer(DealerRules(stand_on=args.dealer_stand_on, hit_soft_17=args.hit_soft_17))
+        totals = simulate(args.games, args.players, args.player_stand_on, dealer, args.seed)
+    elapsed = time.perf_counter() - started
+
+    hands = sum(totals.values())
+    print(f"Партий: {args.games}, рук: {hands}, время: {elapsed:.2f} с ({args.games / elapsed:,.0f} партий/с)")
+    for result, count in totals.items():
+        print(f"  {result}: {count} ({count / hands:.2%})")
+
+if __name__ == "__main__":
+    main()
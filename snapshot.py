@@ -0,0 +1,171 @@
+"""Снимок незавершенных игр для перезапуска бота без потери партий.
+
+При остановке (SIGTERM на деплое) состояние активных игр вместе с таймерами ожидания
+и ID сообщений-табло сохраняется в базу, а при следующем запуске восстанавливается.
+Номер хода игры тоже сохраняется, поэтому кнопки в уже отправленных сообщениях
+продолжают работать после перезапуска.
+
+Снимок хранится в JSON: колода и карты записываются индексами в FULL_DECK,
+производные поля (сумма очков, перебор) пересчитываются при восстановлении.
+"""
+import json
+import logging
+import random
+import time
+from typing import Any, Dict, List, Optional
+
+from dealer import Dealer, DealerRules
+from game import Deck, Game, Player, FULL_DECK, CARD_INDEX
+from match import Match
+from rng import BufferedSecureRandom, RNG_SECURE, RNG_SEEDED
+from storage import Storage
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS game_snapshots (
+    game_id INTEGER PRIMARY KEY,
+    data TEXT NOT NULL
+);
+"""
+
+class GameSnapshot:
+    """Восстановленная игра вместе с состоянием бота вокруг нее."""
+
+    def __init__(self, game: Game, join_started_at: Optional[float] = None,
+                 board_message_id: Optional[int] = None, saved_at: Optional[float] = None):
+        self.game = game
+        # Время открытия стола (time.time()), если игра еще ждет игроков
+        self.join_started_at = join_started_at
+        # ID сообщения с табло игры в групповом чате
+        self.board_message_id = board_message_id
+        # Когда снимок записан (time.time()); None - у снимков старых версий
+        self.saved_at = saved_at
+
+    def age(self) -> float:
+        """Сколько секунд прошло с записи снимка (0, если время записи неизвестно)."""
+        if self.saved_at is None:
+            return 0.0
+        return max(0.0, time.time() - self.saved_at)
+
+def _cards_to_list(cards) -> List[int]:
+    return [CARD_INDEX[card] for card in cards]
+
+def _player_to_dict(player: Player) -> Dict[str, Any]:
+    return {
+        "user_id": player.user_id,
+        "username": player.username,
+        "cards": _cards_to_list(player.cards),
+        "stopped": player.stopped,
+        "keyboard_message_id": player.keyboard_message_id,
+    }
+
+def _player_from_dict(data: Dict[str, Any]) -> Player:
+    player = Player(data["user_id"], data["username"])
+    for index in data["cards"]:
+        player.add_card(FULL_DECK[index])
+    player.stopped = data["stopped"]
+    player.keyboard_message_id = data["keyboard_message_id"]
+    return player
+
+def game_to_dict(snapshot: GameSnapshot) -> Dict[str, Any]:
+    """Сериализует незавершенную игру в словарь для JSON."""
+    game = snapshot.game
+    dealer = None
+    if game.dealer:
+        dealer = [game.dealer.rules.stand_on, game.dealer.rules.hit_soft_17]
+    return {
+        "game_id": game.game_id,
+        "chat_id": game.chat_id,
+        "seed": game.seed,
+        # Генератор колоды: seed есть только у детерминированного
+        "rng": RNG_SEEDED if game.seed is not None else RNG_SECURE,
+        "dealer": dealer,
+        "dealer_hand": _cards_to_list(game.dealer_hand.cards) if game.dealer_hand else None,
+        "deck": list(game.deck.get_order()),
+        "players": [_player_to_dict(player) for player in game.players.values()],
+        "started": game.started,
+        "finished": game.finished,
+        "current_player_id": game.current_player_id,
+        "turn_order": list(game.turn_order),
+        "active_count": game.active_count,
+        "turn_seq": game.turn_seq,
+        "match": game.match.to_dict() if game.match else None,
+        "join_started_at": snapshot.join_started_at,
+        "board_message_id": snapshot.board_message_id,
+        "saved_at": snapshot.saved_at,
+    }
+
+def game_from_dict(data: Dict[str, Any], secure_rng: Optional[random.Random] = None) -> GameSnapshot:
+    """Восстанавливает игру из словаря game_to_dict().
+    
+    Генератор колоды (для перемешивания между раундами матча) того же вида, что был
+    у игры: детерминированный по ее seed или криптостойкий secure_rng.
+    """
+    dealer = Dealer(DealerRules(*data["dealer"])) if data["dealer"] else None
+    # В снимках старых версий вида генератора нет: seed был только у детерминированного
+    rng_kind = data.get("rng", RNG_SEEDED if data["seed"] is not None else RNG_SECURE)
+    if rng_kind == RNG_SEEDED:
+        game = Game(data["chat_id"], dealer=dealer, game_id=data["game_id"], seed=data["seed"])
+    else:
+        game = Game(data["chat_id"], dealer=dealer, game_id=data["game_id"],
+                    rng=secure_rng or BufferedSecureRandom())
+    game.deck = Deck.from_order(bytes(data["deck"]))
+    if game.dealer_hand is not None:
+        for index in data["dealer_hand"]:
+            game.dealer_hand.add_card(FULL_DECK[index])
+    for player_data in data["players"]:
+        player = _player_from_dict(player_data)
+        game.players[player.user_id] = player
+    game.started = data["started"]
+    # Завершенной сохраняется только игра матча в паузе между раундами
+    game.finished = data.get("finished", False)
+    game.current_player_id = data["current_player_id"]
+    game.turn_order.extend(data["turn_order"])
+    game.active_count = data["active_count"]
+    game.turn_seq = data["turn_seq"]
+    if data.get("match"):
+        game.match = Match.from_dict(data["match"])
+    return GameSnapshot(game, data["join_started_at"], data["board_message_id"], data.get("saved_at"))
+
+class SnapshotStore:
+    """Снимки игр в базе поверх Storage."""
+
+    def __init__(self, storage: Storage):
+        self.storage = storage
+        storage.executescript(SCHEMA)
+
+    async def save(self, snapshots: List[GameSnapshot]) -> None:
+        """Заменяет сохраненный снимок новым и ждет записи на диск."""
+        saved_at = time.time()
+        for snapshot in snapshots:
+            snapshot.saved_at = saved_at
+        self.storage.execute("DELETE FROM game_snapshots")
+        self.storage.executemany(
+            "INSERT INTO game_snapshots (game_id, data) VALUES (?, ?)",
+            [(s.game.game_id, json.dumps(game_to_dict(s), separators=(",", ":"))) for s in snapshots
+             if not s.game.finished or (s.game.match and not s.game.match.finished)]
+        )
+        await self.storage.flush()
+
+    async def load(self, secure_rng: Optional[random.Random] = None) -> List[GameSnapshot]:
+        """Загружает сохраненные игры и удаляет снимок, чтобы не восстановить его повторно.
+        
+        secure_rng - криптостойкий генератор бота для игр, колода которых перемешана им.
+        """
+        await self.storage.flush()
+        rows = await self.storage.fetchall("SELECT data FROM game_snapshots ORDER BY game_id")
+        await self.storage.write("DELETE FROM game_snapshots")
+        snapshots = []
+        for (data,) in rows:
+            try:
+                snapshots.append(game_from_dict(json.loads(data), secure_rng))
+            except Exception as e:
+                logger.error(f"Не удалось восстановить игру из снимка: {e}")
+        return snapshots
+
+def join_time_left(snapshot: GameSnapshot, join_timeout: float) -> float:
+    """Сколько секунд осталось ждать игроков для восстановленной игры."""
+    if snapshot.join_started_at is None:
+        return join_timeout
+    return max(0.0, join_timeout - (time.time() - snapshot.join_started_at))
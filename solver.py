@@ -0,0 +1,266 @@
+"""Офлайн-решатель стратегии для игры в 21 вдвоем (без дилера).
+
+Правила как в Game.finish_game: игроки ходят по очереди, каждый добирает карты, пока
+не остановится или не переберет. Побеждает не перебравший игрок с большей суммой,
+равные суммы и перебор обоих - ничья. Суммы всех игроков видны на табло.
+
+Решение - точное динамическое программирование по составу оставшейся колоды
+(счетчики карт каждого достоинства) с мемоизацией. Ценность исхода для игрока:
+победа +1, ничья 0, поражение -1. Для каждой позиции считаются ожидания "взять"
+и "остановиться" при оптимальной игре обоих дальше, с учетом всех вышедших карт.
+
+Таблица стратегии не зависит от состава колоды: решение в клетке (своя сумма,
+мягкая ли она, видимое состояние соперника) выбирается по знаку разности ожиданий,
+усредненной по всем раздачам с вероятностью попасть в эту клетку. Раздачи делятся
+между процессами по первой руке.
+
+Запуск (пересчет strategy_table.py):
+
+    python solver.py --workers 4
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+
+# Достоинства карт: 2-9, 10 (10, J, Q, K) и туз; в колоде по 4 карты, десяток - 16
+VALUES = (2, 3, 4, 5, 6, 7, 8, 9, 10, 1)
+FULL_COUNTS = (4, 4, 4, 4, 4, 4, 4, 4, 16, 4)
+ACE = len(VALUES) - 1
+
+# Диапазон сумм в таблице: от 2+2 до 21
+MIN_SCORE = 4
+MAX_SCORE = 21
+# Видимое состояние соперника, который уже доиграл: перебор или его сумма
+BUST = 0
+
+# Файл таблицы рядом с модулем
+TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "strategy_table.py")
+
+Counts = Tuple[int, ...]
+
+def score(hard: int, ace: bool) -> Tuple[int, bool]:
+    """Сумма руки и мягкая ли она. hard - сумма с тузами по 1, ace - есть ли туз."""
+    if ace and hard + 10 <= 21:
+        return hard + 10, True
+    return hard, False
+
+def _draw(counts: Counts, index: int) -> Counts:
+    return counts[:index] + (counts[index] - 1,) + counts[index + 1:]
+
+# Кэши ожиданий (у каждого процесса свои)
+_second_cache: Dict[tuple, Tuple[float, float]] = {}
+_first_cache: Dict[tuple, Tuple[float, float]] = {}
+
+def second_choice(counts: Counts, cards: int, hard: int, ace: bool, target: int) -> Tuple[float, float]:
+    """Ожидания второго игрока (остановиться, взять) против итога первого target (BUST - перебор)."""
+    key = (counts, hard, ace, target)
+    cached = _second_cache.get(key)
+    if cached is not None:
+        return cached
+    own, _ = score(hard, ace)
+    stand = 1.0 if own > target else 0.0 if own == target else -1.0
+    hit = 0.0
+    if own < 21:
+        # Перебор второго: ничья, если первый тоже перебрал, иначе поражение
+        bust = 0.0 if target == BUST else -1.0
+        for index, count in enumerate(counts):
+            if not count:
+                continue
+            new_hard = hard + VALUES[index]
+            if new_hard > 21:
+                value = bust
+            else:
+                value = max(second_choice(_draw(counts, index), cards - 1, new_hard, ace or index == ACE, target))
+            hit += count * value
+        hit /= cards
+    else:
+        hit = -2.0  # С 21 брать карту бессмысленно
+    _second_cache[key] = (stand, hit)
+    return stand, hit
+
+def first_choice(counts: Counts, cards: int, hard: int, ace: bool,
+                 other_hard: int, other_ace: bool) -> Tuple[float, float]:
+    """Ожидания первого игрока (остановиться, взять); рука второго - other_hard, other_ace."""
+    key = (counts, hard, ace, other_hard, other_ace)
+    cached = _first_cache.get(key)
+    if cached is not None:
+        return cached
+    own, _ = score(hard, ace)
+    stand = -max(second_choice(counts, cards, other_hard, other_ace, own))
+    hit = 0.0
+    if own < 21:
+        for index, count in enumerate(counts):
+            if not count:
+                continue
+            new_hard = hard + VALUES[index]
+            if new_hard > 21:
+                # Первый перебрал: второму достаточно остановиться
+                value = -1.0
+            else:
+                value = max(first_choice(_draw(counts, index), cards - 1, new_hard, ace or index == ACE,
+                                         other_hard, other_ace))
+            hit += count * value
+        hit /= cards
+    else:
+        hit = -2.0
+    _first_cache[key] = (stand, hit)
+    return stand, hit
+
+# Накопители таблицы: клетка -> сумма вероятность * (взять - остановиться)
+Accumulator = Dict[Tuple[int, bool, int], float]
+
+def _add(accumulator: Accumulator, key: Tuple[int, bool, int], weight: float) -> None:
+    accumulator[key] = accumulator.get(key, 0.0) + weight
+
+def solve_hand(first: Tuple[int, int]) -> Tuple[Accumulator, Accumulator, float]:
+    """Все раздачи с первой рукой first (индексы достоинств): накопители таблиц и вклад в ожидание.
+
+    Вероятность позиций распространяется вперед по оптимальным решениям: сначала ходы
+    первого игрока, затем второго.
+    """
+    first_table: Accumulator = {}
+    second_table: Accumulator = {}
+    counts = FULL_COUNTS
+    cards = sum(counts)
+    # Вероятность первой руки (неупорядоченной)
+    a, b = first
+    probability = counts[a] / cards
+    counts, cards = _draw(counts, a), cards - 1
+    probability *= counts[b] / cards
+    counts, cards = _draw(counts, b), cards - 1
+    if a != b:
+        probability *= 2
+    hard = VALUES[a] + VALUES[b]
+    ace = ACE in (a, b)
+
+    # Позиции первого игрока: (колода, его рука, рука второго) -> вероятность
+    level: Dict[tuple, float] = {}
+    for c in range(len(VALUES)):
+        for d in range(len(VALUES)):
+            if not counts[c] or not counts[d] - (c == d):
+                continue
+            weight = probability * counts[c] / cards * (counts[d] - (c == d)) / (cards - 1)
+            rest = _draw(_draw(counts, c), d)
+            key = (rest, hard, ace, VALUES[c] + VALUES[d], ACE in (c, d))
+            level[key] = level.get(key, 0.0) + weight
+    expected = sum(weight * max(first_choice(key[0], cards - 2, *key[1:])) for key, weight in level.items())
+
+    # Позиции второго игрока: (колода, его рука, итог первого) -> вероятность
+    second_level: Dict[tuple, float] = {}
+    while level:
+        next_level: Dict[tuple, float] = {}
+        for (rest, hard, ace, other_hard, other_ace), weight in level.items():
+            left = sum(rest)
+            stand, hit = first_choice(rest, left, hard, ace, other_hard, other_ace)
+            own, soft = score(hard, ace)
+            _add(first_table, (own, soft, score(other_hard, other_ace)[0]), weight * (hit - stand))
+            if stand >= hit:
+                key = (rest, other_hard, other_ace, own)
+                second_level[key] = second_level.get(key, 0.0) + weight
+                continue
+            for index, count in enumerate(rest):
+                if not count:
+                    continue
+                new_hard = hard + VALUES[index]
+                child_weight = weight * count / left
+                if new_hard > 21:
+                    key = (_draw(rest, index), other_hard, other_ace, BUST)
+                    second_level[key] = second_level.get(key, 0.0) + child_weight
+                else:
+                    key = (_draw(rest, index), new_hard, ace or index == ACE, other_hard, other_ace)
+                    next_level[key] = next_level.get(key, 0.0) + child_weight
+        level = next_level
+
+    while second_level:
+        next_level = {}
+        for (rest, hard, ace, target), weight in second_level.items():
+            left = sum(rest)
+            stand, hit = second_choice(rest, left, hard, ace, target)
+            own, soft = score(hard, ace)
+            _add(second_table, (own, soft, target), weight * (hit - stand))
+            if stand >= hit:
+                continue
+            for index, count in enumerate(rest):
+                new_hard = hard + VALUES[index]
+                if count and new_hard <= 21:
+                    key = (_draw(rest, index), new_hard, ace or index == ACE, target)
+                    next_level[key] = next_level.get(key, 0.0) + weight * count / left
+        second_level = next_level
+    return first_table, second_table, expected
+
+def _rows(accumulator: Accumulator, soft: bool, opponents: List[int]) -> List[str]:
+    """Строки таблицы: для каждой своей суммы - решения против каждого состояния соперника.
+
+    H - взять, S - остановиться, "-" - позиция не встречается.
+    """
+    rows = []
+    for own in range(MIN_SCORE, MAX_SCORE + 1):
+        row = ""
+        for opponent in opponents:
+            weight = accumulator.get((own, soft, opponent))
+            row += "-" if weight is None else "H" if weight > 0 else "S"
+        rows.append(row)
+    return rows
+
+def solve(workers: int) -> Tuple[Dict[str, List[str]], float]:
+    """Решает игру в workers процессах. Возвращает строки таблиц и ожидание первого игрока."""
+    hands = [(a, b) for a in range(len(VALUES)) for b in range(a, len(VALUES))]
+    first_table: Accumulator = {}
+    second_table: Accumulator = {}
+    expected = 0.0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for first, second, value in executor.map(solve_hand, hands):
+            for key, weight in first.items():
+                _add(first_table, key, weight)
+            for key, weight in second.items():
+                _add(second_table, key, weight)
+            expected += value
+    first_opponents = list(range(MIN_SCORE, MAX_SCORE + 1))
+    second_opponents = [BUST] + first_opponents
+    tables = {
+        "FIRST_HARD": _rows(first_table, False, first_opponents),
+        "FIRST_SOFT": _rows(first_table, True, first_opponents),
+        "LAST_HARD": _rows(second_table, False, second_opponents),
+        "LAST_SOFT": _rows(second_table, True, second_opponents),
+    }
+    return tables, expected
+
+def write_table(tables: Dict[str, List[str]], expected: float, path: str = TABLE_PATH) -> None:
+    """Записывает таблицы модулем Python (см. strategy.py)."""
+    lines = [
+        '"""Таблица стратегии для игры вдвоем. Сгенерировано solver.py - не редактировать вручную.',
+        "",
+        "Строка - своя сумма от MIN_SCORE до MAX_SCORE, символ - состояние соперника:",
+        "FIRST_* - соперник еще не ходил (его сумма двух карт от MIN_SCORE),",
+        "LAST_* - соперник доиграл (перебор, затем его сумма от MIN_SCORE).",
+        "H - взять карту, S - остановиться, \"-\" - позиция не встречается.",
+        f"Ожидание первого игрока при оптимальной игре обоих: {expected:+.5f}",
+        '"""',
+        f"MIN_SCORE = {MIN_SCORE}",
+        f"MAX_SCORE = {MAX_SCORE}",
+    ]
+    for name, rows in tables.items():
+        lines.append("")
+        lines.append(f"{name} = (")
+        for own, row in zip(range(MIN_SCORE, MAX_SCORE + 1), rows):
+            lines.append(f'    "{row}",  # {own}')
+        lines.append(")")
+    with open(path, "w", encoding="utf-8") as file:
+        file.write("\n".join(lines) + "\n")
+
+def main():
+    parser = argparse.ArgumentParser(description="Расчет таблицы стратегии для игры вдвоем")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="число процессов")
+    parser.add_argument("--output", default=TABLE_PATH, help="файл таблицы")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    tables, expected = solve(args.workers)
+    write_table(tables, expected, args.output)
+    print(f"Таблица записана в {args.output} за {time.perf_counter() - started:.1f} с")
+    print(f"Ожидание первого игрока: {expected:+.5f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Статистика игроков и таблица лидеров.
+
+Хранилище - SQLite в режиме WAL. Для каждой пары (чат, игрок) хранятся готовые
+агрегаты (игры, победы, ничьи, переборы, сумма очков без переборов), которые увеличиваются при
+каждой завершенной игре, поэтому /stats читает одну строку по первичному ключу,
+а /top - первые строки индекса, без просмотра истории игр. Строки с chat_id = 0
+содержат общую статистику игрока по всем чатам.
+
+Запись и чтение идут через Storage (storage.py), поэтому SQLite не блокирует цикл событий.
+"""
+from dataclasses import dataclass
+from typing import List, Optional
+
+from dealer import RESULT_WIN, RESULT_PUSH
+from storage import Storage
+
+# chat_id для общей статистики по всем чатам
+GLOBAL_CHAT_ID = 0
+
+DEFAULT_TOP_LIMIT = 10
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS player_stats (
+    chat_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    username TEXT NOT NULL,
+    games INTEGER NOT NULL DEFAULT 0,
+    wins INTEGER NOT NULL DEFAULT 0,
+    draws INTEGER NOT NULL DEFAULT 0,
+    busts INTEGER NOT NULL DEFAULT 0,
+    score_sum INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (chat_id, user_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS player_stats_top ON player_stats (chat_id, wins DESC, games);
+"""
+
+UPSERT_SQL = """
+INSERT INTO player_stats (chat_id, user_id, username, games, wins, draws, busts, score_sum)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (chat_id, user_id) DO UPDATE SET
+    username = excluded.username,
+    games = games + excluded.games,
+    wins = wins + excluded.wins,
+    draws = draws + excluded.draws,
+    busts = busts + excluded.busts,
+    score_sum = score_sum + excluded.score_sum
+"""
+
+SELECT_PLAYER_SQL = """
+SELECT user_id, username, games, wins, draws, busts, score_sum
+FROM player_stats WHERE chat_id = ? AND user_id = ?
+"""
+
+SELECT_TOP_SQL = """
+SELECT user_id, username, games, wins, draws, busts, score_sum
+FROM player_stats WHERE chat_id = ? ORDER BY wins DESC, games LIMIT ?
+"""
+
+@dataclass
+class PlayerStats:
+    """Агрегированная статистика игрока."""
+    user_id: int
+    username: str
+    games: int = 0
+    wins: int = 0
+    draws: int = 0
+    busts: int = 0
+    # Сумма итоговых очков в играх без перебора: перебор (больше 21) не завышает средний счет
+    score_sum: int = 0
+
+    @property
+    def average_score(self) -> float:
+        """Средний итог в играх без перебора."""
+        finished = self.games - self.busts
+        return self.score_sum / finished if finished > 0 else 0.0
+
+def game_results(game) -> List[PlayerStats]:
+    """Итоги завершенной игры для каждого игрока (по одной игре на строку)."""
+    results = []
+    for player in game.players.values():
+        if game.dealer:
+            outcome = game.results.get(player.user_id)
+            won, draw = outcome == RESULT_WIN, outcome == RESULT_PUSH
+        else:
+            won = game.winner_id == player.user_id
+            # Ничья засчитывается разделившим первое место или всем, если перебрали все
+            draw = game.is_draw and (player.user_id in game.winner_ids or not game.winner_ids)
+        results.append(PlayerStats(
+            player.user_id, player.username, games=1, wins=int(won), draws=int(draw),
+            busts=int(player.busted), score_sum=0 if player.busted else player.get_score()
+        ))
+    return results
+
+class StatsStore:
+    """Статистика игроков поверх Storage.
+
+    record_game() ставит приращения агрегатов в очередь записи и сразу возвращается;
+    поток-писатель Storage объединяет их с другими записями в одну транзакцию.
+    """
+
+    def __init__(self, storage: Storage):
+        self.storage = storage
+        storage.executescript(SCHEMA)
+
+    def record_game(self, game) -> None:
+        """Записывает итоги завершенной игры (без ожидания записи)."""
+        rows = []
+        for s in game_results(game):
+            for chat_id in (game.chat_id, GLOBAL_CHAT_ID):
+                rows.append((chat_id, s.user_id, s.username, s.games, s.wins, s.draws, s.busts, s.score_sum))
+        self.storage.executemany(UPSERT_SQL, rows)
+
+    async def get_player(self, chat_id: int, user_id: int) -> Optional[PlayerStats]:
+        """Статистика игрока в чате (GLOBAL_CHAT_ID - по всем чатам)."""
+        # Дожидаемся записи итогов, поставленных в очередь ранее (не дольше batch_interval)
+        await self.storage.flush()
+        row = await self.storage.fetchone(SELECT_PLAYER_SQL, (chat_id, user_id))
+        return PlayerStats(*row) if row else None
+
+    async def get_top(self, chat_id: int, limit: int = DEFAULT_TOP_LIMIT) -> List[PlayerStats]:
+        """Лучшие игроки чата по числу побед."""
+        await self.storage.flush()
+        rows = await self.storage.fetchall(SELECT_TOP_SQL, (chat_id, limit))
+        return [PlayerStats(*row) for row in rows]
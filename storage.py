@@ -0,0 +1,218 @@
+"""Асинхронный доступ к SQLite для бота.
+
+sqlite3 блокирует поток, поэтому напрямую из обработчиков aiogram его вызывать нельзя.
+Storage разделяет запись и чтение:
+
+- запись идет через очередь в единственный поток-писатель, который собирает все
+  поступившие за batch_interval секунд операции в одну транзакцию. execute() не ждет
+  записи (fire-and-forget): операция окажется в базе не позже чем через batch_interval
+  плюс время самой транзакции; write() дожидается фиксации;
+- чтение выполняется в небольшом пуле потоков через run_in_executor, у каждого потока
+  свое соединение. База работает в режиме WAL, так что чтение не ждет записи.
+"""
+import asyncio
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_INTERVAL = 0.005
+DEFAULT_MAX_BATCH = 1000
+DEFAULT_READ_POOL_SIZE = 4
+
+# Виды операций записи
+OP_EXECUTE = "execute"
+OP_EXECUTEMANY = "executemany"
+OP_SCRIPT = "script"
+OP_SYNC = "sync"  # пустая операция: ее future выполняется, когда записано все, что было до нее
+
+_STOP = object()
+
+def _resolve(future: Optional[asyncio.Future], error: Optional[BaseException] = None) -> None:
+    """Завершает future операции из потока-писателя."""
+    if future is None:
+        return
+    def set_result():
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(None)
+    future.get_loop().call_soon_threadsafe(set_result)
+
+class Storage:
+    """База SQLite с одним потоком-писателем и пулом читателей."""
+
+    def __init__(self, path: str, batch_interval: float = DEFAULT_BATCH_INTERVAL,
+                 max_batch: int = DEFAULT_MAX_BATCH, read_pool_size: int = DEFAULT_READ_POOL_SIZE):
+        self.path = path
+        self.batch_interval = batch_interval
+        self.max_batch = max_batch
+        self._queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._writer: Optional[threading.Thread] = None
+        self._readers = ThreadPoolExecutor(max_workers=read_pool_size, thread_name_prefix="storage-read")
+        self._local = threading.local()
+        self._read_conns: List[sqlite3.Connection] = []
+        self._read_conns_lock = threading.Lock()
+        self.batches = 0
+        self.writes = 0
+
+    def open(self) -> None:
+        """Запускает поток-писатель. Операции, поставленные раньше, тоже будут выполнены."""
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write_loop, name="storage-writer", daemon=True)
+            self._writer.start()
+
+    # Запись
+
+    def execute(self, sql: str, params: Iterable = ()) -> None:
+        """Ставит запрос в очередь на запись, не дожидаясь его выполнения."""
+        self._queue.put((OP_EXECUTE, sql, params, None))
+
+    def executemany(self, sql: str, seq_of_params: Iterable[Iterable]) -> None:
+        """Ставит в очередь запрос для набора параметров, не дожидаясь выполнения."""
+        self._queue.put((OP_EXECUTEMANY, sql, list(seq_of_params), None))
+
+    def executescript(self, script: str) -> None:
+        """Ставит в очередь SQL-скрипт (например, создание таблиц)."""
+        self._queue.put((OP_SCRIPT, script, None, None))
+
+    async def write(self, sql: str, params: Iterable = ()) -> None:
+        """Выполняет запрос на запись и ждет фиксации транзакции."""
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put((OP_EXECUTE, sql, params, future))
+        await future
+
+    async def flush(self) -> None:
+        """Ждет, пока будут записаны все операции, поставленные до вызова."""
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put((OP_SYNC, None, None, future))
+        await future
+
+    # Чтение
+
+    async def fetchone(self, sql: str, params: Iterable = ()) -> Optional[tuple]:
+        return await self._read(lambda conn: conn.execute(sql, params).fetchone())
+
+    async def fetchall(self, sql: str, params: Iterable = ()) -> List[tuple]:
+        return await self._read(lambda conn: conn.execute(sql, params).fetchall())
+
+    async def _read(self, func) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(
+            self._readers, lambda: func(self._reader_connection())
+        )
+
+    def _reader_connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._local.conn = conn
+            with self._read_conns_lock:
+                self._read_conns.append(conn)
+        return conn
+
+    async def close(self) -> None:
+        """Дописывает очередь, останавливает поток-писатель и закрывает соединения."""
+        if self._writer is not None:
+            self._queue.put(_STOP)
+            await asyncio.get_running_loop().run_in_executor(None, self._writer.join)
+            self._writer = None
+        self._readers.shutdown(wait=True)
+        with self._read_conns_lock:
+            for conn in self._read_conns:
+                conn.close()
+            self._read_conns.clear()
+
+    # Поток-писатель
+
+    def _connect_writer(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _write_loop(self) -> None:
+        conn = self._connect_writer()
+        try:
+            while True:
+                op = self._queue.get()
+                if op is _STOP:
+                    return
+                # Собираем все, что придет за batch_interval, в одну транзакцию
+                batch = [op]
+                stop = False
+                deadline = time.monotonic() + self.batch_interval
+                while len(batch) < self.max_batch:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        op = self._queue.get(timeout=timeout)
+                    except queue.Empty:
+                        break
+                    if op is _STOP:
+                        stop = True
+                        break
+                    batch.append(op)
+                self._commit(conn, batch)
+                if stop:
+                    return
+        finally:
+            conn.close()
+
+    def _commit(self, conn: sqlite3.Connection, batch: list) -> None:
+        """Выполняет пачку операций одной транзакцией (скрипты - отдельно, по порядку)."""
+        self.batches += 1
+        self.writes += len(batch)
+        pending = []
+        for op in batch:
+            if op[0] == OP_SCRIPT:
+                # executescript сам фиксирует транзакцию - сначала записываем накопленное
+                self._commit_ops(conn, pending)
+                pending = []
+                try:
+                    conn.executescript(op[1])
+                    _resolve(op[3])
+                except Exception as e:
+                    logger.error(f"Ошибка при выполнении SQL-скрипта: {e}")
+                    _resolve(op[3], e)
+            else:
+                pending.append(op)
+        self._commit_ops(conn, pending)
+
+    def _commit_ops(self, conn: sqlite3.Connection, ops: list) -> None:
+        if not ops:
+            return
+        try:
+            with conn:
+                for op in ops:
+                    self._apply(conn, op)
+        except Exception as e:
+            logger.error(f"Ошибка при записи пачки из {len(ops)} операций, повторяем по одной: {e}")
+            # Ошибка одной операции не должна отменять остальные
+            for op in ops:
+                try:
+                    with conn:
+                        self._apply(conn, op)
+                except Exception as op_error:
+                    logger.error(f"Ошибка при записи в базу: {op_error}")
+                    _resolve(op[3], op_error)
+                else:
+                    _resolve(op[3])
+            return
+        for op in ops:
+            _resolve(op[3])
+
+    @staticmethod
+    def _apply(conn: sqlite3.Connection, op: tuple) -> None:
+        kind, sql, params, _ = op
+        if kind == OP_EXECUTE:
+            conn.execute(sql, params)
+        elif kind == OP_EXECUTEMANY:
+            conn.executemany(sql, params)
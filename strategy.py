@@ -0,0 +1,53 @@
+"""Совет "взять или остановиться" по готовой таблице стратегии (O(1), без расчетов).
+
+Таблица strategy_table.py рассчитана solver.py для игры вдвоем без дилера. За столом
+из трех и более игроков совет приближенный: из соперников берется самый опасный -
+лучший итог уже доигравших или (если его нужно только превзойти) сильнейшая
+сумма тех, кто еще не ходил.
+"""
+from typing import Optional
+
+from game import Game, Player
+from strategy_table import MIN_SCORE, FIRST_HARD, FIRST_SOFT, LAST_HARD, LAST_SOFT
+
+# Итог доигравшего соперника: перебор (первый столбец таблиц LAST_*)
+BUST = 0
+
+# Если позиции нет в таблице: добирать до этой суммы
+DEFAULT_STAND_ON = 17
+
+def should_hit_first(score: int, soft: bool, opponent_score: int) -> bool:
+    """Совет, пока соперник еще не ходил; opponent_score - сумма его двух карт."""
+    action = (FIRST_SOFT if soft else FIRST_HARD)[score - MIN_SCORE][opponent_score - MIN_SCORE]
+    if action == "-":
+        return score < DEFAULT_STAND_ON
+    return action == "H"
+
+def should_hit_last(score: int, soft: bool, target: int) -> bool:
+    """Совет, когда соперник доиграл: target - его итог (BUST - перебор)."""
+    column = 0 if target == BUST else target - MIN_SCORE + 1
+    action = (LAST_SOFT if soft else LAST_HARD)[score - MIN_SCORE][column]
+    if action == "-":
+        return target != BUST and score < target
+    return action == "H"
+
+def should_hit(game: Game, player: Player) -> Optional[bool]:
+    """Совет игроку, чей сейчас ход. None - совета нет (игра против дилера или не его ход)."""
+    if game.dealer or game.finished or game.current_player_id != player.user_id:
+        return None
+    score, soft = player.get_score(), player.is_soft()
+    # Лучший итог доигравших соперников и суммы тех, кто еще будет ходить
+    target = BUST
+    waiting = []
+    for other in game.players.values():
+        if other is player:
+            continue
+        if other.busted:
+            continue
+        if other.stopped:
+            target = max(target, other.get_score())
+        else:
+            waiting.append(other.get_score())
+    if not waiting or score <= target:
+        return should_hit_last(score, soft, target)
+    return should_hit_first(score, soft, max(waiting))
@@ -0,0 +1,94 @@
+"""Таблица стратегии для игры вдвоем. Сгенерировано solver.py - не редактировать вручную.
+
+Строка - своя сумма от MIN_SCORE до MAX_SCORE, символ - состояние соперника:
+FIRST_* - соперник еще не ходил (его сумма двух карт от MIN_SCORE),
+LAST_* - соперник доиграл (перебор, затем его сумма от MIN_SCORE).
+H - взять карту, S - остановиться, "-" - позиция не встречается.
+Ожидание первого игрока при оптимальной игре обоих: -0.06650
+"""
+MIN_SCORE = 4
+MAX_SCORE = 21
+
+FIRST_HARD = (
+    "HHHHHHHHHHHHHHHHHH",  # 4
+    "HHHHHHHHHHHHHHHHHH",  # 5
+    "HHHHHHHHHHHHHHHHHH",  # 6
+    "HHHHHHHHHHHHHHHHHH",  # 7
+    "HHHHHHHHHHHHHHHHHH",  # 8
+    "HHHHHHHHHHHHHHHHHH",  # 9
+    "HHHHHHHHHHHHHHHHHH",  # 10
+    "HHHHHHHHHHHHHHHHHH",  # 11
+    "HHHHHHHHHHHHHHHHHH",  # 12
+    "HHHHHHHHHHHHHHHHHH",  # 13
+    "HHHHHHHHSSSHHHHHHH",  # 14
+    "SSHHHHHHSSSSHHHHHH",  # 15
+    "SSSHHHSSSSSSSHHHHH",  # 16
+    "SSSSSSSSSSSSSSHHHH",  # 17
+    "SSSSSSSSSSSSSSSHHH",  # 18
+    "SSSSSSSSSSSSSSSSHH",  # 19
+    "SSSSSSSSSSSSSSSSSH",  # 20
+    "SSSSSSSSSSSSSSSSSS",  # 21
+)
+
+FIRST_SOFT = (
+    "------------------",  # 4
+    "------------------",  # 5
+    "------------------",  # 6
+    "------------------",  # 7
+    "------------------",  # 8
+    "------------------",  # 9
+    "------------------",  # 10
+    "------------------",  # 11
+    "HHHHHHHHHHHHHHHHHH",  # 12
+    "HHHHHHHHHHHHHHHHHH",  # 13
+    "HHHHHHHHHHHHHHHHHH",  # 14
+    "HHHHHHHHHHHHHHHHHH",  # 15
+    "HHHHHHHHHHHHHHHHHH",  # 16
+    "HHSHHHHHHHHSSHHHHH",  # 17
+    "SSSSSHHSSSSSSSSHHH",  # 18
+    "SSSSSSSSSSSSSSSSHH",  # 19
+    "SSSSSSSSSSSSSSSSSH",  # 20
+    "SSSSSSSSSSSSSSSSSS",  # 21
+)
+
+LAST_HARD = (
+    "S----------HHHHHHHH",  # 4
+    "S-----------HHHHHHH",  # 5
+    "S----------HHHHHHHH",  # 6
+    "S----------HHHHHHHH",  # 7
+    "S----------HHHHHHHH",  # 8
+    "S----------HHHHHHHH",  # 9
+    "S----------HHHHHHHH",  # 10
+    "S----------HHHHHHHH",  # 11
+    "S---------HHHHHHHHH",  # 12
+    "S---------HHHHHHHHH",  # 13
+    "S---------SHHHHHHHH",  # 14
+    "S---------SSSHHHHHH",  # 15
+    "S---------SSSSHHHHH",  # 16
+    "S---------SSSSSHHHH",  # 17
+    "S---------SSSSSSHHH",  # 18
+    "S---------SSSSSSSHH",  # 19
+    "S---------SSSSSSSSH",  # 20
+    "----------SSSSSSSSS",  # 21
+)
+
+LAST_SOFT = (
+    "-------------------",  # 4
+    "-------------------",  # 5
+    "-------------------",  # 6
+    "-------------------",  # 7
+    "-------------------",  # 8
+    "-------------------",  # 9
+    "-------------------",  # 10
+    "-------------------",  # 11
+    "S-----------HHHHHHH",  # 12
+    "S-----------HHHHHHH",  # 13
+    "S-----------HHHHHHH",  # 14
+    "S-----------HHHHHHH",  # 15
+    "S-----------SHHHHHH",  # 16
+    "S-----------SSHHHHH",  # 17
+    "S-----------SSSHHHH",  # 18
+    "S-----------SSSSSHH",  # 19
+    "S-----------SSSSSSH",  # 20
+    "S-----------SSSSSSS",  # 21
+)
@@ -0,0 +1,114 @@
+"""Реестр фоновых задач бота.
+
+Все фоновые задачи (таймеры ожидания игроков, паузы между раундами матча, отложенные
+правки табло, запись журнала, запуск бота) создаются через TaskSupervisor.spawn:
+- на задачи хранятся ссылки, поэтому сборщик мусора не удалит их посреди sleep;
+- исключения задач логируются и считаются, а не теряются;
+- задачи игры можно отменить разом (cancel_game) при /clear или окончании игры;
+- число задач игр ограничено max_tasks: при перегрузке новые столы не открываются,
+  а не копят таймеры без предела.
+"""
+import asyncio
+import logging
+from typing import Coroutine, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Сколько задач игр может быть одновременно (у каждого стола 1-2 таймера)
+MAX_GAME_TASKS = 10000
+
+class TaskSupervisor:
+    """Фоновые задачи, сгруппированные по играм.
+
+    Задачи с game_id=None - служебные (запуск бота, журнал игр): они не входят
+    в лимит и отменяются только при остановке.
+    """
+
+    def __init__(self, max_tasks: int = MAX_GAME_TASKS):
+        self.max_tasks = max_tasks
+        # game_id (None - служебные) -> задачи
+        self._tasks: Dict[Optional[int], Set[asyncio.Task]] = {}
+        self._game_task_count = 0
+        self.started = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.rejected = 0
+        self.peak = 0
+        # Ошибки по именам задач (для /metrics)
+        self.failures: Dict[str, int] = {}
+
+    def has_capacity(self, needed: int = 1) -> bool:
+        """Можно ли запустить еще needed задач игр."""
+        return self._game_task_count + needed <= self.max_tasks
+
+    def spawn(self, coro: Coroutine, game_id: Optional[int] = None, name: str = "task") -> Optional[asyncio.Task]:
+        """Запускает задачу. Если лимит задач игр исчерпан, корутина закрывается и возвращается None."""
+        if game_id is not None:
+            if not self.has_capacity():
+                self.rejected += 1
+                coro.close()
+                logger.warning(f"Лимит фоновых задач ({self.max_tasks}) исчерпан, задача {name} игры {game_id} не запущена")
+                return None
+            self._game_task_count += 1
+        task = asyncio.create_task(coro, name=name)
+        self._tasks.setdefault(game_id, set()).add(task)
+        self.started += 1
+        self.peak = max(self.peak, self._game_task_count)
+        task.add_done_callback(lambda done: self._on_done(done, game_id))
+        return task
+
+    def _on_done(self, task: asyncio.Task, game_id: Optional[int]) -> None:
+        tasks = self._tasks.get(game_id)
+        if tasks is not None:
+            tasks.discard(task)
+            if not tasks:
+                del self._tasks[game_id]
+        if game_id is not None:
+            self._game_task_count -= 1
+        if task.cancelled():
+            self.cancelled += 1
+            return
+        error = task.exception()
+        if error is not None:
+            self.failed += 1
+            name = task.get_name()
+            self.failures[name] = self.failures.get(name, 0) + 1
+            logger.error(f"Ошибка в фоновой задаче {name} (игра {game_id}): {error}", exc_info=error)
+
+    def cancel_game(self, game_id: int) -> int:
+        """Отменяет задачи игры (кроме текущей задачи - она может сама завершать игру). Возвращает их число."""
+        current = asyncio.current_task()
+        tasks = [task for task in self._tasks.get(game_id, ()) if task is not current and not task.done()]
+        for task in tasks:
+            task.cancel()
+        return len(tasks)
+
+    async def shutdown(self, timeout: float) -> None:
+        """Отменяет все задачи и ждет их завершения, но не дольше timeout секунд."""
+        current = asyncio.current_task()
+        tasks = [task for tasks in self._tasks.values() for task in tasks if task is not current]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            _, not_done = await asyncio.wait(tasks, timeout=timeout)
+            if not_done:
+                logger.warning(f"Не дождались отмены фоновых задач: {len(not_done)}")
+
+    def __len__(self) -> int:
+        return sum(len(tasks) for tasks in self._tasks.values())
+
+    def as_metrics(self) -> Dict[str, float]:
+        """Плоский словарь метрик (имя -> значение) для /metrics."""
+        metrics = {
+            "background_tasks": len(self),
+            "background_game_tasks": self._game_task_count,
+            "background_game_tasks_peak": self.peak,
+            "background_games": sum(1 for game_id in self._tasks if game_id is not None),
+            "background_tasks_started": self.started,
+            "background_tasks_failed": self.failed,
+            "background_tasks_cancelled": self.cancelled,
+            "background_tasks_rejected": self.rejected,
+        }
+        for name, count in sorted(self.failures.items()):
+            metrics[f'background_task_failures{{name="{name}"}}'] = count
+        return metrics
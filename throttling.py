@@ -0,0 +1,91 @@
+"""Ограничение частоты нажатий кнопок.
+
+Middleware стоит перед всеми обработчиками колбэков: у каждого пользователя и каждого
+чата есть "ведро токенов", одно нажатие расходует по токену из обоих. Лишние нажатия
+не доходят до обработчиков (поиск игры, ответы и сообщения в группу) и получают
+короткий ответ "слишком быстро" - не чаще раза в THROTTLE_NOTICE_INTERVAL секунд,
+остальные просто отбрасываются.
+
+Ответ возвращается из middleware, а не отправляется: в режиме webhook aiogram
+передает его Telegram в ответе на сам вебхук, без отдельного запроса к Bot API.
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery
+
+# Пользователь: 2 нажатия в секунду, до 10 подряд (вход, старт и первые ходы
+# партии не должны упираться в лимит). Значения по умолчанию; бот берет лимиты из config.py
+USER_RATE = 2.0
+USER_BURST = 10
+# Чат (общий на всех игроков группы): 10 нажатий в секунду, до 20 подряд
+CHAT_RATE = 10.0
+CHAT_BURST = 20
+# Сколько ведер хранить: при переполнении удаляются давно не использованные
+MAX_BUCKETS = 10000
+# Как часто отвечать "слишком быстро" одному пользователю
+THROTTLE_NOTICE_INTERVAL = 1.0
+
+THROTTLE_MESSAGE = "⏳ Слишком быстро! Подождите секунду."
+
+class RateLimiter:
+    """Ведра токенов по ключу (ID пользователя или чата) в словаре фиксированного размера.
+
+    Состояние ведра - список [токены, время последнего пополнения]. Словарь упорядочен
+    по последнему обращению (LRU), поэтому память ограничена max_buckets ведрами.
+    """
+
+    def __init__(self, rate: float, burst: int, max_buckets: int = MAX_BUCKETS):
+        self.rate = rate
+        self.burst = burst
+        self.max_buckets = max_buckets
+        self._buckets: "OrderedDict[int, list]" = OrderedDict()
+
+    def allow(self, key: int, now: float) -> bool:
+        """Расходует токен ключа; False, если токенов нет."""
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [float(self.burst), now]
+            if len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(float(self.burst), bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        if bucket[0] < 1.0:
+            return False
+        bucket[0] -= 1.0
+        return True
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """Outer middleware для callback_query: отсекает нажатия сверх лимитов."""
+
+    def __init__(self, user_limiter: Optional[RateLimiter] = None, chat_limiter: Optional[RateLimiter] = None):
+        self.user_limiter = user_limiter or RateLimiter(USER_RATE, USER_BURST)
+        self.chat_limiter = chat_limiter or RateLimiter(CHAT_RATE, CHAT_BURST)
+        # Когда пользователь последний раз получил ответ "слишком быстро"
+        self._notified: "OrderedDict[int, float]" = OrderedDict()
+        self.throttled = 0
+
+    async def __call__(self, handler: Callable[[CallbackQuery, Dict[str, Any]], Awaitable[Any]],
+                       event: CallbackQuery, data: Dict[str, Any]) -> Any:
+        now = time.monotonic()
+        user_id = event.from_user.id
+        chat_id = event.message.chat.id if event.message else user_id
+        # Сначала лимит пользователя: нажатия сверх него не расходуют общие токены чата
+        if self.user_limiter.allow(user_id, now) and self.chat_limiter.allow(chat_id, now):
+            return await handler(event, data)
+        self.throttled += 1
+        if now - self._notified.get(user_id, float("-inf")) < THROTTLE_NOTICE_INTERVAL:
+            return None
+        self._notified[user_id] = now
+        self._notified.move_to_end(user_id)
+        if len(self._notified) > MAX_BUCKETS:
+            self._notified.popitem(last=False)
+        # Не await: метод отправляется ответом на вебхук (в режиме polling - см. polling.py)
+        return event.answer(THROTTLE_MESSAGE)